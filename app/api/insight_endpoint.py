@@ -0,0 +1,39 @@
+from typing import Tuple
+
+from app.models.request_models import InsightRequest
+from app.services.cache_warmer import cache_warmer
+from app.services.insight_reports import REPORT_KINDS, cached_report, get_cached_report, store_report, stream_report
+from app.utils import response_template
+from app.utils.sse import event_stream_response, replay_result
+
+
+async def handle_insight_request(
+    kind_name: str,
+    request_data: InsightRequest,
+    auth_headers: Tuple[str, str],
+    stream: bool = False,
+):
+    """Shared body of every `generate_insight` endpoint.
+
+    Requests are keyed on the normalized `InsightRequest`, so identical
+    concurrent requests share one pipeline run instead of each paying for it.
+    """
+    kind = REPORT_KINDS[kind_name]
+    x_token, x_refresh_token = auth_headers
+    cache_warmer.record(kind, request_data)
+
+    if stream:
+        # Trả kết quả từ cache nếu có, nếu không thì stream báo cáo dạng SSE
+        cached = await get_cached_report(kind, request_data, x_token, x_refresh_token)
+        if cached is not None:
+            return event_stream_response(replay_result(cached))
+        return event_stream_response(
+            stream_report(kind, request_data, x_token, x_refresh_token),
+            on_result=lambda result: store_report(kind, request_data, result),
+        )
+
+    result = await cached_report(kind, request_data, x_token, x_refresh_token)
+    if result is None:
+        return response_template.fail_response(kind.fail_message)
+
+    return response_template.success_response(data=result)
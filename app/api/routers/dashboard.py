@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends
+from app.core.exceptions import InvalidReportKindException
+from app.models.request_models import DashboardInsightRequest, InsightRequest
+from app.api.dependencies import get_auth_headers
+from app.services.cache_warmer import cache_warmer
+from app.services.dashboard_service import DashboardInsightService
+from app.services.insight_reports import REPORT_KINDS
+from app.utils import response_template
+from app.utils.sse import event_stream_response
+
+router = APIRouter(prefix="/dashboard", tags=["Dashboard Insights"])
+
+@router.post("/generate_insights")
+async def generate_dashboard_insights(
+    request_data: DashboardInsightRequest,
+    auth_headers: tuple = Depends(get_auth_headers),
+    stream: bool = False,
+):
+    unknown = [kind for kind in request_data.kinds if kind not in REPORT_KINDS]
+    if unknown:
+        raise InvalidReportKindException(detail=f"Unknown report kinds: {', '.join(unknown)}")
+    kinds = [REPORT_KINDS[name] for name in dict.fromkeys(request_data.kinds)]
+
+    # Khoá cache của từng báo cáo giống hệt router riêng lẻ nên không tính `kinds`
+    insight_request = InsightRequest(**request_data.model_dump(exclude={"kinds"}))
+    for kind in kinds:
+        cache_warmer.record(kind, insight_request)
+    dashboard_service = DashboardInsightService(*auth_headers)
+
+    if stream:
+        return event_stream_response(dashboard_service.stream_events(insight_request, kinds))
+
+    result = await dashboard_service.generate_reports(insight_request, kinds)
+    if not result["reports"]:
+        return response_template.fail_response("Failed to generate dashboard reports", data=result)
+    return response_template.success_response(data=result)
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends
+from app.core.exceptions import InvalidCallbackUrlException, JobQueueFullException, NotFoundException
+from app.models.request_models import InsightJobRequest, InsightRequest
+from app.api.dependencies import get_auth_headers
+from app.services.insight_reports import REPORT_KINDS
+from app.services.job_queue import JobQueueFullError, callback_url_allowed, job_queue
+from app.utils import response_template
+
+router = APIRouter(prefix="/jobs", tags=["Insight Jobs"])
+
+
+@router.post("/{kind}", status_code=202)
+async def submit_insight_job(
+    kind: str,
+    request_data: InsightJobRequest,
+    auth_headers: tuple = Depends(get_auth_headers),
+):
+    if kind not in REPORT_KINDS:
+        raise NotFoundException(detail=f"Unknown report kind: {kind}")
+    if request_data.callback_url and not await callback_url_allowed(request_data.callback_url):
+        raise InvalidCallbackUrlException()
+
+    # Job được khử trùng lặp theo request chuẩn hoá, không tính callback_url
+    insight_request = InsightRequest(**request_data.model_dump(exclude={"callback_url"}))
+    x_token, x_refresh_token = auth_headers
+    try:
+        job = job_queue.submit(
+            REPORT_KINDS[kind], insight_request, x_token, x_refresh_token, request_data.callback_url
+        )
+    except JobQueueFullError:
+        raise JobQueueFullException()
+    return response_template.success_response(data=job.to_dict(), message="Job accepted")
+
+
+@router.get("/{job_id}")
+async def get_insight_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise NotFoundException(detail=f"Job {job_id} not found or expired")
+    return response_template.success_response(data=job.to_dict())
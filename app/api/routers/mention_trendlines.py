@@ -1,56 +1,31 @@
-import json
-from fastapi import APIRouter, Depends, Request
-from cachetools import TTLCache
-from app.models.request_models import InsightRequest
-from app.models.response_models import SOVInsightResponse
-from app.services.sov_insight_service import SovInsightService
+from fastapi import APIRouter, Depends
+from app.models.request_models import TrendlineInsightRequest
 from app.api.dependencies import get_auth_headers
+from app.api.insight_endpoint import handle_insight_request
+from app.services.trendline_insight_service import TrendlineInsightService
 from app.utils import response_template
 
 router = APIRouter(prefix="/mentions_trendlines", tags=["Mentions Trendlines Insights"])
 
-# Cache: max 1000 item, TTL 1800 giây
-cache = TTLCache(maxsize=1000, ttl=1800)
-
 @router.post("/generate_insight")
 async def generate_mentions_trendlines_insight(
-    request_data: InsightRequest,
-    request: Request,
+    request_data: TrendlineInsightRequest,
     auth_headers: tuple = Depends(get_auth_headers),
+    stream: bool = False,
 ):
-    # Kết hợp path + body làm cache key
-    body_bytes = await request.body()
-    body_json = json.loads(body_bytes)
-    cache_key = json.dumps({
-        "path": str(request.url.path),
-        "body": body_json
-    }, sort_keys=True)
-
-    # Kiểm tra cache
-    if cache_key in cache:
-        return response_template.success_response(data=cache[cache_key])
-
-    # Gọi service nếu chưa cache
-    x_token, x_refresh_token = auth_headers
-    insight_service = SovInsightService(x_token, x_refresh_token)
-    report, data_period1, data_period2 = await insight_service.generate_insight(
-        topic_ids=request_data.topic_ids,
-        from_date1=request_data.from_date1,
-        to_date1=request_data.to_date1,
-        from_date2=request_data.from_date2,
-        to_date2=request_data.to_date2,
-    )
-
-    if report is None:
-        return response_template.fail_response("Failed to generate Mentions Trendlines report")
+    return await handle_insight_request("mentions_trendlines", request_data, auth_headers, stream)
 
-    result = {
-        "report": report,
-        "data_period_1": data_period1,
-        "data_period_2": data_period2,
-    }
-
-    # Lưu vào cache
-    cache[cache_key] = result
-
-    return response_template.success_response(data=result)
+@router.post("/series")
+async def get_mentions_trendlines_series(
+    request_data: TrendlineInsightRequest,
+    auth_headers: tuple = Depends(get_auth_headers),
+):
+    # Chỉ trả chuỗi đã phân tích, không gọi LLM, để vẽ biểu đồ
+    trendline_service = TrendlineInsightService(*auth_headers)
+    try:
+        series = await trendline_service.get_series(
+            request_data.topic_ids, request_data.period_ranges(), request_data.interval
+        )
+    except ValueError as e:
+        return response_template.fail_response(str(e))
+    return response_template.success_response(data=series)
@@ -1,23 +1,151 @@
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
-from fastapi_cache.backends.inmemory import InMemoryBackend
+import hashlib
 import json
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
 
+import orjson
+from cachetools import TLRUCache
 from pydantic import BaseModel
-import os
+from redis import asyncio as aioredis
 
+from app.core import metrics
 from app.core.config import settings
+from app.core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryRedis:
+    """Minimal async stand-in for the redis client subset used by `LayeredCache`.
+
+    Selected with `REDIS_URL=memory://`, it lets tests and single-process
+    deployments exercise the L2 code path without a Redis server.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ex: Optional[int] = None) -> bool:
+        self._data[key] = (value, time.time() + ex if ex else None)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def ping(self) -> bool:
+        return True
+
+    async def aclose(self) -> None:
+        self._data.clear()
+
+
+class LayeredCache:
+    """Two-tier cache: a per-process L1 LRU in front of a shared L2 Redis.
+
+    Values are stored in L2 as orjson bytes under `<prefix>:<namespace>:<digest>`
+    so every worker and replica shares hits. Without L2 the cache degrades to
+    L1 only; Redis errors are logged and treated as misses.
+    """
+
+    def __init__(self, prefix: str, l1_maxsize: int):
+        self.prefix = prefix
+        self._l1 = TLRUCache(maxsize=l1_maxsize, ttu=lambda _key, item, _now: item[1], timer=time.time)
+        self._l2 = None
+
+    def configure(self, l2) -> None:
+        self._l2 = l2
+
+    def make_key(self, namespace: str, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:40]
+        return f"{self.prefix}:{namespace}:{digest}"
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        full_key = self.make_key(namespace, key)
+        item = self._l1.get(full_key)
+        if item is not None:
+            metrics.cache_requests.labels(namespace, "l1", "hit").inc()
+            return item[0]
+        metrics.cache_requests.labels(namespace, "l1", "miss").inc()
+        if self._l2 is None:
+            return None
+        # Chỉ tạo span khi phải hỏi L2, lookup L1 không đáng một span
+        with span("cache.get", **{"cache.namespace": namespace}) as current:
+            try:
+                raw = await self._l2.get(full_key)
+            except Exception as e:
+                logger.warning("L2 cache get failed for %s: %s", namespace, e)
+                metrics.cache_requests.labels(namespace, "l2", "error").inc()
+                current.set_attribute("cache.result", "error")
+                return None
+            result = "miss" if raw is None else "hit"
+            metrics.cache_requests.labels(namespace, "l2", result).inc()
+            current.set_attribute("cache.result", result)
+        if raw is None:
+            return None
+        value = orjson.loads(raw)
+        # L2 không trả về TTL còn lại, giữ ở L1 một khoảng ngắn
+        self._l1[full_key] = (value, time.time() + settings.CACHE_L1_TTL)
+        return value
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: int) -> None:
+        full_key = self.make_key(namespace, key)
+        if self._l2 is None:
+            self._l1[full_key] = (value, time.time() + ttl)
+            return
+        # Giới hạn TTL ở L1 để các worker không giữ bản cũ quá lâu
+        self._l1[full_key] = (value, time.time() + min(ttl, settings.CACHE_L1_TTL))
+        try:
+            await self._l2.set(full_key, orjson.dumps(value), ex=ttl)
+        except Exception as e:
+            logger.warning("L2 cache set failed for %s: %s", namespace, e)
+
+    async def delete(self, namespace: str, key: str) -> None:
+        full_key = self.make_key(namespace, key)
+        self._l1.pop(full_key, None)
+        if self._l2 is None:
+            return
+        try:
+            await self._l2.delete(full_key)
+        except Exception as e:
+            logger.warning("L2 cache delete failed for %s: %s", namespace, e)
+
+    async def close(self) -> None:
+        self._l1.clear()
+        if self._l2 is not None:
+            await self._l2.aclose()
+            self._l2 = None
+
+
+cache = LayeredCache(prefix="app-cache", l1_maxsize=settings.CACHE_L1_MAXSIZE)
 
 
 async def init_cache():
     """Initialize the shared cache with Redis or in-memory backend."""
     redis_url = settings.REDIS_URL
-    if redis_url:
-        FastAPICache.init(RedisBackend(redis_url), prefix="app-cache")
+    if redis_url == "memory://":
+        cache.configure(InMemoryRedis())
+    elif redis_url:
+        cache.configure(aioredis.from_url(redis_url))
     else:
-        FastAPICache.init(InMemoryBackend(), prefix="app-cache")
+        cache.configure(None)
+
 
 def shared_cache_key(request: BaseModel, endpoint: str) -> str:
-    """Generate a cache key based on the request body and endpoint name."""
-    request_dict = request.dict()
-    return f"{endpoint}:{json.dumps(request_dict, sort_keys=True)}"
\ No newline at end of file
+    """Generate a cache key based on the request body and endpoint name.
+
+    Unset optional fields are left out, so a subclass adding an optional
+    field keys its default requests like the base model.
+    """
+    request_dict = request.model_dump(exclude_none=True)
+    return f"{endpoint}:{json.dumps(request_dict, sort_keys=True)}"
@@ -8,8 +8,98 @@ class Settings(BaseSettings):
     APP_VERSION: str = "1.0.0"
     GATEWAY_URL: str = os.getenv("GATEWAY_URL", "")
     OPENROUTER_API_KEY: str = os.getenv("OPENROUTER_API_KEY", "")
-    CMS_GATEWAY_URL: str = "https://cms-gateway.radaa.net/kompaql"
+    LLM_BASE_URL: str = os.getenv("LLM_BASE_URL", "https://openrouter.ai/api/v1")
+    LLM_MODEL: str = os.getenv("LLM_MODEL", "meta-llama/llama-4-scout:free")
+    LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", "120"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    PROMPT_TOKEN_ENCODING: str = os.getenv("PROMPT_TOKEN_ENCODING", "cl100k_base")
+    PROMPT_MAX_TOKENS: int = int(os.getenv("PROMPT_MAX_TOKENS", "6000"))
+    PROMPT_BUZZ_CONTENT_TOKENS: int = int(os.getenv("PROMPT_BUZZ_CONTENT_TOKENS", "120"))
+    PROMPT_BUZZ_MIN_CONTENT_TOKENS: int = int(os.getenv("PROMPT_BUZZ_MIN_CONTENT_TOKENS", "30"))
+    PROMPT_CHARS_PER_TOKEN: int = int(os.getenv("PROMPT_CHARS_PER_TOKEN", "3"))
+    MAX_PERIODS: int = int(os.getenv("MAX_PERIODS", "12"))
+    COMPARISON_OUTLIER_Z: float = float(os.getenv("COMPARISON_OUTLIER_Z", "3.5"))
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MAXSIZE: int = int(os.getenv("LLM_CACHE_MAXSIZE", "1000"))
+    LLM_CACHE_PERSIST: bool = os.getenv("LLM_CACHE_PERSIST", "false").lower() == "true"
+    LLM_CACHE_TTL: int = int(os.getenv("LLM_CACHE_TTL", "604800"))
+    CMS_GATEWAY_URL: str = os.getenv("CMS_GATEWAY_URL", "https://cms-gateway.radaa.net/kompaql")
     REDIS_URL: str = os.getenv("REDIS_URL", "")
+    CACHE_L1_MAXSIZE: int = int(os.getenv("CACHE_L1_MAXSIZE", "1000"))
+    CACHE_L1_TTL: int = int(os.getenv("CACHE_L1_TTL", "300"))
+    INSIGHT_CACHE_TTL: int = int(os.getenv("INSIGHT_CACHE_TTL", "1800"))
+    INSIGHT_CACHE_HARD_TTL: int = int(os.getenv("INSIGHT_CACHE_HARD_TTL", "86400"))
+    # Ghi đè TTL theo loại báo cáo, dạng "sov=900:43200,brand_health=3600:86400" (soft:hard, giây)
+    INSIGHT_CACHE_KIND_TTLS: str = os.getenv("INSIGHT_CACHE_KIND_TTLS", "")
+    DATA_CACHE_TTL_PAST: int = int(os.getenv("DATA_CACHE_TTL_PAST", "86400"))
+    DATA_CACHE_TTL_RECENT: int = int(os.getenv("DATA_CACHE_TTL_RECENT", "300"))
+    DATA_CACHE_SETTLE_MINUTES: int = int(os.getenv("DATA_CACHE_SETTLE_MINUTES", "60"))
+    GRAPHQL_BATCHING_ENABLED: bool = os.getenv("GRAPHQL_BATCHING_ENABLED", "true").lower() == "true"
+    BUZZ_TOP_K: int = int(os.getenv("BUZZ_TOP_K", "2"))
+    # Chỉ khi gateway hỗ trợ `sort` (BUZZ_SERVER_SORT=true) mới tải về đúng K buzz. Mặc định vẫn tải
+    # BUZZ_MAX_SCAN buzz mỗi topic/giai đoạn như trước, chỉ bớt trường; giảm BUZZ_MAX_SCAN thì top K
+    # chỉ được chọn trong số buzz đã quét nên kết quả có thể khác
+    BUZZ_SERVER_SORT: bool = os.getenv("BUZZ_SERVER_SORT", "false").lower() == "true"
+    BUZZ_PAGE_SIZE: int = int(os.getenv("BUZZ_PAGE_SIZE", "100"))
+    BUZZ_MAX_SCAN: int = int(os.getenv("BUZZ_MAX_SCAN", "100"))
+    AGGREGATION_BUCKETS_ENABLED: bool = os.getenv("AGGREGATION_BUCKETS_ENABLED", "false").lower() == "true"
+    AGGREGATION_TIMEZONE: str = os.getenv("AGGREGATION_TIMEZONE", "Asia/Ho_Chi_Minh")
+    BUCKET_STORE_MAXSIZE: int = int(os.getenv("BUCKET_STORE_MAXSIZE", "5000"))
+    PROJECT_INDEX_TTL: int = int(os.getenv("PROJECT_INDEX_TTL", "600"))
+    GATEWAY_TIMEOUT: float = float(os.getenv("GATEWAY_TIMEOUT", "30"))
+    CMS_GATEWAY_TIMEOUT: float = float(os.getenv("CMS_GATEWAY_TIMEOUT", "10"))
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    GATEWAY_MAX_CONCURRENCY: int = int(os.getenv("GATEWAY_MAX_CONCURRENCY", "16"))
+    CMS_GATEWAY_MAX_CONCURRENCY: int = int(os.getenv("CMS_GATEWAY_MAX_CONCURRENCY", "4"))
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_QUEUE_MAXSIZE: int = int(os.getenv("JOB_QUEUE_MAXSIZE", "100"))
+    JOB_RESULT_TTL: int = int(os.getenv("JOB_RESULT_TTL", "3600"))
+    JOB_CALLBACK_TIMEOUT: float = float(os.getenv("JOB_CALLBACK_TIMEOUT", "5"))
+    # Danh sách host nhận callback, cách nhau bởi dấu phẩy; để trống là tắt callback
+    JOB_CALLBACK_ALLOWED_HOSTS: str = os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "")
+    DASHBOARD_MAX_CONCURRENCY: int = int(os.getenv("DASHBOARD_MAX_CONCURRENCY", "4"))
+    WARMER_ENABLED: bool = os.getenv("WARMER_ENABLED", "false").lower() == "true"
+    WARMER_X_TOKEN: str = os.getenv("WARMER_X_TOKEN", "")
+    WARMER_X_REFRESH_TOKEN: str = os.getenv("WARMER_X_REFRESH_TOKEN", "")
+    WARMER_INTERVAL: int = int(os.getenv("WARMER_INTERVAL", "3600"))
+    WARMER_STARTUP_DELAY: int = int(os.getenv("WARMER_STARTUP_DELAY", "10"))
+    WARMER_TOP_N: int = int(os.getenv("WARMER_TOP_N", "200"))
+    WARMER_CONCURRENCY: int = int(os.getenv("WARMER_CONCURRENCY", "2"))
+    WARMER_LLM_BUDGET: int = int(os.getenv("WARMER_LLM_BUDGET", "100"))
+    WARMER_MAX_SHAPES: int = int(os.getenv("WARMER_MAX_SHAPES", "5000"))
+    WARMER_STATE_FILE: str = os.getenv("WARMER_STATE_FILE", "")
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    TRACING_SERVICE_NAME: str = os.getenv("TRACING_SERVICE_NAME", "competitors-insight")
+    # "otlp" (cấu hình qua OTEL_EXPORTER_OTLP_ENDPOINT) hoặc "file" (JSON lines vào TRACING_FILE)
+    TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "otlp")
+    TRACING_FILE: str = os.getenv("TRACING_FILE", "traces.jsonl")
+    TRACING_SAMPLE_RATIO: float = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_THRESHOLD_MS: int = int(os.getenv("PROFILING_THRESHOLD_MS", "10000"))
+    PROFILING_INTERVAL_MS: int = int(os.getenv("PROFILING_INTERVAL_MS", "10"))
+    PROFILING_DIR: str = os.getenv("PROFILING_DIR", "profiles")
+    PROFILING_MAX_FILES: int = int(os.getenv("PROFILING_MAX_FILES", "50"))
+    # Request có header này (khác rỗng và "0") luôn được ghi profile
+    PROFILING_HEADER: str = os.getenv("PROFILING_HEADER", "x-debug-profile")
+    RECORD_MODE: str = os.getenv("RECORD_MODE", "off")
+    RECORD_DIR: str = os.getenv("RECORD_DIR", "recordings")
+    STANDIN_SEED: int = int(os.getenv("STANDIN_SEED", "42"))
+    STANDIN_TOPICS: int = int(os.getenv("STANDIN_TOPICS", "8"))
+    STANDIN_DAILY_MENTIONS: int = int(os.getenv("STANDIN_DAILY_MENTIONS", "200"))
+    STANDIN_RECORDINGS_DIR: str = os.getenv("STANDIN_RECORDINGS_DIR", "")
+    STANDIN_GATEWAY_LATENCY: str = os.getenv("STANDIN_GATEWAY_LATENCY", "lognormal:300:150")
+    STANDIN_CMS_LATENCY: str = os.getenv("STANDIN_CMS_LATENCY", "normal:150:50")
+    STANDIN_LLM_LATENCY: str = os.getenv("STANDIN_LLM_LATENCY", "lognormal:2000:800")
+    STANDIN_LLM_TOKEN_DELAY: str = os.getenv("STANDIN_LLM_TOKEN_DELAY", "uniform:20:10")
+    STANDIN_LLM_TOKENS: int = int(os.getenv("STANDIN_LLM_TOKENS", "400"))
+    TRENDLINE_INTERVAL: str = os.getenv("TRENDLINE_INTERVAL", "day")
+    TRENDLINE_MA_WINDOW: int = int(os.getenv("TRENDLINE_MA_WINDOW", "7"))
+    TRENDLINE_SPIKE_Z: float = float(os.getenv("TRENDLINE_SPIKE_Z", "3.5"))
+    TRENDLINE_SPIKE_MIN_COUNT: int = int(os.getenv("TRENDLINE_SPIKE_MIN_COUNT", "10"))
+    TRENDLINE_PROMPT_POINTS: int = int(os.getenv("TRENDLINE_PROMPT_POINTS", "30"))
+    TRENDLINE_PROMPT_SPIKES: int = int(os.getenv("TRENDLINE_PROMPT_SPIKES", "5"))
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -14,4 +14,20 @@ class DateRangeException(HTTPException):
 
 class InvalidResponseException(HTTPException):
     def __init__(self, detail: str):
-        super().__init__(status_code=500, detail=detail)
\ No newline at end of file
+        super().__init__(status_code=500, detail=detail)
+
+class JobQueueFullException(HTTPException):
+    def __init__(self, detail: str = "Insight job queue is full, retry later"):
+        super().__init__(status_code=429, detail=detail, headers={"Retry-After": "10"})
+
+class NotFoundException(HTTPException):
+    def __init__(self, detail: str):
+        super().__init__(status_code=404, detail=detail)
+
+class InvalidCallbackUrlException(HTTPException):
+    def __init__(self, detail: str = "callback_url host is not allowed"):
+        super().__init__(status_code=400, detail=detail)
+
+class InvalidReportKindException(HTTPException):
+    def __init__(self, detail: str):
+        super().__init__(status_code=400, detail=detail)
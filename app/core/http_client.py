@@ -0,0 +1,131 @@
+import asyncio
+import re
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.recorder import upstream_transport
+from app.core.tracing import span
+
+OPERATION_NAME = re.compile(r"\s*query\s+(\w+)")
+
+
+def operation_name(payload: Dict) -> str:
+    """GraphQL operation name of `payload` (`aggregations`, `buzzes`, `me`, `batch`) for metric labels."""
+    match = OPERATION_NAME.match(payload.get("query") or "")
+    return match.group(1).lower() if match else "unknown"
+
+
+def payload_attributes(payload: Dict) -> Dict:
+    """Span attributes of a gateway call: root fields, distinct topics and date windows queried."""
+    topics, windows, fields = set(), set(), 0
+    for name, value in (payload.get("variables") or {}).items():
+        if not isinstance(value, dict):
+            continue
+        # Query gộp đặt hậu tố alias cho biến: input_q0, filter_q0, ...
+        if name.startswith("input"):
+            fields += 1
+            topics.update(value.get("indexes") or [])
+        elif name.startswith("filter") and value.get("publishedFromDate"):
+            windows.add(f"{value['publishedFromDate']}/{value.get('publishedToDate')}")
+    return {
+        "gateway.fields": fields,
+        "gateway.topic_count": len(topics),
+        "gateway.windows": sorted(windows),
+    }
+
+
+class GatewayClient:
+    """Pooled keep-alive HTTP client shared by every upstream call.
+
+    The underlying `httpx.AsyncClient` is opened in the app lifespan; it is
+    created lazily as well so scripts such as `test.py` keep working. Calls
+    are capped per upstream (`gateway`, `cms`) so concurrent fan-out cannot
+    flood a single service.
+    """
+
+    def __init__(
+        self,
+        timeout: float,
+        max_connections: int,
+        max_keepalive_connections: int,
+        concurrency: Dict[str, int],
+    ):
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.concurrency = concurrency
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, upstream: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(upstream)
+        if semaphore is None:
+            limit = self.concurrency.get(upstream, self.limits.max_connections)
+            semaphore = self._semaphores[upstream] = asyncio.Semaphore(limit)
+        return semaphore
+
+    async def start(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                transport=upstream_transport(self.limits),
+            )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def post_json(
+        self,
+        url: str,
+        payload: Dict,
+        headers: Dict[str, str],
+        timeout: Optional[float] = None,
+        upstream: str = "gateway",
+    ) -> httpx.Response:
+        if self._client is None:
+            await self.start()
+        operation = operation_name(payload)
+        metrics.count_upstream_call(upstream)
+        in_flight = metrics.upstream_in_flight.labels(upstream)
+        status = "error"
+        with span(f"{upstream} {operation}", **{"gateway.upstream": upstream}) as current:
+            if current.is_recording():
+                current.set_attributes(payload_attributes(payload))
+            async with self._semaphore(upstream):
+                in_flight.inc()
+                started = time.perf_counter()
+                try:
+                    response = await self._client.post(
+                        url,
+                        json=payload,
+                        headers=headers,
+                        timeout=timeout if timeout is not None else self.timeout,
+                    )
+                    status = str(response.status_code)
+                    current.set_attribute("http.response.status_code", response.status_code)
+                    return response
+                finally:
+                    # Chỉ đo thời gian gọi upstream, không tính thời gian chờ semaphore
+                    in_flight.dec()
+                    metrics.upstream_duration.labels(upstream, operation).observe(time.perf_counter() - started)
+                    metrics.upstream_requests.labels(upstream, operation, status).inc()
+
+
+gateway_client = GatewayClient(
+    timeout=settings.GATEWAY_TIMEOUT,
+    max_connections=settings.HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    concurrency={
+        "gateway": settings.GATEWAY_MAX_CONCURRENCY,
+        "cms": settings.CMS_GATEWAY_MAX_CONCURRENCY,
+    },
+)
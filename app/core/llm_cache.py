@@ -0,0 +1,87 @@
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+import orjson
+from cachetools import LRUCache
+
+from app.core.cache import cache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CACHE_NAMESPACE = "llm"
+
+
+def canonicalize(value: Any) -> Any:
+    """Normalize prompt data so equivalent payloads serialize identically.
+
+    Dict keys are sorted on serialization and sets are sorted by their
+    canonical form; lists keep their order, since period order and buzz
+    ranking change the prompt. Wrap truly unordered lists in `unordered`.
+    """
+    if isinstance(value, dict):
+        return {str(key): canonicalize(item) for key, item in value.items()}
+    if isinstance(value, (set, frozenset)):
+        return unordered(value)
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(item) for item in value]
+    return value
+
+
+def unordered(values: Iterable[Any]) -> List[Any]:
+    """Canonical form of a collection whose order carries no meaning (topic ids, label sets)."""
+    items = [canonicalize(item) for item in values]
+    return sorted(items, key=lambda item: orjson.dumps(item, option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY))
+
+
+def prompt_cache_key(template_version: str, data: Any) -> str:
+    """Digest of the data a prompt template renders, independent of request formatting."""
+    payload = orjson.dumps(
+        {"template": template_version, "data": canonicalize(data)},
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+    )
+    return hashlib.sha256(payload).hexdigest()
+
+
+class LLMResponseCache:
+    """Size-bounded LRU of completions keyed on (model, params, prompt data digest).
+
+    With `persist`, completions are also written to the shared layered cache
+    so they survive restarts and are shared between workers.
+    """
+
+    def __init__(self, maxsize: int, persist: bool, ttl: int):
+        self.persist = persist
+        self.ttl = ttl
+        self._entries: LRUCache = LRUCache(maxsize=maxsize)
+
+    @staticmethod
+    def make_key(model: str, prompt_key: str, params: Dict[str, Any]) -> str:
+        return hashlib.sha256(
+            orjson.dumps({"model": model, "prompt": prompt_key, "params": params}, option=orjson.OPT_SORT_KEYS)
+        ).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        completion = self._entries.get(key)
+        if completion is not None or not self.persist:
+            return completion
+        completion = await cache.get(CACHE_NAMESPACE, key)
+        if completion is not None:
+            self._entries[key] = completion
+        return completion
+
+    async def set(self, key: str, completion: str) -> None:
+        self._entries[key] = completion
+        if self.persist:
+            await cache.set(CACHE_NAMESPACE, key, completion, self.ttl)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+llm_response_cache = LLMResponseCache(
+    maxsize=settings.LLM_CACHE_MAXSIZE,
+    persist=settings.LLM_CACHE_PERSIST,
+    ttl=settings.LLM_CACHE_TTL,
+)
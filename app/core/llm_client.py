@@ -0,0 +1,181 @@
+import asyncio
+import time
+from typing import AsyncIterator, Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.llm_cache import LLMResponseCache, llm_response_cache
+from app.core.recorder import upstream_transport
+from app.core.singleflight import SingleFlight
+from app.core.tracing import span
+
+
+class LLMClient:
+    """Shared async OpenRouter client.
+
+    One `AsyncOpenAI` instance (and its pooled HTTP connections) is reused by
+    every insight service; a semaphore bounds how many generations run at once.
+    Calls given a `cache_key` (see `prompt_cache_key`) are answered from the
+    response cache when the same model, params and prompt data were seen before.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        model: str,
+        timeout: float,
+        max_concurrency: int,
+        response_cache: Optional[LLMResponseCache] = None,
+    ):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.response_cache = response_cache
+        self._flight = SingleFlight()
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def start(self) -> None:
+        if self._client is None:
+            limits = httpx.Limits(
+                max_connections=self.max_concurrency * 2,
+                max_keepalive_connections=self.max_concurrency,
+            )
+            self._client = AsyncOpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                timeout=self.timeout,
+                max_retries=1,
+                http_client=httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=limits,
+                    transport=upstream_transport(limits),
+                ),
+            )
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    async def complete(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        cache_key: Optional[str] = None,
+        **params,
+    ) -> str:
+        if cache_key is None or self.response_cache is None:
+            return await self._complete(prompt, model or self.model, **params)
+
+        key = self.response_cache.make_key(model or self.model, cache_key, params)
+        completion = await self.response_cache.get(key)
+        metrics.llm_cache_requests.labels("miss" if completion is None else "hit").inc()
+        if completion is not None:
+            return completion
+
+        async def generate() -> str:
+            completion = await self._complete(prompt, model or self.model, **params)
+            await self.response_cache.set(key, completion)
+            return completion
+
+        return await self._flight.do(key, generate)
+
+    async def _complete(self, prompt: str, model: str, **params) -> str:
+        await self.start()
+        in_flight = metrics.llm_in_flight.labels("complete")
+        with span("llm.complete", **{"llm.model": model}) as current:
+            async with self._semaphore:
+                in_flight.inc()
+                started = time.perf_counter()
+                try:
+                    response = await self._client.chat.completions.create(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                        **params,
+                    )
+                finally:
+                    in_flight.dec()
+                    metrics.llm_duration.labels("complete").observe(time.perf_counter() - started)
+            _record_usage(model, response.usage, current)
+        return response.choices[0].message.content.strip()
+
+    async def stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        cache_key: Optional[str] = None,
+        **params,
+    ) -> AsyncIterator[str]:
+        """Yield content deltas as the model generates them.
+
+        A cached completion is yielded as a single delta; a fully streamed
+        one is stored for later calls.
+        """
+        key = None
+        if cache_key is not None and self.response_cache is not None:
+            key = self.response_cache.make_key(model or self.model, cache_key, params)
+            completion = await self.response_cache.get(key)
+            metrics.llm_cache_requests.labels("miss" if completion is None else "hit").inc()
+            if completion is not None:
+                yield completion
+                return
+
+        await self.start()
+        chunks = []
+        in_flight = metrics.llm_in_flight.labels("stream")
+        with span("llm.stream", **{"llm.model": model or self.model}) as current:
+            async with self._semaphore:
+                in_flight.inc()
+                started = time.perf_counter()
+                try:
+                    response = await self._client.chat.completions.create(
+                        model=model or self.model,
+                        messages=[{"role": "user", "content": prompt}],
+                        stream=True,
+                        # Chunk cuối mang usage để đếm token như khi không stream
+                        stream_options={"include_usage": True},
+                        **params,
+                    )
+                    async for chunk in response:
+                        if chunk.usage is not None:
+                            _record_usage(model or self.model, chunk.usage, current)
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            if not chunks:
+                                metrics.llm_ttft.labels().observe(time.perf_counter() - started)
+                                current.add_event("first_token")
+                            chunks.append(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+                finally:
+                    in_flight.dec()
+                    metrics.llm_duration.labels("stream").observe(time.perf_counter() - started)
+        if key is not None:
+            await self.response_cache.set(key, "".join(chunks).strip())
+
+
+def _record_usage(model: str, usage, current_span) -> None:
+    if usage is None:
+        return
+    metrics.llm_tokens.labels(model, "prompt").inc(usage.prompt_tokens or 0)
+    metrics.llm_tokens.labels(model, "completion").inc(usage.completion_tokens or 0)
+    metrics.llm_prompt_tokens.labels().observe(usage.prompt_tokens or 0)
+    current_span.set_attribute("llm.prompt_tokens", usage.prompt_tokens or 0)
+    current_span.set_attribute("llm.completion_tokens", usage.completion_tokens or 0)
+
+
+llm_client = LLMClient(
+    base_url=settings.LLM_BASE_URL,
+    api_key=settings.OPENROUTER_API_KEY,
+    model=settings.LLM_MODEL,
+    timeout=settings.LLM_TIMEOUT,
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    response_cache=llm_response_cache if settings.LLM_CACHE_ENABLED else None,
+)
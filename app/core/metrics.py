@@ -0,0 +1,304 @@
+import asyncio
+import contextvars
+import functools
+import math
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.tracing import span
+
+# Bucket (giây) cho độ trễ: từ vài ms (cache) tới vài phút (LLM)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+# Các upstream của GatewayClient; request không gọi upstream nào vẫn được ghi nhận là 0
+UPSTREAMS = ("gateway", "cms")
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self.labels()
+
+    def labels(self, *values: str):
+        """Child for one label combination; resolve it once and keep it on hot paths."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: Tuple[str, ...], child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        # Lưu số đếm theo từng bucket, chỉ cộng dồn khi xuất /metrics
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def _render_child(self, values: Tuple[str, ...], child: _HistogramValue) -> List[str]:
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (math.inf,), child.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    """Process-local metrics exposed in the Prometheus text format.
+
+    Updates are plain attribute arithmetic on the event loop thread, so
+    instrumenting a hot path costs a dict lookup and a `bisect` at most.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being served")
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency until the last body byte", ["route", "method", "status"]
+)
+reports_in_flight = registry.gauge(
+    "insight_reports_in_flight", "Insight pipelines running (after request coalescing)", ["kind"]
+)
+stage_duration = registry.histogram(
+    "insight_stage_duration_seconds", "Latency of one insight pipeline stage (cache hits included)", ["stage"]
+)
+upstream_duration = registry.histogram(
+    "upstream_request_duration_seconds", "Latency of one gateway call", ["upstream", "operation"]
+)
+upstream_requests = registry.counter(
+    "upstream_requests_total", "Gateway calls by outcome", ["upstream", "operation", "status"]
+)
+upstream_in_flight = registry.gauge(
+    "upstream_requests_in_flight", "Gateway calls waiting for a response", ["upstream"]
+)
+upstream_calls_per_request = registry.histogram(
+    "upstream_calls_per_request", "Gateway calls made while serving one HTTP request", ["route", "upstream"], COUNT_BUCKETS
+)
+cache_requests = registry.counter(
+    "cache_requests_total", "Layered cache lookups by tier and result", ["namespace", "tier", "result"]
+)
+report_cache_requests = registry.counter(
+    "insight_report_cache_total", "Report cache lookups per report kind (hit, stale, miss)", ["kind", "result"]
+)
+report_failures = registry.counter(
+    "insight_report_failures_total", "Insight pipelines that produced no report (foreground or background refresh)", ["kind"]
+)
+llm_in_flight = registry.gauge("llm_requests_in_flight", "LLM generations running", ["mode"])
+llm_duration = registry.histogram("llm_request_duration_seconds", "LLM generation latency", ["mode"])
+llm_ttft = registry.histogram("llm_time_to_first_token_seconds", "Time until the first streamed LLM token")
+llm_tokens = registry.counter("llm_tokens_total", "LLM tokens reported by the provider", ["model", "type"])
+llm_prompt_tokens = registry.histogram(
+    "llm_prompt_tokens", "Prompt size per LLM call as reported by the provider", buckets=TOKEN_BUCKETS
+)
+llm_cache_requests = registry.counter("llm_cache_total", "LLM response cache lookups", ["result"])
+
+
+class RequestStats:
+    """Counters of the HTTP request being served, shared with its child tasks."""
+    __slots__ = ("upstream_calls",)
+
+    def __init__(self):
+        self.upstream_calls: Dict[str, int] = {}
+
+
+current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("current_request", default=None)
+
+
+def count_upstream_call(upstream: str) -> None:
+    stats = current_request.get()
+    if stats is not None:
+        stats.upstream_calls[upstream] = stats.upstream_calls.get(upstream, 0) + 1
+
+
+def timed(stage: str) -> Callable:
+    """Decorator recording the duration of a sync or async function as a pipeline stage.
+
+    With tracing enabled the call is also wrapped in a span named after the stage.
+    """
+    child = stage_duration.labels(stage)
+
+    def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    with span(stage):
+                        return await func(*args, **kwargs)
+                finally:
+                    child.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with span(stage):
+                    return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - started)
+        return wrapper
+
+    return decorator
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request and counting its gateway calls.
+
+    Routes are labelled with their path template (`/sov/generate_insight`),
+    unmatched paths with "unmatched", so label cardinality stays bounded.
+    Streaming responses are timed until their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Optional[Dict[Callable, str]] = None
+
+    def _route(self, scope) -> str:
+        if self._route_paths is None:
+            self._route_paths = {
+                route.endpoint: route.path for route in scope["app"].routes if hasattr(route, "endpoint")
+            }
+        return self._route_paths.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+        in_flight = http_requests_in_flight.labels()
+        in_flight.inc()
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            current_request.reset(token)
+            route = self._route(scope)
+            http_request_duration.labels(route, scope["method"], str(status)).observe(time.perf_counter() - started)
+            for upstream in UPSTREAMS:
+                upstream_calls_per_request.labels(route, upstream).observe(stats.upstream_calls.get(upstream, 0))
@@ -0,0 +1,287 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Không đi xuống dưới vòng lặp sự kiện: stack CPU bắt đầu từ bước chạy của task
+LOOP_ENTRY = ("_run", os.path.join("asyncio", "events.py"))
+# Chi tiết nội bộ của asyncio (CPython) mà sampler đọc; có thể không tồn tại ở phiên bản khác
+_CURRENT_TASKS = getattr(asyncio.tasks, "_current_tasks", None)
+_HAS_FUT_WAITER = hasattr(asyncio.Task, "_fut_waiter")
+
+
+class RequestProfile:
+    """Stack samples of one request in folded ("a;b;c count") form.
+
+    `wall` samples the await chain of every pending task of the request at
+    each tick, so parallel branches each add a sample; `cpu` samples the
+    event-loop thread only while it runs a task of this request.
+    """
+
+    def __init__(self, name: str, method: str, path: str, forced: bool):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.forced = forced
+        self.root: Optional[asyncio.Task] = None
+        self.started = time.perf_counter()
+        self.started_cpu = time.process_time()
+        self.wall: Counter = Counter()
+        self.cpu: Counter = Counter()
+        self.ticks = 0
+
+
+current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("current_profile", default=None)
+
+
+class SamplingProfiler:
+    """Background-thread sampler for in-flight requests of one event loop.
+
+    Every `interval` seconds the sampler thread reads the loop thread's stack
+    and the await chain of each profiled request; the loop itself only pays
+    for a contextvar lookup per created task. Profiles of requests slower than
+    `threshold` (or forced through the debug header) are written to
+    `directory`, keeping the newest `max_files` captures.
+
+    The task-to-request map is shared with the sampler thread, so every
+    change to it happens under `_lock`; the sampler only holds the lock to
+    copy the maps and to add its samples, never while walking stacks. CPU attribution relies on CPython
+    asyncio internals and is turned off, with a warning, where they are missing.
+    """
+
+    def __init__(self, interval: float, threshold: float, directory: str, max_files: int):
+        self.interval = interval
+        self.threshold = threshold
+        self.directory = directory
+        self.max_files = max_files
+        self._active: Dict[int, RequestProfile] = {}
+        self._task_profiles: Dict[asyncio.Task, RequestProfile] = {}
+        self._labels: Dict[object, str] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._sequence = 0
+        self._cpu_enabled = _CURRENT_TASKS is not None and hasattr(sys, "_current_frames")
+        if not self._cpu_enabled:
+            logger.warning("asyncio internals for CPU attribution not found; profiles will only have wall samples")
+        if not _HAS_FUT_WAITER:
+            logger.warning("asyncio.Task._fut_waiter not found; wall samples will include tasks waiting on child tasks")
+
+    def _attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        previous = loop.get_task_factory()
+
+        def task_factory(loop, coro, **kwargs):
+            task = previous(loop, coro, **kwargs) if previous else asyncio.Task(coro, loop=loop, **kwargs)
+            profile = current_profile.get()
+            if profile is not None:
+                with self._lock:
+                    self._task_profiles[task] = profile
+                task.add_done_callback(self._forget_task)
+            return task
+
+        loop.set_task_factory(task_factory)
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+            self._thread.start()
+
+    def _forget_task(self, task: asyncio.Task) -> None:
+        with self._lock:
+            self._task_profiles.pop(task, None)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def start_request(self, method: str, path: str, forced: bool) -> RequestProfile:
+        self._attach(asyncio.get_running_loop())
+        self._sequence += 1
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+        # Tên capture theo thời điểm bắt đầu để vòng file xoá đúng bản cũ nhất
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{self._sequence % 100000:05d}-{slug}"
+        profile = RequestProfile(name, method, path, forced)
+        profile.root = asyncio.current_task()
+        with self._lock:
+            self._task_profiles[profile.root] = profile
+            self._active[id(profile)] = profile
+        return profile
+
+    async def finish_request(self, profile: RequestProfile) -> bool:
+        """Stop sampling `profile`; write it if the request was slow or forced."""
+        with self._lock:
+            self._active.pop(id(profile), None)
+            self._task_profiles.pop(profile.root, None)
+        elapsed = time.perf_counter() - profile.started
+        if not profile.forced and elapsed < self.threshold:
+            return False
+        await asyncio.to_thread(self._write, profile, elapsed)
+        return True
+
+    # Các hàm dưới đây chạy trên thread lấy mẫu
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            if not self._active:
+                continue
+            try:
+                self._sample()
+            except Exception as e:
+                logger.debug("Profiler sample failed: %s", e)
+
+    def _sample(self) -> None:
+        # Chỉ giữ lock khi chụp lại các map và khi cộng mẫu; việc dựng stack làm ngoài lock
+        # để task_factory/_forget_task trên vòng lặp sự kiện không phải chờ
+        with self._lock:
+            task_profiles = dict(self._task_profiles)
+            active = dict(self._active)
+
+        samples = []
+        running = _CURRENT_TASKS.get(self._loop) if self._cpu_enabled else None
+        owner = task_profiles.get(running) if running is not None else None
+        if owner is not None:
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                samples.append((owner.cpu, id(owner), self._thread_stack(frame)))
+        for task, profile in task_profiles.items():
+            if id(profile) not in active or task.done():
+                continue
+            # Task chỉ đang chờ task con (gather, await task) thì đã được thể hiện qua các task con
+            waiter = task._fut_waiter if _HAS_FUT_WAITER else None
+            if isinstance(waiter, asyncio.Task) or getattr(waiter, "_children", None):
+                continue
+            stack = self._coroutine_stack(task.get_coro())
+            if stack:
+                samples.append((profile.wall, id(profile), stack))
+
+        # Request đã kết thúc trong lúc dựng stack thì bỏ mẫu: profile của nó có thể đang được ghi ra file
+        with self._lock:
+            for profile_id, profile in active.items():
+                if profile_id in self._active:
+                    profile.ticks += 1
+            for counter, profile_id, stack in samples:
+                if profile_id in self._active:
+                    counter[stack] += 1
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            for prefix in sorted(sys.path, key=len, reverse=True):
+                if prefix and filename.startswith(prefix):
+                    filename = filename[len(prefix):].lstrip(os.sep)
+                    break
+            label = self._labels[code] = f"{code.co_qualname} ({filename}:{code.co_firstlineno})"
+        return label
+
+    def _thread_stack(self, frame) -> str:
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            if code.co_name == LOOP_ENTRY[0] and code.co_filename.endswith(LOOP_ENTRY[1]):
+                break
+            labels.append(self._label(code))
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+    def _coroutine_stack(self, coro) -> str:
+        """Logical stack of a (possibly suspended) coroutine, following its `await` chain."""
+        labels = []
+        while coro is not None and len(labels) < 200:
+            frame = getattr(coro, "cr_frame", None) or getattr(coro, "ag_frame", None) or getattr(coro, "gi_frame", None)
+            if frame is None:
+                break
+            labels.append(self._label(frame.f_code))
+            coro = getattr(coro, "cr_await", None) or getattr(coro, "ag_await", None) or getattr(coro, "gi_yieldfrom", None)
+        return ";".join(labels)
+
+    # Ghi file, gọi từ vòng lặp sự kiện qua asyncio.to_thread
+
+    def _write(self, profile: RequestProfile, elapsed: float) -> None:
+        name = profile.name
+        os.makedirs(self.directory, exist_ok=True)
+        for kind, samples in (("wall", profile.wall), ("cpu", profile.cpu)):
+            with open(os.path.join(self.directory, f"{name}.{kind}.folded"), "w", encoding="utf-8") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in samples.most_common() if stack)
+        meta = {
+            "method": profile.method,
+            "path": profile.path,
+            "forced": profile.forced,
+            "wall_ms": round(elapsed * 1000, 1),
+            # CPU của cả tiến trình trong thời gian request, gồm cả các request khác chạy song song
+            "process_cpu_ms": round((time.process_time() - profile.started_cpu) * 1000, 1),
+            "interval_ms": self.interval * 1000,
+            "ticks": profile.ticks,
+            "cpu_samples": sum(profile.cpu.values()),
+        }
+        with open(os.path.join(self.directory, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        self._trim()
+
+    def _trim(self) -> None:
+        captures = sorted({entry.split(".", 1)[0] for entry in os.listdir(self.directory) if entry.endswith(".json")})
+        for name in captures[:-self.max_files] if len(captures) > self.max_files else []:
+            for suffix in (".wall.folded", ".cpu.folded", ".json"):
+                try:
+                    os.remove(os.path.join(self.directory, name + suffix))
+                except FileNotFoundError:
+                    pass
+
+
+profiler = SamplingProfiler(
+    interval=settings.PROFILING_INTERVAL_MS / 1000,
+    threshold=settings.PROFILING_THRESHOLD_MS / 1000,
+    directory=settings.PROFILING_DIR,
+    max_files=settings.PROFILING_MAX_FILES,
+)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware sampling every request and keeping profiles of slow ones.
+
+    A request carrying the `PROFILING_HEADER` header is always kept; its
+    response names the capture in `X-Profile-Id`.
+    """
+
+    def __init__(self, app, sampler: SamplingProfiler = profiler):
+        self.app = app
+        self.sampler = sampler
+        self.header = settings.PROFILING_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        forced = any(name == self.header and value not in (b"", b"0") for name, value in scope["headers"])
+        profile = self.sampler.start_request(scope["method"], scope["path"], forced)
+        token = current_profile.set(profile)
+
+        async def send_wrapper(message):
+            if forced and message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((b"x-profile-id", profile.name.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            if await self.sampler.finish_request(profile):
+                logger.info("Profile of %s %s written: %s", scope["method"], scope["path"], profile.name)
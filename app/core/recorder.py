@@ -0,0 +1,94 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+import httpx
+import orjson
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+RECORD_MODES = ("off", "record", "replay")
+
+
+def recording_key(method: str, url: str, body: bytes) -> str:
+    """Digest of an upstream request: method, URL path and JSON body.
+
+    The host is left out so a recording made against the live gateway can be
+    served by the stand-in server; headers (tokens) are never part of the key.
+    """
+    try:
+        body = orjson.dumps(orjson.loads(body), option=orjson.OPT_SORT_KEYS) if body else b""
+    except orjson.JSONDecodeError:
+        pass
+    path = httpx.URL(url).path
+    return hashlib.sha256(method.upper().encode() + b" " + path.encode() + b"\n" + body).hexdigest()
+
+
+def load_recording(directory: str, key: str) -> Optional[Dict]:
+    path = os.path.join(directory, f"{key}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """httpx transport that captures or replays upstream request/response pairs.
+
+    `record` forwards requests to `inner` and writes one JSON file per
+    request under `directory`; `replay` answers from those files only and
+    fails requests that were never recorded. Streamed responses are read in
+    full before being recorded.
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, mode: str, directory: str):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unsupported record mode: {mode}")
+        self.inner = inner
+        self.mode = mode
+        self.directory = directory
+        if mode == "record":
+            os.makedirs(directory, exist_ok=True)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        key = recording_key(request.method, str(request.url), body)
+
+        if self.mode == "replay":
+            recording = load_recording(self.directory, key)
+            if recording is None:
+                raise httpx.ConnectError(f"No recording for {request.method} {request.url.path} ({key})", request=request)
+            response = recording["response"]
+            return httpx.Response(
+                response["status_code"],
+                headers=response["headers"],
+                content=response["body"].encode("utf-8"),
+                request=request,
+            )
+
+        response = await self.inner.handle_async_request(request)
+        content = await response.aread()
+        await response.aclose()
+        headers = {name: value for name, value in response.headers.items() if name.lower() == "content-type"}
+        recording = {
+            "request": {"method": request.method, "path": request.url.path, "body": body.decode("utf-8", "replace")},
+            "response": {"status_code": response.status_code, "headers": headers, "body": content.decode("utf-8", "replace")},
+        }
+        with open(os.path.join(self.directory, f"{key}.json"), "w", encoding="utf-8") as f:
+            json.dump(recording, f, ensure_ascii=False)
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+def upstream_transport(limits: httpx.Limits) -> Optional[httpx.AsyncBaseTransport]:
+    """Transport for upstream clients: None (httpx default) unless `RECORD_MODE` is set."""
+    if settings.RECORD_MODE == "off":
+        return None
+    logger.info("Upstream calls in %s mode, recordings in %s", settings.RECORD_MODE, settings.RECORD_DIR)
+    return RecordingTransport(httpx.AsyncHTTPTransport(limits=limits), settings.RECORD_MODE, settings.RECORD_DIR)
@@ -0,0 +1,88 @@
+import logging
+
+from opentelemetry import trace
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("competitors-insight")
+_provider = None
+
+
+class _NoSpan:
+    """Context manager used while tracing is off: no context switch, no allocation."""
+
+    def __enter__(self):
+        return trace.INVALID_SPAN
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **attributes):
+    """Child span of the current span, or a no-op when tracing is disabled.
+
+    The yielded span always accepts `set_attribute`; check `is_recording()`
+    before computing attributes that are expensive to build.
+    """
+    if _provider is None:
+        return _NO_SPAN
+    return tracer.start_as_current_span(name, attributes=attributes or None)
+
+
+def _exporter():
+    if settings.TRACING_EXPORTER == "otlp":
+        # Endpoint, header và timeout đọc từ các biến OTEL_EXPORTER_OTLP_* chuẩn
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter()
+    if settings.TRACING_EXPORTER == "file":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        # Mỗi span một dòng JSON để dễ đọc lại bằng jq hoặc script
+        out = open(settings.TRACING_FILE, "a", encoding="utf-8")
+        return ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+    raise ValueError(f"Unknown TRACING_EXPORTER: {settings.TRACING_EXPORTER}")
+
+
+def setup_tracing(app) -> None:
+    """Install the tracer provider and instrument `app` when `TRACING_ENABLED` is set.
+
+    Sampling follows the parent's decision and otherwise keeps
+    `TRACING_SAMPLE_RATIO` of the requests.
+    """
+    global _provider
+    if not settings.TRACING_ENABLED or _provider is not None:
+        return
+
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.TRACING_SERVICE_NAME, "service.version": settings.APP_VERSION}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(_exporter()))
+    trace.set_tracer_provider(provider)
+    _provider = provider
+    FastAPIInstrumentor.instrument_app(
+        app,
+        tracer_provider=provider,
+        excluded_urls="health,metrics",
+        # Bỏ span cho từng chunk nhận/gửi, nếu không mỗi token SSE là một span
+        exclude_spans=["receive", "send"],
+    )
+    logger.info("Tracing enabled: exporter=%s, sample ratio=%s", settings.TRACING_EXPORTER, settings.TRACING_SAMPLE_RATIO)
+
+
+def shutdown_tracing() -> None:
+    """Flush buffered spans; called when the app stops."""
+    if _provider is not None:
+        _provider.shutdown()
@@ -1,29 +1,53 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi.responses import PlainTextResponse
 from starlette.middleware.cors import CORSMiddleware
 
-from app.api.routers import sov_insight, sentiment_breakdown_insight, brand_health, channel_breakdown, brand_attribute_by_sentiment, mention_trendlines
-from app.core.cache import init_cache
+from app.api.routers import sov_insight, sentiment_breakdown_insight, brand_health, channel_breakdown, brand_attribute_by_sentiment, mention_trendlines, jobs, dashboard
+from app.core.cache import cache, init_cache
 from app.core.config import settings
+from app.core.http_client import gateway_client
+from app.core.llm_client import llm_client
+from app.core.metrics import MetricsMiddleware, registry
+from app.core.profiling import ProfilingMiddleware, profiler
+from app.core.tracing import setup_tracing, shutdown_tracing
+from app.services.cache_warmer import cache_warmer
+from app.services.job_queue import job_queue
+from app.services.prompt_compaction import token_counter
 from app.services.sb_api_service import APISentimentAggregationService
-from fastapi_cache import FastAPICache
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_cache()
+    token_counter.start()
+    await gateway_client.start()
+    await llm_client.start()
+    await job_queue.start()
+    await cache_warmer.start()
+    yield
+    await cache_warmer.stop()
+    await job_queue.stop()
+    await llm_client.close()
+    await gateway_client.close()
+    await cache.close()
+    shutdown_tracing()
+    profiler.stop()
+
+
 app = FastAPI(
     title="Competitors Analysis API",
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
-@app.on_event("startup")
-async def startup():
-    FastAPICache.init(InMemoryBackend())
-
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Có thể thay "*" bằng danh sách origin cụ thể để bảo mật hơn
@@ -31,6 +55,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if settings.PROFILING_ENABLED:
+    # Thêm trước tracing để span của request bao trọn cả thời gian lấy mẫu
+    app.add_middleware(ProfilingMiddleware)
+setup_tracing(app)
 
 app.include_router(sov_insight.router)
 app.include_router(sentiment_breakdown_insight.router)
@@ -38,6 +68,13 @@ app.include_router(brand_health.router)
 app.include_router(channel_breakdown.router)
 app.include_router(brand_attribute_by_sentiment.router)
 app.include_router(mention_trendlines.router)
+app.include_router(jobs.router)
+app.include_router(dashboard.router)
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/health")
 async def health_check():
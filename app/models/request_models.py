@@ -1,9 +1,89 @@
-from pydantic import BaseModel, Field
-from typing import List
+from datetime import date, timedelta
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional, Tuple
+
+from app.core.config import settings
+
+class Period(BaseModel):
+    from_date: str = Field(..., description="Start date in 'YYYY-MM-DDTHH:MM' format")
+    to_date: str = Field(..., description="End date in 'YYYY-MM-DDTHH:MM' format")
+
+class RollingWindow(BaseModel):
+    granularity: Literal["day", "week", "month"] = Field(..., description="Length of each period")
+    count: int = Field(..., ge=2, description="Number of periods, most recent first")
+    end_date: Optional[str] = Field(None, description="Last day covered ('YYYY-MM-DD'), defaults to yesterday")
+
+    def periods(self, today: Optional[date] = None) -> List[Period]:
+        """Consecutive periods ending on `end_date`, most recent first.
+
+        `day` and `week` are rolling 1/7-day blocks; `month` uses calendar
+        months, the most recent one cut at `end_date`.
+        """
+        end = date.fromisoformat(self.end_date) if self.end_date else (today or date.today()) - timedelta(days=1)
+        periods = []
+        for _ in range(self.count):
+            if self.granularity == "month":
+                start = end.replace(day=1)
+            else:
+                start = end - timedelta(days=0 if self.granularity == "day" else 6)
+            periods.append(Period(from_date=f"{start.isoformat()}T00:00", to_date=f"{end.isoformat()}T23:59"))
+            end = start - timedelta(days=1)
+        return periods
 
 class InsightRequest(BaseModel):
+    """Topics plus the periods to compare, most recent first.
+
+    Periods come from `periods`, from a `rolling` spec, or from the legacy
+    `from_date1..to_date2` pair. After validation `periods` is always set
+    (a rolling spec is resolved into it) and the legacy fields mirror the
+    first two periods.
+    """
     topic_ids: List[str] = Field(..., min_items=1, description="List of topic IDs")
-    from_date1: str = Field(..., description="Start date for period 1 in 'YYYY-MM-DDTHH:MM' format")
-    to_date1: str = Field(..., description="End date for period 1 in 'YYYY-MM-DDTHH:MM' format")
-    from_date2: str = Field(..., description="Start date for period 2 in 'YYYY-MM-DDTHH:MM' format")
-    to_date2: str = Field(..., description="End date for period 2 in 'YYYY-MM-DDTHH:MM' format")
\ No newline at end of file
+    from_date1: Optional[str] = Field(None, description="Start date for period 1 in 'YYYY-MM-DDTHH:MM' format")
+    to_date1: Optional[str] = Field(None, description="End date for period 1 in 'YYYY-MM-DDTHH:MM' format")
+    from_date2: Optional[str] = Field(None, description="Start date for period 2 in 'YYYY-MM-DDTHH:MM' format")
+    to_date2: Optional[str] = Field(None, description="End date for period 2 in 'YYYY-MM-DDTHH:MM' format")
+    periods: Optional[List[Period]] = Field(None, description="Periods to compare, most recent first")
+    rolling: Optional[RollingWindow] = Field(None, description="Rolling periods, e.g. 8 weeks ending yesterday")
+
+    @model_validator(mode="after")
+    def resolve_periods(self) -> "InsightRequest":
+        if self.rolling is not None:
+            if self.periods:
+                raise ValueError("Provide either periods or rolling, not both")
+            self.periods = self.rolling.periods()
+            # Khoá cache dựa trên các khoảng đã tính, request rolling và periods tương đương dùng chung cache
+            self.rolling = None
+        elif not self.periods:
+            legacy = (self.from_date1, self.to_date1, self.from_date2, self.to_date2)
+            if not all(legacy):
+                raise ValueError("Provide periods, rolling or from_date1/to_date1/from_date2/to_date2")
+            self.periods = [
+                Period(from_date=self.from_date1, to_date=self.to_date1),
+                Period(from_date=self.from_date2, to_date=self.to_date2),
+            ]
+
+        if not 2 <= len(self.periods) <= settings.MAX_PERIODS:
+            raise ValueError(f"Between 2 and {settings.MAX_PERIODS} periods are supported")
+        # Field cũ chỉ được đi kèm periods khi trùng khớp (request dựng lại từ model_dump của request khác)
+        mirrored = (self.periods[0].from_date, self.periods[0].to_date, self.periods[1].from_date, self.periods[1].to_date)
+        legacy = (self.from_date1, self.to_date1, self.from_date2, self.to_date2)
+        if any(value is not None and value != expected for value, expected in zip(legacy, mirrored)):
+            raise ValueError("Provide either periods, rolling or from_date1/to_date1/from_date2/to_date2, not a mix")
+        self.from_date1, self.to_date1 = self.periods[0].from_date, self.periods[0].to_date
+        self.from_date2, self.to_date2 = self.periods[1].from_date, self.periods[1].to_date
+        return self
+
+    def period_ranges(self) -> List[Tuple[str, str]]:
+        return [(period.from_date, period.to_date) for period in self.periods]
+
+class TrendlineInsightRequest(InsightRequest):
+    interval: Optional[Literal["day", "week", "month"]] = Field(
+        None, description="Trendline bucket size, defaults to TRENDLINE_INTERVAL"
+    )
+
+class InsightJobRequest(InsightRequest):
+    callback_url: Optional[str] = Field(None, description="URL that receives the finished job as a JSON POST")
+
+class DashboardInsightRequest(InsightRequest):
+    kinds: List[str] = Field(..., min_items=1, description="Report kinds to generate, e.g. ['sov', 'sentiment_breakdown']")
@@ -0,0 +1,289 @@
+import asyncio
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from cachetools import LRUCache
+
+from app.core.config import settings
+from app.core.exceptions import InvalidResponseException
+
+DATE_FORMAT = "%Y-%m-%dT%H:%M"
+# Tên bucket gateway trả về cho các aggregation lồng nhau (theo quy ước `<field>_<type>`).
+# `_index_terms` và `sentiment.value_terms` đã được xác nhận từ code gốc đọc query sentiment
+INDEX_BUCKETS = "_index_terms"
+DATE_BUCKETS = "publishedDate_date_histogram"
+SENTIMENT_BUCKETS = "sentiment.value_terms"
+
+BucketMetrics = Callable[[Dict], Sequence[int]]
+
+
+class DaySeries:
+    """Per-day metric rows of one topic, stored as a contiguous int64 array.
+
+    Row `i` holds the metrics of day `start + i` (proleptic ordinal); `known`
+    marks the rows that were actually fetched.
+    """
+    __slots__ = ("width", "start", "counts", "known")
+
+    def __init__(self, width: int):
+        self.width = width
+        self.start: Optional[int] = None
+        self.counts = np.zeros((0, width), dtype=np.int64)
+        self.known = np.zeros(0, dtype=bool)
+
+    def _ensure(self, first: int, last: int) -> None:
+        if self.start is None:
+            self.start = first
+        end = self.start + len(self.known) - 1
+        new_start, new_end = min(self.start, first), max(end, last)
+        if new_start == self.start and new_end == end:
+            return
+        counts = np.zeros((new_end - new_start + 1, self.width), dtype=np.int64)
+        known = np.zeros(new_end - new_start + 1, dtype=bool)
+        offset = self.start - new_start
+        counts[offset:offset + len(self.known)] = self.counts
+        known[offset:offset + len(self.known)] = self.known
+        self.start, self.counts, self.known = new_start, counts, known
+
+    def put(self, first: int, rows: np.ndarray) -> None:
+        last = first + len(rows) - 1
+        self._ensure(first, last)
+        offset = first - self.start
+        self.counts[offset:offset + len(rows)] = rows
+        self.known[offset:offset + len(rows)] = True
+
+    def missing(self, first: int, last: int) -> List[int]:
+        if self.start is None:
+            return list(range(first, last + 1))
+        days = np.arange(first, last + 1)
+        index = days - self.start
+        inside = (index >= 0) & (index < len(self.known))
+        known = np.zeros(len(days), dtype=bool)
+        known[inside] = self.known[index[inside]]
+        return days[~known].tolist()
+
+    def total(self, first: int, last: int) -> np.ndarray:
+        offset = first - self.start
+        return self.counts[offset:offset + last - first + 1].sum(axis=0)
+
+
+@dataclass(frozen=True)
+class WindowPlan:
+    """A request window split into settled full days and partial-day edges."""
+    first_day: Optional[int]
+    last_day: Optional[int]
+    edges: List[Tuple[str, str]]
+
+
+def plan_window(from_date: str, to_date: str, settled_before: datetime) -> WindowPlan:
+    from_dt = datetime.strptime(from_date, DATE_FORMAT)
+    to_dt = datetime.strptime(to_date, DATE_FORMAT)
+
+    first = from_dt.date() if from_dt.time() == time.min else from_dt.date() + timedelta(days=1)
+    last = to_dt.date() if to_dt.time() >= time(23, 59) else to_dt.date() - timedelta(days=1)
+    # Ngày chưa "chốt" số liệu không được lưu, hỏi trực tiếp như một cạnh
+    last = min(last, settled_before.date() - timedelta(days=1))
+    if first > last:
+        return WindowPlan(None, None, [(from_date, to_date)])
+
+    edges = []
+    if from_dt < datetime.combine(first, time.min):
+        edges.append((from_date, _day_end(first - timedelta(days=1))))
+    if to_dt > datetime.combine(last, time(23, 59)):
+        edges.append((_day_start(last + timedelta(days=1)), to_date))
+    return WindowPlan(first.toordinal(), last.toordinal(), edges)
+
+
+def _day_start(day: date) -> str:
+    return datetime.combine(day, time.min).strftime(DATE_FORMAT)
+
+
+def _day_end(day: date) -> str:
+    return datetime.combine(day, time(23, 59)).strftime(DATE_FORMAT)
+
+
+def date_histogram_agg(nest: Optional[List[Dict]] = None, interval: str = "1d") -> Dict:
+    agg = {
+        "type": "DATE_HISTOGRAM",
+        "field": "PUBLISHED_DATE",
+        "option": {"dateHistogram": {"interval": interval, "timeZone": settings.AGGREGATION_TIMEZONE}},
+    }
+    if nest:
+        agg["nest"] = nest
+    return agg
+
+
+def _bucket_day(bucket: Dict) -> int:
+    if bucket.get("key_as_string"):
+        return date.fromisoformat(bucket["key_as_string"][:10]).toordinal()
+    moment = datetime.fromtimestamp(bucket["key"] / 1000, ZoneInfo(settings.AGGREGATION_TIMEZONE))
+    return moment.date().toordinal()
+
+
+def index_buckets(data: Optional[Dict]) -> List[Dict]:
+    """Buckets of the TERMS(INDEX) aggregation of a gateway `aggregations` result.
+
+    A non-empty result without `INDEX_BUCKETS` means the gateway named the
+    bucket differently; raising beats reporting every topic with 0 mentions.
+    """
+    if not data:
+        return []
+    if INDEX_BUCKETS not in data:
+        raise InvalidResponseException(
+            detail=f"Aggregation result has no {INDEX_BUCKETS} bucket (got: {', '.join(sorted(map(str, data)))})"
+        )
+    return data[INDEX_BUCKETS].get("buckets", [])
+
+
+def parse_index_totals(data: Optional[Dict], metrics: BucketMetrics) -> Dict[str, np.ndarray]:
+    """Map `topic<id>` index buckets of a TERMS(INDEX) aggregation to metric vectors."""
+    return {
+        bucket["key"]: np.asarray(metrics(bucket), dtype=np.int64)
+        for bucket in index_buckets(data)
+    }
+
+
+def parse_index_histogram(data: Optional[Dict], metrics: BucketMetrics) -> Dict[str, Dict[int, np.ndarray]]:
+    """Map `topic<id>` buckets of TERMS(INDEX) > DATE_HISTOGRAM to per-day metric vectors."""
+    result = {}
+    for bucket in index_buckets(data):
+        result[bucket["key"]] = {
+            _bucket_day(day): np.asarray(metrics(day), dtype=np.int64)
+            for day in bucket.get(DATE_BUCKETS, {}).get("buckets", [])
+        }
+    return result
+
+
+def doc_count_metrics(bucket: Dict) -> Sequence[int]:
+    return (bucket.get("doc_count", 0),)
+
+
+def sentiment_metrics(bucket: Dict) -> Sequence[int]:
+    counts = {1: 0, 2: 0, 3: 0}
+    for sentiment in bucket.get(SENTIMENT_BUCKETS, {}).get("buckets", []):
+        if sentiment["key"] in counts:
+            counts[sentiment["key"]] = sentiment["doc_count"]
+    return bucket.get("doc_count", 0), counts[1], counts[2], counts[3]
+
+
+def day_runs(days: List[int]) -> List[Tuple[int, int]]:
+    """Group sorted day ordinals into `(first, last)` runs of consecutive days."""
+    runs: List[Tuple[int, int]] = []
+    for day in days:
+        if runs and day == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+class BucketStore:
+    """Process-local store of daily aggregation buckets per (kind, scope, topic).
+
+    A window is answered by summing stored settled days; only days not yet
+    stored (one date-histogram query per contiguous run) and partial-day
+    edges (small range queries) are fetched upstream.
+    """
+
+    def __init__(self, maxsize: int):
+        self._series = LRUCache(maxsize=maxsize)
+
+    def _get_series(self, kind: str, scope: str, index_key: str, width: int) -> DaySeries:
+        key = (kind, scope, index_key)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = DaySeries(width)
+        return series
+
+    async def _fill_missing(
+        self,
+        series: Dict[str, DaySeries],
+        missing: List[int],
+        width: int,
+        fetch_days: Callable[[str, str], Awaitable[Dict[str, Dict[int, np.ndarray]]]],
+    ) -> None:
+        # Mỗi dải ngày liên tiếp một query, không tải lại các ngày đã có ở giữa
+        await asyncio.gather(*(
+            self._fill_run(series, first, last, width, fetch_days) for first, last in day_runs(missing)
+        ))
+
+    async def _fill_run(
+        self,
+        series: Dict[str, DaySeries],
+        first: int,
+        last: int,
+        width: int,
+        fetch_days: Callable[[str, str], Awaitable[Dict[str, Dict[int, np.ndarray]]]],
+    ) -> None:
+        fetched = await fetch_days(_day_start(date.fromordinal(first)), _day_end(date.fromordinal(last)))
+        for key, s in series.items():
+            rows = np.zeros((last - first + 1, width), dtype=np.int64)
+            for day, values in fetched.get(key, {}).items():
+                if first <= day <= last:
+                    rows[day - first] = values
+            s.put(first, rows)
+
+    def _plan(self, kind: str, scope: str, index_keys: List[str], from_date: str, to_date: str, width: int):
+        settled_before = datetime.now() - timedelta(minutes=settings.DATA_CACHE_SETTLE_MINUTES)
+        plan = plan_window(from_date, to_date, settled_before)
+        series = {}
+        missing: List[int] = []
+        if plan.first_day is not None:
+            series = {key: self._get_series(kind, scope, key, width) for key in index_keys}
+            missing = sorted({day for s in series.values() for day in s.missing(plan.first_day, plan.last_day)})
+        return plan, series, missing
+
+    async def prefetch(
+        self,
+        kind: str,
+        scope: str,
+        index_keys: List[str],
+        periods: List[Tuple[str, str]],
+        width: int,
+        fetch_days: Callable[[str, str], Awaitable[Dict[str, Dict[int, np.ndarray]]]],
+    ) -> None:
+        """Load the settled days of all `periods` with one date-histogram query per missing run.
+
+        Only days inside a period are fetched: adjacent periods share a run,
+        while the gap between distant ones (year over year) is never loaded.
+        Later `totals` calls for these periods then only query partial-day edges.
+        """
+        series: Dict[str, DaySeries] = {}
+        missing = set()
+        for from_date, to_date in periods:
+            _, period_series, period_missing = self._plan(kind, scope, index_keys, from_date, to_date, width)
+            series.update(period_series)
+            missing.update(period_missing)
+        await self._fill_missing(series, sorted(missing), width, fetch_days)
+
+    async def totals(
+        self,
+        kind: str,
+        scope: str,
+        index_keys: List[str],
+        from_date: str,
+        to_date: str,
+        width: int,
+        fetch_totals: Callable[[str, str], Awaitable[Dict[str, np.ndarray]]],
+        fetch_days: Callable[[str, str], Awaitable[Dict[str, Dict[int, np.ndarray]]]],
+    ) -> Dict[str, np.ndarray]:
+        plan, series, missing = self._plan(kind, scope, index_keys, from_date, to_date, width)
+        totals = {index_key: np.zeros(width, dtype=np.int64) for index_key in index_keys}
+
+        # Các ngày còn thiếu và các cạnh lẻ được hỏi song song
+        _, *edge_totals = await asyncio.gather(
+            self._fill_missing(series, missing, width, fetch_days),
+            *(fetch_totals(edge_from, edge_to) for edge_from, edge_to in plan.edges),
+        )
+        for key, s in series.items():
+            totals[key] += s.total(plan.first_day, plan.last_day)
+        for edge in edge_totals:
+            for key, values in edge.items():
+                if key in totals:
+                    totals[key] += values
+        return totals
+
+bucket_store = BucketStore(maxsize=settings.BUCKET_STORE_MAXSIZE)
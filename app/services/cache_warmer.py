@@ -0,0 +1,187 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from cachetools import LRUCache
+
+from app.core.config import settings
+from app.models.request_models import InsightRequest, Period
+from app.services.insight_reports import REPORT_KINDS, ReportKind, refresh_report, report_is_fresh
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT = "%Y-%m-%dT%H:%M"
+
+
+class RequestShape(NamedTuple):
+    """An insight request with its dates made relative to the day it was sent.
+
+    Every period bound is stored as `(day offset, "HH:MM")`, so "last 7 days
+    vs the previous 7 days" recorded yesterday materializes to today's windows.
+    `fields` holds the kind's `request_fields` that were set, e.g. `interval`.
+    """
+    kind: str
+    topic_ids: Tuple[str, ...]
+    windows: Tuple[Tuple[int, str], ...]
+    fields: Tuple[Tuple[str, Any], ...] = ()
+
+
+def normalize_request(kind: ReportKind, request_data: InsightRequest, today: date) -> Optional[RequestShape]:
+    windows = []
+    for bound in (bound for period in request_data.period_ranges() for bound in period):
+        try:
+            moment = datetime.strptime(bound, DATE_FORMAT)
+        except ValueError:
+            return None
+        windows.append(((moment.date() - today).days, moment.strftime("%H:%M")))
+    fields = tuple(
+        (field, getattr(request_data, field))
+        for field in kind.request_fields
+        if getattr(request_data, field, None) is not None
+    )
+    return RequestShape(kind.name, tuple(request_data.topic_ids), tuple(windows), fields)
+
+
+def materialize_request(kind: ReportKind, shape: RequestShape, today: date) -> InsightRequest:
+    bounds = [f"{(today + timedelta(days=offset)).isoformat()}T{clock}" for offset, clock in shape.windows]
+    return kind.request_model(
+        topic_ids=list(shape.topic_ids),
+        periods=[Period(from_date=from_date, to_date=to_date) for from_date, to_date in zip(bounds[::2], bounds[1::2])],
+        **dict(shape.fields),
+    )
+
+
+class CacheWarmer:
+    """Regenerate the most requested report shapes ahead of user traffic.
+
+    Endpoints `record` every request; each run takes the `top_n` shapes by
+    hit count, skips those whose cached report is still fresh and
+    regenerates the rest with the service credential, at most `concurrency`
+    at a time and at most `llm_budget` generations per run.
+    """
+
+    def __init__(
+        self,
+        top_n: int,
+        concurrency: int,
+        llm_budget: int,
+        max_shapes: int,
+        state_file: str = "",
+    ):
+        self.top_n = top_n
+        self.concurrency = concurrency
+        self.llm_budget = llm_budget
+        self.state_file = state_file
+        self._hits: LRUCache = LRUCache(maxsize=max_shapes)
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, kind: ReportKind, request_data: InsightRequest) -> None:
+        if not settings.WARMER_ENABLED:
+            return
+        shape = normalize_request(kind, request_data, date.today())
+        if shape is not None:
+            self._hits[shape] = self._hits.get(shape, 0) + 1
+
+    def top_shapes(self) -> List[Tuple[RequestShape, int]]:
+        return heapq.nlargest(self.top_n, self._hits.items(), key=lambda item: item[1])
+
+    async def warm_once(self, x_token: str, x_refresh_token: str) -> Dict[str, int]:
+        today = date.today()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        stats = {"fresh": 0, "warmed": 0, "failed": 0, "over_budget": 0}
+
+        async def warm(kind: ReportKind, request_data: InsightRequest) -> None:
+            async with semaphore:
+                try:
+                    result = await refresh_report(kind, request_data, x_token, x_refresh_token)
+                except Exception as e:
+                    logger.warning("Cache warm-up of %s failed: %s", kind.name, e)
+                    result = None
+            stats["warmed" if result is not None else "failed"] += 1
+
+        tasks = []
+        for shape, _ in self.top_shapes():
+            kind = REPORT_KINDS.get(shape.kind)
+            if kind is None:
+                continue
+            request_data = materialize_request(kind, shape, today)
+            if await report_is_fresh(kind, request_data):
+                stats["fresh"] += 1
+            elif len(tasks) >= self.llm_budget:
+                stats["over_budget"] += 1
+            else:
+                tasks.append(warm(kind, request_data))
+        await asyncio.gather(*tasks)
+        return stats
+
+    async def _run(self) -> None:
+        await asyncio.sleep(settings.WARMER_STARTUP_DELAY)
+        while True:
+            try:
+                stats = await self.warm_once(settings.WARMER_X_TOKEN, settings.WARMER_X_REFRESH_TOKEN)
+                logger.info("Cache warm-up finished: %s", stats)
+            except Exception:
+                logger.exception("Cache warm-up run failed")
+            if settings.WARMER_INTERVAL <= 0:
+                return
+            await asyncio.sleep(settings.WARMER_INTERVAL)
+
+    async def start(self) -> None:
+        self.load()
+        if settings.WARMER_ENABLED and settings.WARMER_X_TOKEN and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.save()
+
+    def load(self) -> None:
+        if not self.state_file or not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                for item in json.load(f):
+                    shape = RequestShape(
+                        item["kind"],
+                        tuple(item["topic_ids"]),
+                        tuple((offset, clock) for offset, clock in item["windows"]),
+                        tuple((field, value) for field, value in item.get("fields", [])),
+                    )
+                    self._hits[shape] = self._hits.get(shape, 0) + item["hits"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Could not load warmer state from %s: %s", self.state_file, e)
+
+    def save(self) -> None:
+        if not self.state_file:
+            return
+        items = [
+            {
+                "kind": shape.kind,
+                "topic_ids": list(shape.topic_ids),
+                "windows": list(shape.windows),
+                "fields": list(shape.fields),
+                "hits": hits,
+            }
+            for shape, hits in self.top_shapes()
+        ]
+        try:
+            with open(self.state_file, "w", encoding="utf-8") as f:
+                json.dump(items, f, ensure_ascii=False)
+        except OSError as e:
+            logger.warning("Could not save warmer state to %s: %s", self.state_file, e)
+
+
+cache_warmer = CacheWarmer(
+    top_n=settings.WARMER_TOP_N,
+    concurrency=settings.WARMER_CONCURRENCY,
+    llm_budget=settings.WARMER_LLM_BUDGET,
+    max_shapes=settings.WARMER_MAX_SHAPES,
+    state_file=settings.WARMER_STATE_FILE,
+)
@@ -0,0 +1,105 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from app.core.llm_cache import prompt_cache_key
+from app.core.llm_client import llm_client
+from app.services.channels import CHANNELS, channel_matrix
+from app.services.comparison import compare_channels
+from app.services.prompt_compaction import CompactPrompt, channel_table, fit_prompt
+from app.services.sov_api_service import APISovService
+
+# Tăng khi nội dung template `_build_prompt` thay đổi
+PROMPT_VERSION = "channel-breakdown-v2"
+
+
+class ChannelBreakdownInsightService:
+    """Channel mix of the requested topics per period.
+
+    Every period is one TERMS(INDEX) > TERMS(TYPE) aggregation, all packed
+    into one gateway round-trip; source types are rolled up into channel
+    families and compared locally.
+    """
+
+    def __init__(self, x_token: str, x_refresh_token: str):
+        self.api_service = APISovService(x_token, x_refresh_token)
+
+    async def stream_insight(
+        self,
+        topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield `(event, data)` pairs: `delta` chunks of the report, then `result`."""
+        try:
+            data = await self.fetch_data(topic_ids, periods)
+            prompt = self._build_prompt(**data)
+            chunks = []
+            async for delta in llm_client.stream(prompt.text, cache_key=self._prompt_cache_key(data), temperature=0.7):
+                chunks.append(delta)
+                yield "delta", delta
+            yield "result", self._result("".join(chunks).strip(), prompt, data)
+        except Exception as e:
+            yield "error", f"[LỖI] Không thể tạo insight: {str(e)}"
+
+    async def fetch_data(
+        self,
+        topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+    ) -> Dict[str, Any]:
+        """Fetch and compare the channel mix, keyed like `_build_prompt` arguments."""
+        topic_data, channel_periods = await asyncio.gather(
+            asyncio.gather(*(self.api_service.get_topic_by_topic_id(topic_id) for topic_id in topic_ids)),
+            self.api_service.get_channel_periods(topic_ids, periods),
+        )
+        if not any(channel_periods):
+            raise ValueError("No channel data for the requested periods")
+
+        names = {topic["_id"]: topic["name"] for topic in topic_data if topic}
+        comparison = compare_channels(
+            channel_matrix(channel_periods, topic_ids),
+            [names.get(topic_id, topic_id) for topic_id in topic_ids],
+            CHANNELS,
+            [{"from_date": from_date, "to_date": to_date} for from_date, to_date in periods],
+        )
+        return {"comparison": comparison, "periods": periods}
+
+    async def report_from_data(self, data: Dict[str, Any]) -> Dict:
+        """Generate the report from data returned by `fetch_data`."""
+        prompt = self._build_prompt(**data)
+        report = await llm_client.complete(prompt.text, cache_key=self._prompt_cache_key(data), temperature=0.7)
+        return self._result(report, prompt, data)
+
+    def _result(self, report: str, prompt: CompactPrompt, data: Dict[str, Any]) -> Dict:
+        return {"report": report, "comparison": data["comparison"], "prompt_tokens": prompt.tokens}
+
+    def _prompt_cache_key(self, data: Dict[str, Any]) -> str:
+        return prompt_cache_key(PROMPT_VERSION, {
+            "periods": [f"{from_date[:10]}:{to_date[:10]}" for from_date, to_date in data["periods"]],
+            "topics": {
+                topic["topic"]: {channel["channel"]: channel["mentions"] for channel in topic["channels"]}
+                for topic in data["comparison"]["topics"]
+            },
+        })
+
+    def _build_prompt(self, comparison: Dict, periods: List[Tuple[str, str]]) -> CompactPrompt:
+        period_list = ", ".join(
+            f"GĐ{index} ({from_date} - {to_date})" for index, (from_date, to_date) in enumerate(periods, start=1)
+        )
+
+        def render(_: List[str]) -> str:
+            return f"""
+Dữ liệu phân bổ lượng đề cập theo kênh (Channel Breakdown) của {len(periods)} giai đoạn, mới nhất trước: {period_list}.
+Các chỉ số đã được tính sẵn (tỷ trọng là % trên tổng đề cập của topic trong giai đoạn, Δ là mỗi giai đoạn so với giai đoạn liền sau; dòng Tổng là tỷ trọng kênh trên toàn bộ topic); chỉ diễn giải, không tính lại.
+
+### Phân bổ theo kênh
+{channel_table(comparison)}
+
+### Yêu cầu
+Bạn là AI phân tích dữ liệu chuyên nghiệp. Tạo báo cáo insight bằng tiếng Việt, văn phong rõ ràng, chuyên nghiệp, gồm:
+1. **Tổng quan**: Các kênh chiếm tỷ trọng lớn nhất và thay đổi chung giữa các giai đoạn.
+2. **Phân tích chi tiết**: So sánh cơ cấu kênh của từng topic (dùng tên topic).
+3. **Xu hướng và khuyến nghị**: Kênh đang tăng/giảm đáng chú ý và 1-2 hành động cụ thể.
+
+Đảm bảo báo cáo ngắn gọn, súc tích, tập trung vào insight hữu ích.
+"""
+
+        return fit_prompt("channel_breakdown", render, [], {})
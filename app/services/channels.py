@@ -0,0 +1,62 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.exceptions import InvalidResponseException
+from app.services.bucket_store import index_buckets
+
+# Tên bucket của TERMS(TYPE) lồng trong TERMS(INDEX). CHƯA xác nhận với gateway: suy ra từ quy ước
+# `<trường ES>_terms` của các bucket đã biết (INDEX -> `_index_terms`, SENTIMENT -> `sentiment.value_terms`)
+# và trường `type` của buzz. Nếu sai, channel_matrix báo lỗi thay vì trả về toàn 0
+TYPE_BUCKETS = "type_terms"
+
+# Các loại nguồn mà bộ lọc gateway liệt kê
+SOURCE_TYPES = (
+    "FBPAGE_TOPIC", "FBPAGE_COMMENT", "FBGROUP_TOPIC", "FBGROUP_COMMENT",
+    "FBUSER_TOPIC", "FBUSER_COMMENT", "FORUM_TOPIC", "FORUM_COMMENT",
+    "NEWS_TOPIC", "NEWS_COMMENT", "YOUTUBE_TOPIC", "YOUTUBE_COMMENT",
+    "BLOG_TOPIC", "BLOG_COMMENT", "QA_TOPIC", "QA_COMMENT",
+    "SNS_TOPIC", "SNS_COMMENT", "TIKTOK_TOPIC", "TIKTOK_COMMENT",
+    "LINKEDIN_TOPIC", "LINKEDIN_COMMENT", "ECOMMERCE_TOPIC", "ECOMMERCE_COMMENT",
+    "THREADS_TOPIC", "THREADS_COMMENT",
+)
+
+# Nhóm kênh theo tiền tố của loại nguồn; FBPAGE/FBGROUP/FBUSER đều là Facebook
+CHANNEL_FAMILIES = {
+    "FBPAGE": "Facebook", "FBGROUP": "Facebook", "FBUSER": "Facebook",
+    "FORUM": "Forum", "NEWS": "News", "YOUTUBE": "YouTube", "BLOG": "Blog",
+    "QA": "Q&A", "SNS": "SNS", "TIKTOK": "TikTok", "LINKEDIN": "LinkedIn",
+    "ECOMMERCE": "E-commerce", "THREADS": "Threads",
+}
+OTHER_CHANNEL = "Other"
+CHANNELS = tuple(dict.fromkeys([*CHANNEL_FAMILIES.values(), OTHER_CHANNEL]))
+
+
+def channel_family(source_type: str) -> str:
+    return CHANNEL_FAMILIES.get(str(source_type).rsplit("_", 1)[0].upper(), OTHER_CHANNEL)
+
+
+def channel_matrix(data_periods: Sequence[Optional[Dict]], topic_ids: Sequence[str]) -> np.ndarray:
+    """(N topics x C channels x M periods) mention counts from TERMS(INDEX) > TERMS(TYPE) results."""
+    counts = np.zeros((len(topic_ids), len(CHANNELS), len(data_periods)), dtype=np.int64)
+    row_of = {f"topic{topic_id}": row for row, topic_id in enumerate(topic_ids)}
+    column_of = {channel: column for column, channel in enumerate(CHANNELS)}
+    for period, data in enumerate(data_periods):
+        for bucket in index_buckets(data):
+            row = row_of.get(bucket["key"])
+            if row is None:
+                continue
+            if bucket.get("doc_count") and TYPE_BUCKETS not in bucket:
+                raise InvalidResponseException(detail=f"Topic bucket {bucket['key']} has no {TYPE_BUCKETS} bucket")
+            for type_bucket in bucket.get(TYPE_BUCKETS, {}).get("buckets", []):
+                counts[row, column_of[channel_family(type_bucket["key"])], period] += type_bucket.get("doc_count", 0)
+    return counts
+
+
+def type_terms_aggs() -> List[Dict]:
+    return [{
+        "type": "TERMS",
+        "field": "INDEX",
+        "option": {"terms": {"size": 100}},
+        "nest": [{"type": "TERMS", "field": "TYPE", "option": {"terms": {"size": len(SOURCE_TYPES)}}}],
+    }]
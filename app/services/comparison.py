@@ -0,0 +1,201 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.bucket_store import index_buckets
+
+# Thứ tự cột cảm xúc trong ma trận đếm
+SENTIMENT_COLUMNS = ("positive", "neutral", "negative")
+
+
+def _percent(part: np.ndarray, whole: np.ndarray) -> np.ndarray:
+    """`100 * part / whole`, 0 where `whole` is 0."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(whole > 0, 100.0 * part / np.where(whole > 0, whole, 1), 0.0)
+
+
+def _relative_change(current: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    """Percent change, NaN where the previous value is 0."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(previous > 0, 100.0 * (current - previous) / np.where(previous > 0, previous, 1), np.nan)
+
+
+def _ranks(values: np.ndarray) -> np.ndarray:
+    """Competition ranks per column: 1 for the largest, ties share the best rank."""
+    return (values[None, :, :] > values[:, None, :]).sum(axis=1) + 1
+
+
+def outlier_flags(values: np.ndarray, threshold: float) -> np.ndarray:
+    """Flag rows whose value is far from the others using the modified z-score (median/MAD).
+
+    NaN values are never flagged. With fewer than three finite values there
+    is no meaningful spread and nothing is flagged.
+    """
+    finite = np.isfinite(values)
+    flags = np.zeros(values.shape, dtype=bool)
+    if finite.sum() < 3:
+        return flags
+    median = np.median(values[finite])
+    deviation = np.abs(values[finite] - median)
+    scale = 1.4826 * np.median(deviation)
+    if scale == 0:
+        scale = 1.2533 * deviation.mean()
+    if scale == 0:
+        return flags
+    flags[finite] = deviation / scale > threshold
+    return flags
+
+
+def _round(values: np.ndarray) -> List:
+    return [None if not np.isfinite(value) else round(float(value), 2) for value in values]
+
+
+def _period_deltas(values: np.ndarray) -> np.ndarray:
+    """Column `k` is period `k` minus period `k + 1` (each period against the next listed one)."""
+    return values[:, :-1] - values[:, 1:]
+
+
+def compare_sov(counts: np.ndarray, topic_names: Sequence[str], periods: Sequence[Dict]) -> Dict:
+    """SOV %, deltas, ranks and outlier flags for an (N topics x M periods) mention matrix."""
+    counts = np.asarray(counts, dtype=np.int64).reshape(len(topic_names), len(periods))
+    totals = counts.sum(axis=0)
+    sov = _percent(counts, totals[None, :])
+    ranks = _ranks(counts)
+    mention_delta = _period_deltas(counts)
+    sov_delta = _period_deltas(sov)
+    change = _relative_change(counts[:, :-1], counts[:, 1:])
+    outliers = np.zeros(counts.shape[0], dtype=bool)
+    for column in range(change.shape[1]):
+        outliers |= outlier_flags(change[:, column], settings.COMPARISON_OUTLIER_Z)
+
+    topics = []
+    for row, name in enumerate(topic_names):
+        topics.append({
+            "topic": name,
+            "mentions": counts[row].tolist(),
+            "sov": _round(sov[row]),
+            "rank": ranks[row].tolist(),
+            "mentions_delta": mention_delta[row].tolist(),
+            "mentions_change_pct": _round(change[row]),
+            "sov_delta": _round(sov_delta[row]),
+            "rank_delta": (ranks[row, 1:] - ranks[row, :-1]).tolist(),
+            "outlier": bool(outliers[row]),
+        })
+    topics.sort(key=lambda topic: (topic["rank"][0], topic["topic"]))
+    return {
+        "periods": list(periods),
+        "totals": totals.tolist(),
+        "totals_change_pct": _round(_relative_change(totals[:-1], totals[1:])),
+        "topics": topics,
+    }
+
+
+def compare_sentiment(counts: np.ndarray, topic_names: Sequence[str], periods: Sequence[Dict]) -> Dict:
+    """Sentiment shares, net sentiment and deltas for an (N x M x [total, positive, neutral, negative]) matrix."""
+    counts = np.asarray(counts, dtype=np.int64).reshape(len(topic_names), len(periods), 4)
+    totals = counts[:, :, 0]
+    positive, neutral, negative = counts[:, :, 1], counts[:, :, 2], counts[:, :, 3]
+    positive_share = _percent(positive, totals)
+    negative_share = _percent(negative, totals)
+    # Không có đề cập tích cực/tiêu cực thì net không xác định (NaN), không phải 0
+    net = np.where(positive + negative > 0, _percent(positive - negative, positive + negative), np.nan)
+    net_delta = _period_deltas(net)
+    outliers = np.zeros(counts.shape[0], dtype=bool)
+    for column in range(net_delta.shape[1]):
+        outliers |= outlier_flags(net_delta[:, column], settings.COMPARISON_OUTLIER_Z)
+    net_ranks = _ranks(np.where(np.isfinite(net), net, -np.inf))
+
+    topics = []
+    for row, name in enumerate(topic_names):
+        topics.append({
+            "topic": name,
+            "total": totals[row].tolist(),
+            "positive": positive[row].tolist(),
+            "neutral": neutral[row].tolist(),
+            "negative": negative[row].tolist(),
+            "positive_pct": _round(positive_share[row]),
+            "negative_pct": _round(negative_share[row]),
+            "net_sentiment": _round(net[row]),
+            "net_rank": net_ranks[row].tolist(),
+            "total_change_pct": _round(_relative_change(totals[row, :-1], totals[row, 1:])),
+            "positive_pct_delta": _round(_period_deltas(positive_share)[row]),
+            "negative_pct_delta": _round(_period_deltas(negative_share)[row]),
+            "net_sentiment_delta": _round(net_delta[row]),
+            "outlier": bool(outliers[row]),
+        })
+    return {"periods": list(periods), "topics": topics}
+
+
+def compare_channels(
+    counts: np.ndarray,
+    topic_names: Sequence[str],
+    channels: Sequence[str],
+    periods: Sequence[Dict],
+) -> Dict:
+    """Channel mix per topic for an (N topics x C channels x M periods) matrix.
+
+    Shares are of the topic's own mentions in the period; channels without
+    any mention in any period are dropped.
+    """
+    counts = np.asarray(counts, dtype=np.int64).reshape(len(topic_names), len(channels), len(periods))
+    used = counts.sum(axis=(0, 2)) > 0
+    counts = counts[:, used, :]
+    channels = [channel for channel, keep in zip(channels, used) if keep]
+
+    topic_totals = counts.sum(axis=1)
+    share = _percent(counts, topic_totals[:, None, :])
+    share_delta = share[:, :, :-1] - share[:, :, 1:]
+    change = _relative_change(counts[:, :, :-1], counts[:, :, 1:])
+    channel_totals = counts.sum(axis=0)
+    overall_share = _percent(channel_totals, channel_totals.sum(axis=0)[None, :])
+
+    topics = []
+    for row, name in enumerate(topic_names):
+        topics.append({
+            "topic": name,
+            "total": topic_totals[row].tolist(),
+            "channels": [
+                {
+                    "channel": channel,
+                    "mentions": counts[row, column].tolist(),
+                    "share": _round(share[row, column]),
+                    "share_delta": _round(share_delta[row, column]),
+                    "mentions_change_pct": _round(change[row, column]),
+                }
+                for column, channel in enumerate(channels)
+            ],
+        })
+    return {
+        "periods": list(periods),
+        "channels": [
+            {"channel": channel, "mentions": channel_totals[column].tolist(), "share": _round(overall_share[column])}
+            for column, channel in enumerate(channels)
+        ],
+        "topics": topics,
+    }
+
+
+def sov_matrix(data_periods: Sequence[Optional[Dict]], index_keys: Sequence[str]) -> np.ndarray:
+    """Mention counts of `topic<id>` index buckets, one column per `get_sov_data` result."""
+    counts = np.zeros((len(index_keys), len(data_periods)), dtype=np.int64)
+    row_of = {key: row for row, key in enumerate(index_keys)}
+    for column, data in enumerate(data_periods):
+        for bucket in index_buckets(data):
+            if bucket["key"] in row_of:
+                counts[row_of[bucket["key"]], column] = bucket.get("doc_count", 0)
+    return counts
+
+
+def sentiment_matrix(period_rows: Sequence[List[Dict]], topic_names: Sequence[str]) -> np.ndarray:
+    """Counts from `refactor_result` rows, one period per entry of `period_rows`."""
+    counts = np.zeros((len(topic_names), len(period_rows), 4), dtype=np.int64)
+    row_of = {name: row for row, name in enumerate(topic_names)}
+    for column, rows in enumerate(period_rows):
+        for item in rows:
+            row = row_of.get(item["topic_name"])
+            if row is None:
+                continue
+            sentiment = item.get("sentiment", {})
+            counts[row, column] = (item.get("total", 0), *(sentiment.get(key, 0) for key in SENTIMENT_COLUMNS))
+    return counts
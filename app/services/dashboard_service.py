@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.singleflight import report_flight
+from app.models.request_models import InsightRequest
+from app.services.insight_reports import (
+    ReportKind,
+    get_cached_report,
+    report_cache_key,
+    run_report,
+    service_args,
+    store_generated,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardInsightService:
+    """Generate several report kinds for one `InsightRequest` in a single pass.
+
+    Cached kinds are answered directly. For the rest, every insight service
+    class fetches its gateway data once (SOV-based kinds share one fetch),
+    then the LLM generations run concurrently, bounded by
+    `DASHBOARD_MAX_CONCURRENCY`.
+    """
+
+    def __init__(self, x_token: str, x_refresh_token: str):
+        self.x_token = x_token
+        self.x_refresh_token = x_refresh_token
+
+    async def stream_reports(
+        self,
+        request_data: InsightRequest,
+        kinds: List[ReportKind],
+    ) -> AsyncIterator[Tuple[str, Optional[Dict], Optional[str]]]:
+        """Yield `(kind name, result, error)` as soon as each report is ready."""
+        cached = await asyncio.gather(
+            *(get_cached_report(kind, request_data, self.x_token, self.x_refresh_token) for kind in kinds)
+        )
+        pending = []
+        for kind, result in zip(kinds, cached):
+            if result is not None:
+                yield kind.name, result, None
+            else:
+                pending.append(kind)
+        if not pending:
+            return
+
+        # Mỗi lớp service chỉ lấy dữ liệu một lần cho mọi loại báo cáo dùng chung nó
+        services, first_kinds = {}, {}
+        for kind in pending:
+            if kind.service_class not in services:
+                services[kind.service_class] = kind.service_class(self.x_token, self.x_refresh_token)
+                first_kinds[kind.service_class] = kind
+        fetched = await asyncio.gather(
+            *(
+                service.fetch_data(**service_args(first_kinds[service_class], request_data))
+                for service_class, service in services.items()
+            ),
+            return_exceptions=True,
+        )
+        shared_data = dict(zip(services, fetched))
+
+        semaphore = asyncio.Semaphore(settings.DASHBOARD_MAX_CONCURRENCY)
+
+        async def generate(kind: ReportKind) -> Tuple[str, Optional[Dict], Optional[str]]:
+            data = shared_data[kind.service_class]
+            if isinstance(data, Exception):
+                return kind.name, None, f"{kind.fail_message}: {data}"
+
+            async def produce() -> Dict:
+                async with semaphore:
+                    return await services[kind.service_class].report_from_data(data)
+
+            async def run() -> Optional[Dict]:
+                return await store_generated(kind, request_data, await run_report(kind, request_data, produce))
+
+            # Dùng chung single-flight với các router riêng lẻ: lỗi luôn trả về None, không raise
+            result = await report_flight.do(report_cache_key(kind, request_data), run)
+            if result is None:
+                return kind.name, None, kind.fail_message
+            return kind.name, result, None
+
+        tasks = [asyncio.ensure_future(generate(kind)) for kind in pending]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def generate_reports(self, request_data: InsightRequest, kinds: List[ReportKind]) -> Dict[str, Any]:
+        reports, errors = {}, {}
+        async for name, result, error in self.stream_reports(request_data, kinds):
+            if error is None:
+                reports[name] = result
+            else:
+                errors[name] = error
+        return {"reports": reports, "errors": errors}
+
+    async def stream_events(
+        self,
+        request_data: InsightRequest,
+        kinds: List[ReportKind],
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """SSE events: one `report` or `report_error` per kind, then the combined `result`."""
+        reports, errors = {}, {}
+        async for name, result, error in self.stream_reports(request_data, kinds):
+            if error is None:
+                reports[name] = result
+                yield "report", {"kind": name, "data": result}
+            else:
+                errors[name] = error
+                yield "report_error", {"kind": name, "message": error}
+        yield "result", {"reports": reports, "errors": errors}
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, List, NamedTuple, Optional
+
+from app.core.cache import cache
+from app.core.config import settings
+from app.core.singleflight import upstream_flight
+from app.core.tracing import span
+
+CACHE_NAMESPACE = "data"
+
+
+class DataRequest(NamedTuple):
+    """One cacheable upstream query: kind, tenant scope, topics and window."""
+    kind: str
+    scope: str
+    topic_ids: List[str]
+    from_date: str
+    to_date: str
+
+
+def window_ttl(to_date: str) -> int:
+    """Long TTL for windows that ended in the past, short TTL if they touch "now".
+
+    Recent data keeps arriving for a while after publication, so a window
+    only counts as closed once it ended `DATA_CACHE_SETTLE_MINUTES` ago.
+    """
+    try:
+        to_dt = datetime.strptime(to_date, "%Y-%m-%dT%H:%M")
+    except ValueError:
+        return settings.DATA_CACHE_TTL_RECENT
+    settled_before = datetime.now() - timedelta(minutes=settings.DATA_CACHE_SETTLE_MINUTES)
+    return settings.DATA_CACHE_TTL_PAST if to_dt < settled_before else settings.DATA_CACHE_TTL_RECENT
+
+
+def data_cache_key(kind: str, scope: str, topic_ids: List[str], from_date: str, to_date: str) -> str:
+    return f"{kind}:{scope}:{','.join(sorted(topic_ids))}:{from_date}:{to_date}"
+
+
+async def cached_fetch(
+    kind: str,
+    scope: str,
+    topic_ids: List[str],
+    from_date: str,
+    to_date: str,
+    fetch: Callable[[], Awaitable[Optional[Any]]],
+) -> Optional[Any]:
+    """Serve one upstream aggregation from the shared cache, fetching it at most once.
+
+    Concurrent misses for the same key are coalesced; empty results are not cached.
+    """
+    key = data_cache_key(kind, scope, topic_ids, from_date, to_date)
+
+    async def load():
+        value = await cache.get(CACHE_NAMESPACE, key)
+        if value is not None:
+            current.set_attribute("cache.hit", True)
+            return value
+        current.set_attribute("cache.hit", False)
+        value = await fetch()
+        if value is not None:
+            await cache.set(CACHE_NAMESPACE, key, value, window_ttl(to_date))
+        return value
+
+    attributes = {"data.kind": kind, "data.topic_count": len(topic_ids), "data.window": f"{from_date}/{to_date}"}
+    # Request gộp vào lời gọi đang chạy không có thuộc tính cache.hit
+    with span("data_cache", **attributes) as current:
+        return await upstream_flight.do(key, load)
+
+
+async def cached_fetch_many(
+    requests: List[DataRequest],
+    fetch_missing: Callable[[List[DataRequest]], Awaitable[List[Optional[Any]]]],
+) -> List[Optional[Any]]:
+    """Batch variant of `cached_fetch`: all cache misses are handed to one `fetch_missing` call."""
+    keys = [data_cache_key(*request) for request in requests]
+    with span("data_cache.batch", **{"data.requests": len(requests)}) as current:
+        values = list(await asyncio.gather(*(cache.get(CACHE_NAMESPACE, key) for key in keys)))
+        missing = [i for i, value in enumerate(values) if value is None]
+        current.set_attribute("data.misses", len(missing))
+    if not missing:
+        return values
+
+    async def load():
+        fetched = await fetch_missing([requests[i] for i in missing])
+        for i, value in zip(missing, fetched):
+            if value is not None:
+                await cache.set(CACHE_NAMESPACE, keys[i], value, window_ttl(requests[i].to_date))
+        return fetched
+
+    fetched = await upstream_flight.do(tuple(keys[i] for i in missing), load)
+    for i, value in zip(missing, fetched):
+        values[i] = value
+    return values
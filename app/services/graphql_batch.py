@@ -0,0 +1,102 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.exceptions import APIRequestException, InvalidResponseException
+from app.core.http_client import gateway_client
+
+AGGREGATIONS_SELECTION = "status message data"
+
+# Kiểu của các tham số cho từng field gốc trên gateway
+ARGUMENT_TYPES: Dict[str, Dict[str, str]] = {
+    "aggregations": {
+        "input": "IndexesInput!",
+        "filter": "FilterBuzzInput",
+        "aggs": "[AggregationTypeInput]!",
+    },
+    "buzzes": {
+        "input": "IndexesInput!",
+        "filter": "FilterBuzzInput",
+    },
+}
+
+
+@dataclass(frozen=True)
+class BatchOperation:
+    """One root field of a batched query, exposed in the response under `alias`."""
+    alias: str
+    field: str
+    variables: Dict[str, Any]
+    selection: str
+
+
+def build_batch_payload(operations: List[BatchOperation], name: str = "Batch") -> Dict:
+    """Pack several gateway operations into one GraphQL document using aliases.
+
+    Variables are suffixed with the alias (`$filter_q0`, `$filter_q1`, ...)
+    so operations that differ only in their filters can share a request.
+    """
+    declarations = []
+    fields = []
+    variables = {}
+    for operation in operations:
+        arguments = []
+        for argument, type_name in ARGUMENT_TYPES[operation.field].items():
+            variable = f"{argument}_{operation.alias}"
+            declarations.append(f"${variable}: {type_name}")
+            arguments.append(f"{argument}: ${variable}")
+            variables[variable] = operation.variables.get(argument)
+        fields.append(
+            f"{operation.alias}: {operation.field}({', '.join(arguments)}) {{ {operation.selection} }}"
+        )
+    query = f"query {name}({', '.join(declarations)}) {{\n    " + "\n    ".join(fields) + "\n}"
+    return {"query": query, "variables": variables}
+
+
+def split_batch_response(response_json: Dict, operations: List[BatchOperation]) -> Dict[str, Optional[Any]]:
+    """Return the `data` payload of every operation keyed by alias.
+
+    Operations reported in `errors` (or missing from the response) map to
+    None, mirroring what the single-operation calls return for empty results.
+    """
+    data = response_json.get("data")
+    if data is None:
+        raise InvalidResponseException(detail=f"Invalid response structure: {response_json.get('errors')}")
+    failed = {
+        error["path"][0]
+        for error in response_json.get("errors") or []
+        if error.get("path")
+    }
+    results = {}
+    for operation in operations:
+        result = data.get(operation.alias)
+        results[operation.alias] = None if operation.alias in failed or result is None else result.get("data")
+    return results
+
+
+def required_result(results: Dict[str, Optional[Any]], operation: BatchOperation, error_label: str) -> Any:
+    """Result of `operation`, for callers that cannot treat a failed alias as an empty result."""
+    result = results.get(operation.alias)
+    if result is None:
+        raise InvalidResponseException(detail=f"Failed to fetch {error_label}: no data for {operation.alias}")
+    return result
+
+
+async def execute_batch(
+    operations: List[BatchOperation],
+    headers: Dict[str, str],
+    error_label: str,
+) -> Dict[str, Optional[Any]]:
+    if not operations:
+        return {}
+    payload = build_batch_payload(operations)
+    try:
+        response = await gateway_client.post_json(settings.GATEWAY_URL, payload, headers)
+        response.raise_for_status()
+        return split_batch_response(response.json(), operations)
+    except httpx.HTTPError as e:
+        raise APIRequestException(detail=f"Failed to fetch {error_label}: {str(e)}")
+    except (ValueError, KeyError) as e:
+        raise InvalidResponseException(detail=f"Invalid response structure: {str(e)}")
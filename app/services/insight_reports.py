@@ -0,0 +1,229 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core import metrics
+from app.core.cache import cache, shared_cache_key
+from app.core.config import settings
+from app.core.singleflight import report_flight
+from app.core.tracing import span
+from app.models.request_models import InsightRequest, TrendlineInsightRequest
+from app.services.channel_insight_service import ChannelBreakdownInsightService
+from app.services.sb_insight_service import SentimentBreakdownInsightService
+from app.services.sov_insight_service import SovInsightService
+from app.services.trendline_insight_service import TrendlineInsightService
+
+logger = logging.getLogger(__name__)
+
+# Mỗi entry được bọc kèm thời điểm tạo để phục vụ stale-while-revalidate
+CACHE_NAMESPACE = "insight-swr"
+
+
+@dataclass(frozen=True)
+class ReportKind:
+    """One report type served by a `/<prefix>/generate_insight` router.
+
+    A cached report is fresh for `soft_ttl` seconds; until `hard_ttl` it is
+    still served, flagged as stale, while a refresh runs in the background.
+    `request_fields` are extra request fields passed on to the service;
+    `request_model` is the request class that declares them.
+    """
+    name: str
+    service_class: type
+    fail_message: str
+    soft_ttl: int = settings.INSIGHT_CACHE_TTL
+    hard_ttl: int = settings.INSIGHT_CACHE_HARD_TTL
+    request_fields: Tuple[str, ...] = ()
+    request_model: type = InsightRequest
+
+
+def parse_kind_ttls(spec: str) -> Dict[str, Tuple[int, int]]:
+    """Parse `INSIGHT_CACHE_KIND_TTLS` ("kind=soft:hard,...") into `{kind: (soft, hard)}`."""
+    ttls = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, values = item.partition("=")
+        soft, _, hard = values.partition(":")
+        soft_ttl = int(soft)
+        ttls[name.strip()] = (soft_ttl, max(int(hard) if hard else settings.INSIGHT_CACHE_HARD_TTL, soft_ttl))
+    return ttls
+
+
+def _report_kind(
+    name: str,
+    service_class: type,
+    fail_message: str,
+    request_fields: Tuple[str, ...] = (),
+    request_model: type = InsightRequest,
+) -> ReportKind:
+    soft_ttl, hard_ttl = KIND_TTLS.get(name, (settings.INSIGHT_CACHE_TTL, settings.INSIGHT_CACHE_HARD_TTL))
+    return ReportKind(name, service_class, fail_message, soft_ttl, hard_ttl, request_fields, request_model)
+
+
+KIND_TTLS = parse_kind_ttls(settings.INSIGHT_CACHE_KIND_TTLS)
+
+REPORT_KINDS: Dict[str, ReportKind] = {
+    kind.name: kind
+    for kind in (
+        _report_kind("sov", SovInsightService, "Failed to generate SOV report"),
+        _report_kind("sentiment_breakdown", SentimentBreakdownInsightService, "Failed to generate Sentiment Breakdown report"),
+        _report_kind("brand_health", SovInsightService, "Failed to generate Brand Health report"),
+        _report_kind("channel_breakdown", ChannelBreakdownInsightService, "Failed to generate Channel Breakdown report"),
+        _report_kind("brand_attribute", SovInsightService, "Failed to generate Brand Attribute report"),
+        _report_kind(
+            "mentions_trendlines",
+            TrendlineInsightService,
+            "Failed to generate Mentions Trendlines report",
+            ("interval",),
+            TrendlineInsightRequest,
+        ),
+    )
+}
+
+
+def service_args(kind: ReportKind, request_data: InsightRequest) -> Dict[str, Any]:
+    args = {
+        "topic_ids": request_data.topic_ids,
+        "periods": request_data.period_ranges(),
+    }
+    # Request gốc (dashboard, warmer) không có các field riêng thì service dùng mặc định
+    for field in kind.request_fields:
+        if getattr(request_data, field, None) is not None:
+            args[field] = getattr(request_data, field)
+    return args
+
+
+async def run_report(
+    kind: ReportKind,
+    request_data: InsightRequest,
+    produce: Callable[[], Awaitable[Dict]],
+) -> Optional[Dict]:
+    """Await `produce()` as one pipeline run of `kind`; log a failure and return None instead of raising."""
+    in_flight = metrics.reports_in_flight.labels(kind.name)
+    in_flight.inc()
+    try:
+        with span(f"report {kind.name}", **{"report.topic_count": len(request_data.topic_ids)}):
+            return await produce()
+    except Exception as e:
+        logger.warning("Insight report %s failed: %s", kind.name, e)
+        return None
+    finally:
+        in_flight.dec()
+
+
+async def generate_report(
+    kind: ReportKind,
+    request_data: InsightRequest,
+    x_token: str,
+    x_refresh_token: str,
+) -> Optional[Dict]:
+    """Run the insight pipeline of `kind` and shape it like the router response."""
+    insight_service = kind.service_class(x_token, x_refresh_token)
+
+    async def produce() -> Dict:
+        data = await insight_service.fetch_data(**service_args(kind, request_data))
+        return await insight_service.report_from_data(data)
+
+    return await run_report(kind, request_data, produce)
+
+
+def stream_report(
+    kind: ReportKind,
+    request_data: InsightRequest,
+    x_token: str,
+    x_refresh_token: str,
+) -> AsyncIterator[Tuple[str, Any]]:
+    insight_service = kind.service_class(x_token, x_refresh_token)
+    return insight_service.stream_insight(**service_args(kind, request_data))
+
+
+def report_cache_key(kind: ReportKind, request_data: InsightRequest) -> str:
+    return shared_cache_key(request_data, kind.name)
+
+
+async def get_cached_report(
+    kind: ReportKind,
+    request_data: InsightRequest,
+    x_token: str,
+    x_refresh_token: str,
+) -> Optional[Dict]:
+    """Return the cached report, or None on a miss.
+
+    Past `soft_ttl` the report is returned flagged with `stale` and
+    `age_seconds`, and one background refresh per key is started.
+    """
+    entry = await cache.get(CACHE_NAMESPACE, report_cache_key(kind, request_data))
+    if entry is None:
+        metrics.report_cache_requests.labels(kind.name, "miss").inc()
+        return None
+    age = time.time() - entry["stored_at"]
+    if age < kind.soft_ttl:
+        metrics.report_cache_requests.labels(kind.name, "hit").inc()
+        return entry["result"]
+    metrics.report_cache_requests.labels(kind.name, "stale").inc()
+
+    # Hết soft TTL: trả bản cũ ngay và làm mới ở nền, single-flight đảm bảo mỗi key chỉ một lần
+    report_flight.start(
+        report_cache_key(kind, request_data),
+        lambda: _generate_and_store(kind, request_data, x_token, x_refresh_token),
+    )
+    return {**entry["result"], "stale": True, "age_seconds": int(age)}
+
+
+async def store_report(kind: ReportKind, request_data: InsightRequest, result: Dict) -> None:
+    entry = {"stored_at": time.time(), "result": result}
+    await cache.set(CACHE_NAMESPACE, report_cache_key(kind, request_data), entry, kind.hard_ttl)
+
+
+async def _generate_and_store(
+    kind: ReportKind,
+    request_data: InsightRequest,
+    x_token: str,
+    x_refresh_token: str,
+) -> Optional[Dict]:
+    return await store_generated(kind, request_data, await generate_report(kind, request_data, x_token, x_refresh_token))
+
+
+async def store_generated(kind: ReportKind, request_data: InsightRequest, result: Optional[Dict]) -> Optional[Dict]:
+    """Store a freshly generated report; a None result is counted as a failure and stores nothing.
+
+    Every task started on `report_flight` ends here, so joiners from routers,
+    jobs and the dashboard all see None, never an exception, on failure.
+    """
+    if result is None:
+        # Lỗi đã được generate_report ghi log; bản cũ trong cache (nếu có) được giữ nguyên
+        metrics.report_failures.labels(kind.name).inc()
+        return None
+    await store_report(kind, request_data, result)
+    return result
+
+
+async def cached_report(
+    kind: ReportKind,
+    request_data: InsightRequest,
+    x_token: str,
+    x_refresh_token: str,
+) -> Optional[Dict]:
+    """Return the cached report or generate it once for all concurrent identical requests."""
+    cached = await get_cached_report(kind, request_data, x_token, x_refresh_token)
+    if cached is not None:
+        return cached
+    return await refresh_report(kind, request_data, x_token, x_refresh_token)
+
+
+async def refresh_report(
+    kind: ReportKind,
+    request_data: InsightRequest,
+    x_token: str,
+    x_refresh_token: str,
+) -> Optional[Dict]:
+    """Regenerate and store the report, joining a generation already in flight."""
+    return await report_flight.do(
+        report_cache_key(kind, request_data),
+        lambda: _generate_and_store(kind, request_data, x_token, x_refresh_token),
+    )
+
+
+async def report_is_fresh(kind: ReportKind, request_data: InsightRequest) -> bool:
+    entry = await cache.get(CACHE_NAMESPACE, report_cache_key(kind, request_data))
+    return entry is not None and time.time() - entry["stored_at"] < kind.soft_ttl
@@ -0,0 +1,207 @@
+import asyncio
+import ipaddress
+import logging
+import socket
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+import httpx
+from cachetools import TTLCache
+
+from app.core.config import settings
+from app.models.request_models import InsightRequest
+from app.services.insight_reports import ReportKind, cached_report, report_cache_key
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobQueueFullError(Exception):
+    pass
+
+
+async def callback_url_allowed(callback_url: str) -> bool:
+    """Whether a job result may be POSTed to `callback_url`.
+
+    Callbacks are off unless `JOB_CALLBACK_ALLOWED_HOSTS` lists the host, and
+    even a listed host is refused when it resolves to a loopback, link-local,
+    private or otherwise non-public address.
+    """
+    parsed = urlparse(callback_url)
+    allowed_hosts = {host.strip().lower() for host in settings.JOB_CALLBACK_ALLOWED_HOSTS.split(",") if host.strip()}
+    if parsed.scheme not in ("http", "https") or not parsed.hostname or parsed.hostname.lower() not in allowed_hosts:
+        return False
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        infos = await asyncio.get_running_loop().getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+    except (OSError, ValueError):
+        return False
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        if not address.is_global or address.is_multicast:
+            return False
+    return bool(infos)
+
+
+@dataclass
+class InsightJob:
+    id: str
+    kind: ReportKind
+    key: str
+    request_data: InsightRequest
+    x_token: str = field(repr=False)
+    x_refresh_token: str = field(repr=False)
+    callback_urls: List[str] = field(default_factory=list)
+    status: str = JOB_QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind.name,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class InsightJobQueue:
+    """Bounded asyncio worker pool running insight pipelines in the background.
+
+    Submitting a job identical to one that is queued, running or recently
+    finished returns the existing job instead of enqueuing a new one. When
+    the queue is full, `submit` raises `JobQueueFullError`.
+    """
+
+    def __init__(self, workers: int, maxsize: int, result_ttl: int):
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._jobs: TTLCache = TTLCache(maxsize=maxsize * 10, ttl=result_ttl)
+        self._jobs_by_key: TTLCache = TTLCache(maxsize=maxsize * 10, ttl=result_ttl)
+        self._tasks: List[asyncio.Task] = []
+        self._notify_tasks: Set[asyncio.Task] = set()
+        self._callback_client: Optional[httpx.AsyncClient] = None
+
+    async def start(self) -> None:
+        if self._callback_client is None:
+            # Client riêng cho callback: timeout ngắn, không proxy/header của môi trường, không theo redirect
+            self._callback_client = httpx.AsyncClient(
+                timeout=settings.JOB_CALLBACK_TIMEOUT, follow_redirects=False, trust_env=False
+            )
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks + list(self._notify_tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._notify_tasks, return_exceptions=True)
+        self._tasks = []
+        if self._callback_client is not None:
+            await self._callback_client.aclose()
+            self._callback_client = None
+
+    def submit(
+        self,
+        kind: ReportKind,
+        request_data: InsightRequest,
+        x_token: str,
+        x_refresh_token: str,
+        callback_url: Optional[str] = None,
+    ) -> InsightJob:
+        key = report_cache_key(kind, request_data)
+        existing = self._jobs.get(self._jobs_by_key.get(key))
+        if existing is not None and existing.status != JOB_FAILED:
+            if callback_url:
+                if existing.done:
+                    # Giữ tham chiếu để task không bị thu gom khi đang chạy
+                    task = asyncio.create_task(self._notify(existing, [callback_url]))
+                    self._notify_tasks.add(task)
+                    task.add_done_callback(self._notify_tasks.discard)
+                else:
+                    existing.callback_urls.append(callback_url)
+            return existing
+
+        job = InsightJob(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            key=key,
+            request_data=request_data,
+            x_token=x_token,
+            x_refresh_token=x_refresh_token,
+            callback_urls=[callback_url] if callback_url else [],
+        )
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFullError()
+        self._jobs[job.id] = job
+        self._jobs_by_key[key] = job.id
+        return job
+
+    def get(self, job_id: str) -> Optional[InsightJob]:
+        return self._jobs.get(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: InsightJob) -> None:
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = await cached_report(job.kind, job.request_data, job.x_token, job.x_refresh_token)
+            if job.result is None:
+                job.status, job.error = JOB_FAILED, job.kind.fail_message
+            else:
+                job.status = JOB_SUCCEEDED
+        except Exception as e:
+            logger.exception("Insight job %s failed", job.id)
+            job.status, job.error = JOB_FAILED, str(e)
+        job.finished_at = time.time()
+        # Job đã xong thì không cần giữ credential
+        job.x_token = job.x_refresh_token = ""
+        if job.callback_urls:
+            await self._notify(job, job.callback_urls)
+
+    async def _notify(self, job: InsightJob, callback_urls: List[str]) -> None:
+        if self._callback_client is None:
+            await self.start()
+        for callback_url in callback_urls:
+            try:
+                # Kiểm tra lại lúc gửi: DNS của host có thể đã đổi sau khi job được nhận
+                if not await callback_url_allowed(callback_url):
+                    logger.warning("Callback for job %s to %s skipped: host not allowed", job.id, callback_url)
+                    continue
+                response = await self._callback_client.post(callback_url, json=job.to_dict())
+                response.raise_for_status()
+            except Exception as e:
+                logger.warning("Callback for job %s to %s failed: %s", job.id, callback_url, e)
+
+
+job_queue = InsightJobQueue(
+    workers=settings.JOB_WORKERS,
+    maxsize=settings.JOB_QUEUE_MAXSIZE,
+    result_ttl=settings.JOB_RESULT_TTL,
+)
@@ -0,0 +1,137 @@
+import asyncio
+import base64
+import hashlib
+import json
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from cachetools import TLRUCache
+
+from app.core.config import settings
+from app.core.exceptions import InvalidResponseException
+from app.core.tracing import span
+
+# Trừ hao vài giây để không dùng index sát thời điểm token hết hạn
+TOKEN_EXPIRY_SKEW = 30
+
+
+@dataclass(frozen=True)
+class ProjectIndex:
+    """Projects of one credential, flattened into O(1) lookups by topic id."""
+    topics: Dict[str, Dict]
+    label_ids: Dict[str, List[str]]
+    project_ids: Dict[str, str]
+    expires_at: float
+
+    def get_topic(self, topic_id: str) -> Optional[Dict]:
+        return self.topics.get(topic_id)
+
+    def get_label_ids(self, topic_id: str) -> Optional[List[str]]:
+        return self.label_ids.get(topic_id)
+
+    def data_scope(self, topic_ids: List[str], label_topic_id: str) -> str:
+        """Tenant part of data-layer cache keys.
+
+        Built from the projects this credential sees for `topic_ids` and the
+        label filter taken from `label_topic_id`, so two users share cached
+        aggregations only when the upstream query would be identical.
+        """
+        projects = ",".join(sorted({self.project_ids.get(topic_id, "-") for topic_id in topic_ids}))
+        labels = ",".join(sorted(self.get_label_ids(label_topic_id) or []))
+        return f"{projects}|{hashlib.sha256(labels.encode('utf-8')).hexdigest()[:16]}"
+
+
+def get_unique_label_ids(group_tree_labels: List[List[Dict]]) -> List[str]:
+    unique_ids = set()
+    for sub_array in group_tree_labels:
+        for item in sub_array:
+            unique_ids.add(item["_id"])
+    label_ids = list(unique_ids)
+    label_ids.insert(0, "-1")
+    return label_ids
+
+
+def token_expiry(token: str) -> Optional[float]:
+    """Read the `exp` claim of a JWT without verifying its signature."""
+    try:
+        raw = token.split(" ")[-1].split(".")[1]
+        payload = json.loads(base64.urlsafe_b64decode(raw + "=" * (-len(raw) % 4)))
+        return float(payload["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def credential_key(x_token: str) -> str:
+    return hashlib.sha256(x_token.encode("utf-8")).hexdigest()
+
+
+def build_project_index(response_data: Dict, expires_at: float) -> ProjectIndex:
+    try:
+        projects = response_data["data"]["me"]["data"]["projects"]
+        topics: Dict[str, Dict] = {}
+        label_ids: Dict[str, List[str]] = {}
+        project_ids: Dict[str, str] = {}
+        for project in projects:
+            project_label_ids = None
+            for topic in project["topics"]:
+                # Giữ nguyên thứ tự ưu tiên cũ: project đầu tiên chứa topic thắng
+                if topic["_id"] in topics:
+                    continue
+                if project_label_ids is None:
+                    project_label_ids = get_unique_label_ids(project["groupTreeLabels"])
+                topics[topic["_id"]] = topic
+                label_ids[topic["_id"]] = project_label_ids
+                project_ids[topic["_id"]] = project["_id"]
+        return ProjectIndex(topics=topics, label_ids=label_ids, project_ids=project_ids, expires_at=expires_at)
+    except (KeyError, TypeError) as e:
+        raise InvalidResponseException(detail=f"Invalid response structure: {str(e)}")
+
+
+class ProjectIndexStore:
+    """Per-credential project index cache shared by all API services.
+
+    Entries live until the earlier of `max_ttl` seconds or the token's `exp`
+    claim. Concurrent lookups for the same credential share a single `me` call;
+    the per-credential lock lives as long as some lookup holds or awaits it.
+    """
+
+    def __init__(self, max_ttl: int, maxsize: int = 1024):
+        self.max_ttl = max_ttl
+        self._cache = TLRUCache(maxsize=maxsize, ttu=lambda _key, index, _now: index.expires_at, timer=time.time)
+        # Lock tự mất khi không còn ai giữ/chờ, kể cả khi load lỗi hoặc index không được cache
+        self._key_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _expires_at(self, x_token: str) -> float:
+        now = time.time()
+        expires_at = now + self.max_ttl
+        exp = token_expiry(x_token)
+        if exp is not None:
+            expires_at = min(expires_at, exp - TOKEN_EXPIRY_SKEW)
+        return expires_at
+
+    async def get(self, x_token: str, loader: Callable[[], Awaitable[Dict]]) -> ProjectIndex:
+        key = credential_key(x_token)
+        index = self._cache.get(key)
+        if index is not None:
+            return index
+
+        with span("project_index.load"):
+            key_lock = self._key_locks.get(key)
+            if key_lock is None:
+                key_lock = self._key_locks[key] = asyncio.Lock()
+            async with key_lock:
+                index = self._cache.get(key)
+                if index is not None:
+                    return index
+                index = build_project_index(await loader(), self._expires_at(x_token))
+                if index.expires_at > time.time():
+                    self._cache[key] = index
+                return index
+
+    def invalidate(self, x_token: str) -> None:
+        self._cache.pop(credential_key(x_token), None)
+
+
+project_index_store = ProjectIndexStore(max_ttl=settings.PROJECT_INDEX_TTL)
@@ -0,0 +1,293 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import timed
+from app.services.trendline import resample
+
+logger = logging.getLogger(__name__)
+
+SENTIMENT_LABELS = {1: "tiêu cực", 2: "trung lập", 3: "tích cực"}
+# Tiêu đề phần hướng dẫn, luôn nằm sau phần dữ liệu trong mọi prompt
+INSTRUCTIONS_HEADING = "### Yêu cầu"
+TRUNCATED_MARK = "…(đã lược bớt dữ liệu)"
+
+
+class TokenCounter:
+    """Token counting and truncation with the pinned `tiktoken` encoding.
+
+    The app loads the encoding in a worker thread at start-up (`start`), since
+    the first load may download the BPE file; until it is ready, or if it
+    cannot be loaded, counts fall back to an estimate of
+    `PROMPT_CHARS_PER_TOKEN` characters per token. Scripts without the app
+    lifespan load it lazily on first use.
+    """
+
+    def __init__(self, encoding_name: str):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._loaded = False
+        self._loading: Optional[asyncio.Future] = None
+
+    def _load(self) -> None:
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(self.encoding_name)
+        except Exception as e:
+            logger.info("tiktoken encoding %s unavailable, estimating tokens: %s", self.encoding_name, e)
+
+    def start(self) -> None:
+        """Begin loading the encoding off the event loop; does not wait for it."""
+        if not self._loaded:
+            self._loaded = True
+            self._loading = asyncio.get_running_loop().run_in_executor(None, self._load)
+
+    def _get_encoding(self):
+        if not self._loaded:
+            self._loaded = True
+            self._load()
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        encoding = self._get_encoding()
+        if encoding is None:
+            return -(-len(text) // settings.PROMPT_CHARS_PER_TOKEN)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut `text` to at most `max_tokens` tokens, marking the cut with an ellipsis."""
+        if max_tokens <= 0:
+            return ""
+        encoding = self._get_encoding()
+        if encoding is None:
+            limit = max_tokens * settings.PROMPT_CHARS_PER_TOKEN
+            return text if len(text) <= limit else text[:max(limit - 1, 0)].rstrip() + "…"
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens - 1]).rstrip() + "…"
+
+
+token_counter = TokenCounter(settings.PROMPT_TOKEN_ENCODING)
+
+
+class CompactPrompt(NamedTuple):
+    text: str
+    tokens: int
+    trimmed: bool
+
+
+def _number(value) -> str:
+    if value is None:
+        return "n/a"
+    if not value:
+        return "0"
+    return f"{value:+d}" if isinstance(value, int) else f"{value:+.1f}"
+
+
+def table(headers: Sequence[str], rows: Sequence[Sequence]) -> str:
+    """Pipe-separated table: much cheaper in tokens than indented JSON."""
+    lines = [" | ".join(headers)]
+    lines.extend(" | ".join("n/a" if cell is None else str(cell) for cell in row) for row in rows)
+    return "\n".join(lines)
+
+
+def _period_labels(comparison: Dict) -> List[str]:
+    return [f"GĐ{index + 1}" for index in range(len(comparison["periods"]))]
+
+
+def _delta_labels(labels: List[str]) -> List[str]:
+    return [f"{current}-{previous}" for current, previous in zip(labels, labels[1:])]
+
+
+def sov_table(comparison: Dict) -> str:
+    """Render `compare_sov` output: per-period mentions/SOV/rank, then deltas between consecutive periods."""
+    labels = _period_labels(comparison)
+    headers = ["topic"]
+    for label in labels:
+        headers.extend([f"mentions {label}", f"SOV% {label}", f"hạng {label}"])
+    for label in _delta_labels(labels):
+        headers.extend([f"Δ mentions {label}", f"Δ% {label}", f"Δ SOV {label}"])
+    headers.append("bất thường")
+
+    rows = []
+    for topic in comparison["topics"]:
+        row = [topic["topic"]]
+        for mentions, sov, rank in zip(topic["mentions"], topic["sov"], topic["rank"]):
+            row.extend([mentions, sov, rank])
+        for mentions_delta, change, sov_delta in zip(topic["mentions_delta"], topic["mentions_change_pct"], topic["sov_delta"]):
+            row.extend([_number(mentions_delta), _number(change), _number(sov_delta)])
+        row.append("có" if topic["outlier"] else "")
+        rows.append(row)
+    rows.append(["Tổng", *(cell for total in comparison["totals"] for cell in (total, 100.0 if total else 0.0, "")),
+                 *(cell for change in comparison["totals_change_pct"] for cell in ("", _number(change), "")), ""])
+    return table(headers, rows)
+
+
+def sentiment_table(comparison: Dict) -> str:
+    """Render `compare_sentiment` output: per-period counts, shares and net sentiment, then net deltas."""
+    labels = _period_labels(comparison)
+    headers = ["thương hiệu"]
+    for label in labels:
+        headers.extend(f"{column} {label}" for column in ("tổng", "tích cực", "trung lập", "tiêu cực", "%tích cực", "%tiêu cực", "net"))
+    headers.extend(f"Δ net {label}" for label in _delta_labels(labels))
+    headers.append("bất thường")
+
+    rows = []
+    for topic in comparison["topics"]:
+        row = [topic["topic"]]
+        for values in zip(
+            topic["total"], topic["positive"], topic["neutral"], topic["negative"],
+            topic["positive_pct"], topic["negative_pct"], topic["net_sentiment"],
+        ):
+            row.extend(values)
+        row.extend(_number(delta) for delta in topic["net_sentiment_delta"])
+        row.append("có" if topic["outlier"] else "")
+        rows.append(row)
+    return table(headers, rows)
+
+
+def channel_table(comparison: Dict) -> str:
+    """Render `compare_channels` output: one row per topic and channel, per-period mentions/share, then share deltas."""
+    labels = _period_labels(comparison)
+    headers = ["topic", "kênh"]
+    for label in labels:
+        headers.extend([f"mentions {label}", f"tỷ trọng% {label}"])
+    headers.extend(f"Δ tỷ trọng {label}" for label in _delta_labels(labels))
+
+    rows = []
+    for topic in comparison["topics"]:
+        for channel in topic["channels"]:
+            if not any(channel["mentions"]):
+                continue
+            row = [topic["topic"], channel["channel"]]
+            for mentions, share in zip(channel["mentions"], channel["share"]):
+                row.extend([mentions, share])
+            row.extend(_number(delta) for delta in channel["share_delta"])
+            rows.append(row)
+    for channel in comparison["channels"]:
+        row = ["Tổng", channel["channel"]]
+        for mentions, share in zip(channel["mentions"], channel["share"]):
+            row.extend([mentions, share])
+        row.extend("" for _ in labels[1:])
+        rows.append(row)
+    return table(headers, rows)
+
+
+def trendline_table(trendline: Dict, points: int) -> str:
+    """Render `trendline.analyze` output: summary columns plus the series resampled to at most `points` values."""
+    buckets = trendline["buckets"]
+    headers = ["topic", "tổng", "TB/bucket", "đỉnh", "MA cuối", f"chuỗi (gộp còn {points} điểm)" if len(buckets) > points else "chuỗi"]
+    rows = []
+    for topic in trendline["topics"]:
+        peak = topic["peak"]
+        series = resample(np.asarray(topic["counts"], dtype=np.int64), points) if buckets else []
+        rows.append([
+            topic["topic"],
+            topic["total"],
+            topic["mean"],
+            f"{peak['count']} ({peak['date']})" if peak else None,
+            topic["moving_average"][-1] if topic["moving_average"] else None,
+            " ".join(str(value) for value in series),
+        ])
+    return table(headers, rows)
+
+
+def spike_lines(trendline: Dict, limit: int) -> str:
+    """The `limit` largest spikes across topics, relative to their expected value."""
+    spikes = [
+        (spike["count"] / max(spike["expected"], 1.0), topic["topic"], spike)
+        for topic in trendline["topics"]
+        for spike in topic["spikes"]
+    ]
+    spikes.sort(key=lambda item: (-item[0], item[2]["date"], item[1]))
+    return "\n".join(
+        f"{name} | {spike['date']} | {spike['count']} đề cập | kỳ vọng {spike['expected']} | x{ratio:.1f}"
+        for ratio, name, spike in spikes[:limit]
+    )
+
+
+def truncate_data(text: str, max_tokens: int) -> str:
+    """Cut the data section of a rendered prompt to fit `max_tokens`, keeping the instructions whole.
+
+    Whole lines are dropped from the end of the data so tables stay
+    well-formed; a prompt without `INSTRUCTIONS_HEADING` is cut as plain text.
+    """
+    data, heading, instructions = text.rpartition(INSTRUCTIONS_HEADING)
+    if not heading:
+        return token_counter.truncate(text, max_tokens)
+    instructions = heading + instructions
+    budget = max_tokens - token_counter.count(f"{TRUNCATED_MARK}\n\n{instructions}")
+    lines = data.rstrip().split("\n")
+    # Tìm nhị phân số dòng dữ liệu giữ lại được
+    low, high = 0, len(lines)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if token_counter.count("\n".join(lines[:middle])) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    kept = "\n".join(lines[:low]) if low else token_counter.truncate(data.strip(), budget)
+    return f"{kept}\n{TRUNCATED_MARK}\n\n{instructions}"
+
+
+def buzz_lines(buzz_data: List[Optional[Dict]], topic_names: Dict[str, str], content_tokens: int, limit: int) -> List[str]:
+    """One compact line per top buzz, at most `limit` per topic, content cut to `content_tokens`."""
+    lines = []
+    for topic_buzz in buzz_data:
+        if not topic_buzz:
+            continue
+        name = topic_names.get(f"topic{topic_buzz.get('topic_id')}", topic_buzz.get("topic_id"))
+        for buzz in (topic_buzz.get("top_interactions_data") or [])[:limit]:
+            source = buzz.get("_source", {})
+            sentiment = (source.get("sentiment") or {}).get("value")
+            text = " ".join(filter(None, (source.get("title"), source.get("content"))))
+            text = " ".join(text.split())
+            lines.append(" | ".join(str(cell) for cell in (
+                name,
+                (source.get("publishedDate") or "")[:10],
+                source.get("siteName") or source.get("type") or "",
+                f"{source.get('interactions') or 0} tương tác",
+                SENTIMENT_LABELS.get(sentiment, "không rõ"),
+                source.get("url") or "",
+                token_counter.truncate(text, content_tokens),
+            )))
+    return lines
+
+
+@timed("build_prompt")
+def fit_prompt(
+    name: str,
+    render: Callable[[List[str]], str],
+    buzz_sets: Sequence[List[Optional[Dict]]],
+    topic_names: Dict[str, str],
+) -> CompactPrompt:
+    """Render the prompt within `PROMPT_MAX_TOKENS`, trimming buzzes deterministically.
+
+    `render(buzz_blocks)` builds the prompt from one block of buzz lines per
+    entry of `buzz_sets`. The content budget per buzz is halved first, then
+    buzzes per topic are dropped from the lowest ranked; if the numbers alone
+    still exceed the cap the data section is truncated, never the instructions.
+    """
+    content_tokens = settings.PROMPT_BUZZ_CONTENT_TOKENS
+    limit = max((len(t.get("top_interactions_data") or []) for buzz in buzz_sets for t in buzz if t), default=0)
+    trimmed = False
+    while True:
+        blocks = ["\n".join(buzz_lines(buzz, topic_names, content_tokens, limit)) or "(không có)" for buzz in buzz_sets]
+        text = render(blocks)
+        tokens = token_counter.count(text)
+        if tokens <= settings.PROMPT_MAX_TOKENS:
+            logger.info("Prompt %s: %d tokens%s", name, tokens, " (trimmed)" if trimmed else "")
+            return CompactPrompt(text, tokens, trimmed)
+        trimmed = True
+        if content_tokens > settings.PROMPT_BUZZ_MIN_CONTENT_TOKENS:
+            content_tokens = max(content_tokens // 2, settings.PROMPT_BUZZ_MIN_CONTENT_TOKENS)
+        elif limit > 0:
+            limit -= 1
+        else:
+            logger.warning("Prompt %s has %d tokens without buzzes, truncating data to %d", name, tokens, settings.PROMPT_MAX_TOKENS)
+            text = truncate_data(text, settings.PROMPT_MAX_TOKENS)
+            return CompactPrompt(text, token_counter.count(text), trimmed)
@@ -1,19 +1,26 @@
-import requests
+import asyncio
+import httpx
+from functools import partial
 from datetime import datetime
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 from app.core.config import settings
+from app.core.http_client import gateway_client
+from app.core.metrics import timed
+from app.services.bucket_store import (
+    INDEX_BUCKETS, SENTIMENT_BUCKETS, bucket_store, date_histogram_agg, parse_index_histogram, parse_index_totals,
+    sentiment_metrics,
+)
+from app.services.channels import SOURCE_TYPES
+from app.services.data_cache import DataRequest, cached_fetch, cached_fetch_many
+from app.services.graphql_batch import AGGREGATIONS_SELECTION, BatchOperation, execute_batch, required_result
+from app.services.project_index import ProjectIndex, get_unique_label_ids, project_index_store
 from app.core.exceptions import APIRequestException, InvalidDateFormatException, DateRangeException, InvalidResponseException
-from openai import OpenAI
 
 
 class APISentimentAggregationService:
     def __init__(self, x_token: str, x_refresh_token: str):
         self.x_token = x_token
         self.x_refresh_token = x_refresh_token
-        self.openai_client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=settings.OPENROUTER_API_KEY,
-        )
 
     def _get_headers(self) -> Dict[str, str]:
         return {
@@ -73,12 +80,7 @@ class APISentimentAggregationService:
         except ValueError:
             return False
 
-    def get_sentiment_aggregation(
-        self,
-        topic_ids: List[str],
-        from_date: str,
-        to_date: str
-    ) -> Optional[Dict]:
+    def _validate_range(self, from_date: str, to_date: str) -> None:
         if not (self.validate_date_format(from_date) and self.validate_date_format(to_date)):
             raise InvalidDateFormatException()
 
@@ -87,6 +89,48 @@ class APISentimentAggregationService:
         if from_dt > to_dt:
             raise DateRangeException()
 
+    @timed("get_sentiment_aggregation")
+    async def get_sentiment_aggregation(
+        self,
+        topic_ids: List[str],
+        from_date: str,
+        to_date: str
+    ) -> Optional[Dict]:
+        self._validate_range(from_date, to_date)
+        scope = (await self.get_project_index()).data_scope(topic_ids, topic_ids[0])
+        if settings.AGGREGATION_BUCKETS_ENABLED:
+            fetch = lambda: self._bucketed_sentiment_aggregation(topic_ids, from_date, to_date, scope)
+        else:
+            fetch = lambda: self._fetch_sentiment_aggregation(topic_ids, from_date, to_date)
+        return await cached_fetch("sentiment", scope, topic_ids, from_date, to_date, fetch)
+
+    async def _sentiment_filter(self, topic_ids: List[str], from_date: str, to_date: str) -> Dict:
+        return {
+            "publishedFromDate": from_date,
+            "publishedToDate": to_date,
+            "types": list(SOURCE_TYPES),
+            "isDeleted": False,
+            "sentiments": ["POSITIVE", "NEGATIVE", "NEUTRAL"],
+            "labels": await self.get_label_ids_by_topic_id(topic_ids[0]),
+            "levels": ["NONE", "LEVEL_1", "LEVEL_2", "LEVEL_3"]
+        }
+
+    def _sentiment_aggs(self, date_histogram: bool = False) -> List[Dict]:
+        sentiment_terms = {
+            "type": "TERMS",
+            "field": "SENTIMENT",
+            "option": {"terms": {"size": 100}},
+        }
+        return [
+            {
+                "type": "TERMS",
+                "field": "INDEX",
+                "option": {"terms": {"size": 100}},
+                "nest": [date_histogram_agg([sentiment_terms]) if date_histogram else sentiment_terms],
+            }
+        ]
+
+    async def _query_aggregations(self, topic_ids: List[str], filter: Dict, aggs: List[Dict]) -> Optional[Dict]:
         payload = {
             "query": """
                 query Aggregations($input: IndexesInput!, $filter: FilterBuzzInput, $aggs: [AggregationTypeInput]!) {
@@ -99,52 +143,124 @@ class APISentimentAggregationService:
             """,
             "variables": {
                 "input": {"indexes": topic_ids},
-                "aggs": [
-                    {
-                        "type": "TERMS",
-                        "field": "INDEX",
-                        "option": {"terms": {"size": 100}},
-                        "nest": [
-                            {
-                                "type": "TERMS",
-                                "field": "SENTIMENT",
-                                "option": {"terms": {"size": 100}},
-                            }
-                        ],
-                    }
-                ],
-                "filter": {
-                    "publishedFromDate": from_date,
-                    "publishedToDate": to_date,
-                    "types": [
-                        "FBPAGE_TOPIC", "FBPAGE_COMMENT", "FBGROUP_TOPIC", "FBGROUP_COMMENT",
-                        "FBUSER_TOPIC", "FBUSER_COMMENT", "FORUM_TOPIC", "FORUM_COMMENT",
-                        "NEWS_TOPIC", "NEWS_COMMENT", "YOUTUBE_TOPIC", "YOUTUBE_COMMENT",
-                        "BLOG_TOPIC", "BLOG_COMMENT", "QA_TOPIC", "QA_COMMENT",
-                        "SNS_TOPIC", "SNS_COMMENT", "TIKTOK_TOPIC", "TIKTOK_COMMENT",
-                        "LINKEDIN_TOPIC", "LINKEDIN_COMMENT", "ECOMMERCE_TOPIC", "ECOMMERCE_COMMENT",
-                        "THREADS_TOPIC", "THREADS_COMMENT",
-                    ],
-                    "isDeleted": False,
-                    "sentiments": ["POSITIVE", "NEGATIVE", "NEUTRAL"],
-                    "labels": self.get_label_ids_by_topic_id(topic_ids[0]),
-                    "levels": ["NONE", "LEVEL_1", "LEVEL_2", "LEVEL_3"]
-                }
+                "aggs": aggs,
+                "filter": filter,
             }
         }
 
         try:
-            response = requests.post(settings.GATEWAY_URL, headers=self._get_headers(), json=payload)
+            response = await gateway_client.post_json(settings.GATEWAY_URL, payload, self._get_headers())
             response.raise_for_status()
-            topic_map = [self.get_topic_by_topic_id(topic) for topic in topic_ids]
-            response_json = response.json().get("data", {}).get("aggregations", {}).get("data")
-            return self.refactor_result(response_json, topic_map, from_date, to_date)
-        except requests.RequestException as e:
+            return response.json().get("data", {}).get("aggregations", {}).get("data")
+        except httpx.HTTPError as e:
             raise APIRequestException(detail=f"Failed to fetch sentiment aggregation: {str(e)}")
         except (ValueError, KeyError) as e:
             raise InvalidResponseException(detail=f"Invalid response structure: {str(e)}")
 
-    def fetch_user_projects(self) -> Dict:
+    async def _fetch_sentiment_aggregation(
+        self,
+        topic_ids: List[str],
+        from_date: str,
+        to_date: str
+    ) -> Optional[Dict]:
+        response_json = await self._query_aggregations(
+            topic_ids, await self._sentiment_filter(topic_ids, from_date, to_date), self._sentiment_aggs()
+        )
+        topic_map = [await self.get_topic_by_topic_id(topic) for topic in topic_ids]
+        return self.refactor_result(response_json, topic_map, from_date, to_date)
+
+    async def _fetch_sentiment_days(self, topic_ids: List[str], days_from: str, days_to: str):
+        data = await self._query_aggregations(
+            topic_ids,
+            await self._sentiment_filter(topic_ids, days_from, days_to),
+            self._sentiment_aggs(date_histogram=True),
+        )
+        return parse_index_histogram(data, sentiment_metrics)
+
+    async def _bucketed_sentiment_aggregation(
+        self,
+        topic_ids: List[str],
+        from_date: str,
+        to_date: str,
+        scope: str,
+    ) -> Dict:
+        """Sentiment totals summed from daily buckets, mapped through `refactor_result`."""
+        async def fetch_totals(edge_from: str, edge_to: str):
+            data = await self._query_aggregations(
+                topic_ids, await self._sentiment_filter(topic_ids, edge_from, edge_to), self._sentiment_aggs()
+            )
+            return parse_index_totals(data, sentiment_metrics)
+
+        totals = await bucket_store.totals(
+            "sentiment", scope, [f"topic{topic_id}" for topic_id in topic_ids],
+            from_date, to_date, 4, fetch_totals, partial(self._fetch_sentiment_days, topic_ids),
+        )
+        buckets = [
+            {
+                "key": key,
+                "doc_count": int(values[0]),
+                SENTIMENT_BUCKETS: {"buckets": [
+                    {"key": sentiment, "doc_count": int(count)}
+                    for sentiment, count in zip((1, 2, 3), values[1:])
+                ]},
+            }
+            for key, values in totals.items()
+        ]
+        buckets.sort(key=lambda bucket: bucket["doc_count"], reverse=True)
+        topic_map = [await self.get_topic_by_topic_id(topic) for topic in topic_ids]
+        return self.refactor_result({INDEX_BUCKETS: {"buckets": buckets}}, topic_map, from_date, to_date)
+
+    @timed("get_sentiment_aggregations")
+    async def get_sentiment_aggregations(
+        self,
+        topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+    ) -> List[Optional[Dict]]:
+        """Sentiment aggregation of several periods, uncached ones fetched in one batched request."""
+        if settings.AGGREGATION_BUCKETS_ENABLED:
+            for from_date, to_date in periods:
+                self._validate_range(from_date, to_date)
+            scope = (await self.get_project_index()).data_scope(topic_ids, topic_ids[0])
+            # Một query date-histogram cho toàn bộ các khoảng, sau đó mỗi khoảng chỉ còn hỏi các cạnh lẻ
+            await bucket_store.prefetch(
+                "sentiment", scope, [f"topic{topic_id}" for topic_id in topic_ids],
+                periods, 4, partial(self._fetch_sentiment_days, topic_ids),
+            )
+            return list(await asyncio.gather(
+                *(self.get_sentiment_aggregation(topic_ids, from_date, to_date) for from_date, to_date in periods)
+            ))
+        for from_date, to_date in periods:
+            self._validate_range(from_date, to_date)
+        scope = (await self.get_project_index()).data_scope(topic_ids, topic_ids[0])
+        requests = [DataRequest("sentiment", scope, topic_ids, from_date, to_date) for from_date, to_date in periods]
+
+        async def fetch_missing(missing: List[DataRequest]) -> List[Optional[Dict]]:
+            sentiment_filter = [
+                await self._sentiment_filter(topic_ids, request.from_date, request.to_date) for request in missing
+            ]
+            operations = [
+                BatchOperation(f"q{i}", "aggregations", {
+                    "input": {"indexes": topic_ids},
+                    "filter": sentiment_filter[i],
+                    "aggs": self._sentiment_aggs(),
+                }, AGGREGATIONS_SELECTION)
+                for i in range(len(missing))
+            ]
+            results = await execute_batch(operations, self._get_headers(), "sentiment aggregation")
+            topic_map = [await self.get_topic_by_topic_id(topic) for topic in topic_ids]
+            # Alias lỗi thì báo lỗi, không coi là giai đoạn không có đề cập
+            return [
+                self.refactor_result(
+                    required_result(results, operation, "sentiment aggregation"),
+                    topic_map, request.from_date, request.to_date,
+                )
+                for operation, request in zip(operations, missing)
+            ]
+
+        return await cached_fetch_many(requests, fetch_missing)
+
+    @timed("fetch_user_projects")
+    async def fetch_user_projects(self) -> Dict:
         payload = {
             "query": """
                 query me {
@@ -177,59 +293,57 @@ class APISentimentAggregationService:
         }
 
         try:
-            response = requests.post(settings.CMS_GATEWAY_URL, headers=self._get_headers(), json=payload)
+            response = await gateway_client.post_json(
+                settings.CMS_GATEWAY_URL,
+                payload,
+                self._get_headers(),
+                timeout=settings.CMS_GATEWAY_TIMEOUT,
+                upstream="cms",
+            )
             response.raise_for_status()
             return response.json()
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             raise APIRequestException(detail=f"Failed to fetch user projects: {str(e)}")
         except ValueError as e:
             raise InvalidResponseException(detail=f"Invalid response structure: {str(e)}")
 
-    def get_label_ids_by_topic_id(self, topic_id: str) -> Optional[List[str]]:
-        try:
-            response_data = self.fetch_user_projects()
-            projects = response_data["data"]["me"]["data"]["projects"]
-
-            for project in projects:
-                for topic in project["topics"]:
-                    if topic["_id"] == topic_id:
-                        return self._get_unique_label_ids(project["groupTreeLabels"])
-            return None
-        except (KeyError, ValueError) as e:
-            raise InvalidResponseException(detail=f"Invalid response structure: {str(e)}")
+    async def get_project_index(self) -> ProjectIndex:
+        return await project_index_store.get(self.x_token, self.fetch_user_projects)
+
+    async def get_label_ids_by_topic_id(self, topic_id: str) -> Optional[List[str]]:
+        return (await self.get_project_index()).get_label_ids(topic_id)
 
     def _get_unique_label_ids(self, group_tree_labels: List[List[Dict]]) -> List[str]:
-        unique_ids = set()
-        for sub_array in group_tree_labels:
-            for item in sub_array:
-                unique_ids.add(item["_id"])
-        label_ids = list(unique_ids)
-        label_ids.insert(0, "-1")
-        return label_ids
-
-    def get_topic_by_topic_id(self, topic_id: str) -> Optional[Dict]:
-        try:
-            response_data = self.fetch_user_projects()
-            projects = response_data["data"]["me"]["data"]["projects"]
-
-            for project in projects:
-                for topic in project["topics"]:
-                    if topic["_id"] == topic_id:
-                        return topic
-            return None
-        except (KeyError, ValueError) as e:
-            raise InvalidResponseException(detail=f"Invalid response structure: {str(e)}")
+        return get_unique_label_ids(group_tree_labels)
 
-    def get_sentiment_breakdown_competitor(self, topic_ids: [str], from_date1: str, to_date1: str, from_date2: str, to_date2: str) -> Optional[Dict]:
-        if not (self.validate_date_format(from_date1) and self.validate_date_format(to_date1)):
-            raise InvalidDateFormatException()
-        if not (self.validate_date_format(from_date2) and self.validate_date_format(to_date2)):
-            raise InvalidDateFormatException()
+    async def get_topic_by_topic_id(self, topic_id: str) -> Optional[Dict]:
+        return (await self.get_project_index()).get_topic(topic_id)
 
-        data_preiod_1 = self.get_sentiment_aggregation(topic_ids, from_date1, to_date1)
-        data_preiod_2 = self.get_sentiment_aggregation(topic_ids, from_date2, to_date2)
-        result = {
-            "data_preiod_1": data_preiod_1,
-            "data_preiod_2": data_preiod_2,
+    async def get_sentiment_breakdown_competitor(self, topic_ids: [str], from_date1: str, to_date1: str, from_date2: str, to_date2: str) -> Optional[Dict]:
+        data_periods = await self.get_sentiment_breakdown_periods(
+            topic_ids, [(from_date1, to_date1), (from_date2, to_date2)]
+        )
+        if not data_periods:
+            return {}
+        return {
+            "data_preiod_1": data_periods[0],
+            "data_preiod_2": data_periods[1],
         }
-        return result if data_preiod_1 and data_preiod_2 else {}
+
+    async def get_sentiment_breakdown_periods(
+        self,
+        topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+    ) -> List[Dict]:
+        """`refactor_result` of every period, or [] when any period has no data."""
+        for from_date, to_date in periods:
+            if not (self.validate_date_format(from_date) and self.validate_date_format(to_date)):
+                raise InvalidDateFormatException()
+
+        if settings.GRAPHQL_BATCHING_ENABLED:
+            data_periods = await self.get_sentiment_aggregations(topic_ids, periods)
+        else:
+            data_periods = await asyncio.gather(
+                *(self.get_sentiment_aggregation(topic_ids, from_date, to_date) for from_date, to_date in periods)
+            )
+        return list(data_periods) if all(data_periods) else []
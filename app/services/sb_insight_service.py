@@ -1,10 +1,16 @@
-import json
-from typing import Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
+from app.core.llm_cache import prompt_cache_key
+from app.core.llm_client import llm_client
+from app.services.comparison import compare_sentiment, sentiment_matrix
+from app.services.prompt_compaction import CompactPrompt, fit_prompt, sentiment_table
 from app.services.sb_api_service import APISentimentAggregationService
 from app.services.sov_api_service import APISovService
 from app.core.exceptions import APIRequestException
 
+# Tăng khi nội dung template `build_sentiment_breakdown_prompt` thay đổi
+PROMPT_VERSION = "sentiment-breakdown-v5"
+
 class SentimentBreakdownInsightService:
     def __init__(self, x_token: str, x_refresh_token: str):
         self.api_service = APISentimentAggregationService(x_token, x_refresh_token)
@@ -18,42 +24,102 @@ class SentimentBreakdownInsightService:
         to_date2: str,
     ) -> Optional[str]:
         try:
-            sentiment_data: dict = self.api_service.get_sentiment_breakdown_competitor(topic_ids, from_date1, to_date1, from_date2, to_date2)
-            prompt = self.build_sentiment_breakdown_prompt(sentiment_data)
-
-            response = self.api_service.openai_client.chat.completions.create(
-                model="meta-llama/llama-4-scout:free",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1500,
-                temperature=0.7,
-            )
-            return response.choices[0].message.content.strip()
+            prompt, cache_key, _ = await self._prepare(topic_ids, [(from_date1, to_date1), (from_date2, to_date2)])
+            return await llm_client.complete(prompt.text, cache_key=cache_key, max_tokens=1500, temperature=0.7)
         except Exception as e:
             return f"[LỖI] Không thể tạo insight: {str(e)}"
 
-    def build_sentiment_breakdown_prompt( self, sentiment_data: dict
-    ) -> str:
-        from_date1 = sentiment_data["data_preiod_1"]["from_date"]
-        to_date1 = sentiment_data["data_preiod_1"]["to_date"]
-        from_date2 = sentiment_data["data_preiod_2"]["from_date"]
-        to_date2 = sentiment_data["data_preiod_2"]["to_date"]
+    async def stream_insight(
+        self,
+        topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield `(event, data)` pairs: `delta` chunks of the report, then `result`."""
+        try:
+            prompt, cache_key, comparison = await self._prepare(topic_ids, periods)
+            chunks = []
+            async for delta in llm_client.stream(prompt.text, cache_key=cache_key, max_tokens=1500, temperature=0.7):
+                chunks.append(delta)
+                yield "delta", delta
+            yield "result", {
+                "report": "".join(chunks).strip(),
+                "comparison": comparison,
+                "prompt_tokens": prompt.tokens,
+            }
+        except Exception as e:
+            yield "error", f"[LỖI] Không thể tạo insight: {str(e)}"
+
+    async def _prepare(
+        self,
+        topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+    ) -> Tuple[CompactPrompt, str, Dict]:
+        sentiment_data = await self.fetch_data(topic_ids, periods)
+        return (
+            self.build_sentiment_breakdown_prompt(sentiment_data),
+            self._prompt_cache_key(sentiment_data),
+            sentiment_data["comparison"],
+        )
+
+    async def fetch_data(
+        self,
+        topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+    ) -> dict:
+        data_periods = await self.api_service.get_sentiment_breakdown_periods(topic_ids, periods)
+        if not data_periods:
+            raise ValueError("No sentiment data for the requested periods")
+        names = list(dict.fromkeys(row["topic_name"] for period in data_periods for row in period["data"]))
+        comparison = compare_sentiment(
+            sentiment_matrix([period["data"] for period in data_periods], names),
+            names,
+            [{"from_date": period["from_date"], "to_date": period["to_date"]} for period in data_periods],
+        )
+        return {"data_periods": data_periods, "comparison": comparison}
+
+    async def report_from_data(self, sentiment_data: dict) -> Dict:
+        """Generate the report from data returned by `fetch_data`."""
+        prompt = self.build_sentiment_breakdown_prompt(sentiment_data)
+        report = await llm_client.complete(
+            prompt.text, cache_key=self._prompt_cache_key(sentiment_data), max_tokens=1500, temperature=0.7
+        )
+        return {"report": report, "comparison": sentiment_data["comparison"], "prompt_tokens": prompt.tokens}
+
+    def _prompt_cache_key(self, sentiment_data: dict) -> str:
+        # Chỉ giữ phần ngày của khoảng thời gian, số liệu theo ngày không đổi khi lệch vài phút
+        return prompt_cache_key(PROMPT_VERSION, [
+            {
+                "from_date": period["from_date"][:10],
+                "to_date": period["to_date"][:10],
+                "data": period["data"],
+            }
+            for period in sentiment_data["data_periods"]
+        ])
+
+    def build_sentiment_breakdown_prompt(self, sentiment_data: dict) -> CompactPrompt:
+        data_periods = sentiment_data["data_periods"]
+        period_list = ", ".join(
+            f"GĐ{index} ({period['from_date']} - {period['to_date']})"
+            for index, period in enumerate(data_periods, start=1)
+        )
+        table = sentiment_table(sentiment_data["comparison"])
 
-        return f"""
-    Dữ liệu phân tích cảm xúc (Sentiment Breakdown) của các thương hiệu theo hai giai đoạn:
+        def render(_buzz_blocks) -> str:
+            return f"""
+Dữ liệu phân tích cảm xúc (Sentiment Breakdown) của các thương hiệu theo {len(data_periods)} giai đoạn, mới nhất trước: {period_list}.
+Các chỉ số đã được tính sẵn: % trên tổng đề cập; net = (tích cực - tiêu cực) / (tích cực + tiêu cực) x 100; Δ là mỗi giai đoạn so với giai đoạn liền sau; cột bất thường đánh dấu thương hiệu biến động khác hẳn các thương hiệu còn lại. Chỉ diễn giải, không tính lại.
 
-    ### Giai đoạn 1 ({from_date1} - {to_date1})
-    {json.dumps(sentiment_data["data_preiod_1"]["data"], ensure_ascii=False, indent=2)}
+{table}
 
-    ### Giai đoạn 2 ({from_date2} - {to_date2})
-    {json.dumps(sentiment_data["data_preiod_2"]["data"], ensure_ascii=False, indent=2)}
+### Yêu cầu
+Bạn là một chuyên gia phân tích dữ liệu. Hãy viết **báo cáo insight cảm xúc** bằng tiếng Việt, ngắn gọn, dễ hiểu, chuyên nghiệp. Nội dung cần có:
 
-    ### Yêu cầu
-    Bạn là một chuyên gia phân tích dữ liệu. Hãy viết **báo cáo insight cảm xúc** bằng tiếng Việt, ngắn gọn, dễ hiểu, chuyên nghiệp. Nội dung cần có:
+1. **Tổng quan cảm xúc**: Nhận định tổng quan về cảm xúc tích cực, tiêu cực, trung lập của các thương hiệu giữa các giai đoạn.
+2. **So sánh chi tiết từng thương hiệu**: Đánh giá thay đổi cảm xúc theo từng thương hiệu giữa các giai đoạn.
+3. **Xu hướng và nhận định**: Rút ra xu hướng cảm xúc (tăng/giảm tích cực, tiêu cực), lý do có thể (nếu có).
+4. **Khuyến nghị hành động**: Đề xuất hành động truyền thông phù hợp cho từng thương hiệu dựa trên diễn biến cảm xúc.
 
-    1. **Tổng quan cảm xúc**: Nhận định tổng quan về cảm xúc tích cực, tiêu cực, trung lập của các thương hiệu giữa hai giai đoạn.
-    2. **So sánh chi tiết từng thương hiệu**: Đánh giá thay đổi cảm xúc theo từng thương hiệu giữa 2 giai đoạn.
-    3. **Xu hướng và nhận định**: Rút ra xu hướng cảm xúc (tăng/giảm tích cực, tiêu cực), lý do có thể (nếu có).
-    4. **Khuyến nghị hành động**: Đề xuất hành động truyền thông phù hợp cho từng thương hiệu dựa trên diễn biến cảm xúc.
+Chỉ tập trung vào insight từ số liệu cảm xúc, tránh lặp lại dữ liệu gốc hoặc nêu lại quá chi tiết.
+"""
 
-    Chỉ tập trung vào insight từ số liệu cảm xúc, tránh lặp lại dữ liệu gốc hoặc nêu lại quá chi tiết.
-    """
+        return fit_prompt("sentiment_breakdown", render, [], {})
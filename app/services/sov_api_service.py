@@ -1,20 +1,46 @@
-import requests
-from typing import Dict, List, Optional
+import asyncio
+import heapq
+import httpx
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from openai import OpenAI
 from app.core.config import settings
+from app.core.http_client import gateway_client
+from app.core.metrics import timed
+from app.services.bucket_store import (
+    INDEX_BUCKETS, bucket_store, date_histogram_agg, doc_count_metrics, parse_index_histogram, parse_index_totals,
+)
+from app.services.channels import SOURCE_TYPES, type_terms_aggs
+from app.services.data_cache import DataRequest, cached_fetch, cached_fetch_many
+from app.services.graphql_batch import AGGREGATIONS_SELECTION, BatchOperation, execute_batch
+from app.services.project_index import ProjectIndex, get_unique_label_ids, project_index_store
 from app.core.exceptions import APIRequestException, InvalidResponseException, DateRangeException, \
     InvalidDateFormatException
 
+# Chỉ lấy các field cần cho prompt và response, không kéo lịch sử sentiment/labels
+BUZZES_SELECTION = """
+    total
+    data {
+        _id
+        _index
+        _source {
+            type
+            publishedDate
+            siteName
+            url
+            title
+            content
+            interactions
+            sentiment { value }
+        }
+    }
+"""
+
 
 class APISovService:
     def __init__(self, x_token: str, x_refresh_token: str):
         self.x_token = x_token
         self.x_refresh_token = x_refresh_token
-        self.openai_client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=settings.OPENROUTER_API_KEY,
-        )
 
     def _get_headers(self) -> Dict[str, str]:
         return {
@@ -37,7 +63,7 @@ class APISovService:
         except ValueError:
             return False
 
-    def get_sov_data(self, topic_ids: List[str], from_date: str, to_date: str) -> Optional[Dict]:
+    def _validate_range(self, from_date: str, to_date: str) -> None:
         if not (self.validate_date_format(from_date) and self.validate_date_format(to_date)):
             raise InvalidDateFormatException()
 
@@ -46,6 +72,33 @@ class APISovService:
         if from_dt > to_dt:
             raise DateRangeException()
 
+    @timed("get_sov_data")
+    async def get_sov_data(self, topic_ids: List[str], from_date: str, to_date: str) -> Optional[Dict]:
+        self._validate_range(from_date, to_date)
+        scope = (await self.get_project_index()).data_scope(topic_ids, topic_ids[0])
+        if settings.AGGREGATION_BUCKETS_ENABLED:
+            fetch = lambda: self._bucketed_sov_data(topic_ids, from_date, to_date, scope)
+        else:
+            fetch = lambda: self._fetch_sov_data(topic_ids, from_date, to_date)
+        return await cached_fetch("sov", scope, topic_ids, from_date, to_date, fetch)
+
+    async def _sov_filter(self, topic_ids: List[str], from_date: str, to_date: str) -> Dict:
+        return {
+            "publishedFromDate": from_date,
+            "publishedToDate": to_date,
+            "types": list(SOURCE_TYPES),
+            "isDeleted": False,
+            "sentiments": ["NONE", "POSITIVE", "NEGATIVE", "NEUTRAL"],
+            "labels": await self.get_label_ids_by_topic_id(topic_ids[0]),
+            "levels": ["NONE", "LEVEL_1", "LEVEL_2", "LEVEL_3"],
+        }
+
+    def _sov_aggs(self) -> List[Dict]:
+        # Cùng dạng TERMS(INDEX) với query sentiment gốc, nên kết quả chắc chắn nằm ở `_index_terms`.
+        # Bỏ `extendName: BUZZ_TRENDLINE_GLOBAL` của query SOV gốc vì chưa xác nhận tên bucket nó trả về
+        return [{"type": "TERMS", "field": "INDEX", "option": {"terms": {"size": 100}}}]
+
+    async def _query_aggregations(self, topic_ids: List[str], filter: Dict, aggs: List[Dict]) -> Optional[Dict]:
         payload = {
             "query": """
                 query Aggregations($input: IndexesInput!, $filter: FilterBuzzInput, $aggs: [AggregationTypeInput]!) {
@@ -58,105 +111,276 @@ class APISovService:
             """,
             "variables": {
                 "input": {"indexes": topic_ids},
-                "aggs": [{"type": "TERMS", "extendName": "BUZZ_TRENDLINE_GLOBAL", "field": "INDEX"}],
-                "filter": {
-                    "publishedFromDate": from_date,
-                    "publishedToDate": to_date,
-                    "types": [
-                        "FBPAGE_TOPIC", "FBPAGE_COMMENT", "FBGROUP_TOPIC", "FBGROUP_COMMENT",
-                        "FBUSER_TOPIC", "FBUSER_COMMENT", "FORUM_TOPIC", "FORUM_COMMENT",
-                        "NEWS_TOPIC", "NEWS_COMMENT", "YOUTUBE_TOPIC", "YOUTUBE_COMMENT",
-                        "BLOG_TOPIC", "BLOG_COMMENT", "QA_TOPIC", "QA_COMMENT",
-                        "SNS_TOPIC", "SNS_COMMENT", "TIKTOK_TOPIC", "TIKTOK_COMMENT",
-                        "LINKEDIN_TOPIC", "LINKEDIN_COMMENT", "ECOMMERCE_TOPIC", "ECOMMERCE_COMMENT",
-                        "THREADS_TOPIC", "THREADS_COMMENT",
-                    ],
-                    "isDeleted": False,
-                    "sentiments": ["NONE", "POSITIVE", "NEGATIVE", "NEUTRAL"],
-                    "labels": self.get_label_ids_by_topic_id(topic_ids[0]),
-                    "levels": ["NONE", "LEVEL_1", "LEVEL_2", "LEVEL_3"],
-                },
+                "aggs": aggs,
+                "filter": filter,
             },
         }
 
         try:
-            response = requests.post(settings.GATEWAY_URL, headers=self._get_headers(), json=payload)
+            response = await gateway_client.post_json(settings.GATEWAY_URL, payload, self._get_headers())
             response.raise_for_status()
             data = response.json().get("data", {}).get("aggregations", {}).get("data")
             return data
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             raise APIRequestException(detail=f"Failed to fetch SOV data: {str(e)}")
         except (ValueError, KeyError) as e:
             raise InvalidResponseException(detail=f"Invalid response structure: {str(e)}")
 
-    def get_buzz_data(self, topic_id: str, from_date: str, to_date: str) -> Optional[Dict]:
+    async def _fetch_sov_data(self, topic_ids: List[str], from_date: str, to_date: str) -> Optional[Dict]:
+        return await self._query_aggregations(
+            topic_ids,
+            await self._sov_filter(topic_ids, from_date, to_date),
+            self._sov_aggs(),
+        )
+
+    async def _fetch_sov_days(self, topic_ids: List[str], days_from: str, days_to: str):
+        data = await self._query_aggregations(
+            topic_ids,
+            await self._sov_filter(topic_ids, days_from, days_to),
+            [{"type": "TERMS", "field": "INDEX", "option": {"terms": {"size": 100}}, "nest": [date_histogram_agg()]}],
+        )
+        return parse_index_histogram(data, doc_count_metrics)
+
+    async def _bucketed_sov_data(self, topic_ids: List[str], from_date: str, to_date: str, scope: str) -> Dict:
+        """SOV totals summed from daily buckets; same `_index_terms` shape as a TERMS(INDEX) query."""
+        async def fetch_totals(edge_from: str, edge_to: str):
+            data = await self._query_aggregations(
+                topic_ids, await self._sov_filter(topic_ids, edge_from, edge_to), self._sov_aggs()
+            )
+            return parse_index_totals(data, doc_count_metrics)
+
+        totals = await bucket_store.totals(
+            "sov", scope, [f"topic{topic_id}" for topic_id in topic_ids],
+            from_date, to_date, 1, fetch_totals, partial(self._fetch_sov_days, topic_ids),
+        )
+        buckets = [{"key": key, "doc_count": int(values[0])} for key, values in totals.items()]
+        buckets.sort(key=lambda bucket: bucket["doc_count"], reverse=True)
+        return {INDEX_BUCKETS: {"buckets": buckets}}
+
+    @timed("get_mentions_histogram")
+    async def get_mentions_histogram(
+        self,
+        topic_ids: List[str],
+        from_date: str,
+        to_date: str,
+        interval: str = "1d",
+    ) -> Optional[Dict]:
+        """Mentions per topic per `interval` bucket: TERMS(INDEX) > DATE_HISTOGRAM, cached like `get_sov_data`."""
+        self._validate_range(from_date, to_date)
+        scope = (await self.get_project_index()).data_scope(topic_ids, topic_ids[0])
+
+        async def fetch():
+            return await self._query_aggregations(
+                topic_ids,
+                await self._sov_filter(topic_ids, from_date, to_date),
+                [{
+                    "type": "TERMS", "field": "INDEX", "option": {"terms": {"size": 100}},
+                    "nest": [date_histogram_agg(interval=interval)],
+                }],
+            )
+
+        return await cached_fetch(f"histogram-{interval}", scope, topic_ids, from_date, to_date, fetch)
+
+    @timed("get_channel_data")
+    async def get_channel_data(self, topic_ids: List[str], from_date: str, to_date: str) -> Optional[Dict]:
+        """Mentions per topic and source type: TERMS(INDEX) > TERMS(TYPE)."""
+        self._validate_range(from_date, to_date)
+        scope = (await self.get_project_index()).data_scope(topic_ids, topic_ids[0])
+
+        async def fetch():
+            return await self._query_aggregations(
+                topic_ids, await self._sov_filter(topic_ids, from_date, to_date), type_terms_aggs()
+            )
+
+        return await cached_fetch("channels", scope, topic_ids, from_date, to_date, fetch)
+
+    @timed("get_channel_periods")
+    async def get_channel_periods(
+        self,
+        topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+    ) -> List[Optional[Dict]]:
+        """Channel aggregation of several periods, uncached ones fetched in one batched request."""
+        if not settings.GRAPHQL_BATCHING_ENABLED:
+            return list(await asyncio.gather(
+                *(self.get_channel_data(topic_ids, from_date, to_date) for from_date, to_date in periods)
+            ))
+        for from_date, to_date in periods:
+            self._validate_range(from_date, to_date)
+        scope = (await self.get_project_index()).data_scope(topic_ids, topic_ids[0])
+        requests = [DataRequest("channels", scope, topic_ids, from_date, to_date) for from_date, to_date in periods]
+
+        async def fetch_missing(missing: List[DataRequest]) -> List[Optional[Dict]]:
+            operations = [
+                BatchOperation(f"q{i}", "aggregations", {
+                    "input": {"indexes": topic_ids},
+                    "filter": await self._sov_filter(topic_ids, request.from_date, request.to_date),
+                    "aggs": type_terms_aggs(),
+                }, AGGREGATIONS_SELECTION)
+                for i, request in enumerate(missing)
+            ]
+            results = await execute_batch(operations, self._get_headers(), "channel data")
+            return [results[operation.alias] for operation in operations]
+
+        return await cached_fetch_many(requests, fetch_missing)
+
+    @timed("get_buzz_data")
+    async def get_buzz_data(self, topic_id: str, from_date: str, to_date: str) -> Optional[Dict]:
+        scope = (await self.get_project_index()).data_scope([topic_id], topic_id)
+        return await cached_fetch(
+            "buzz", scope, [topic_id], from_date, to_date,
+            lambda: self._fetch_buzz_data(topic_id, from_date, to_date),
+        )
+
+    async def _buzz_filter(self, topic_id: str, from_date: str, to_date: str, skip: int, limit: int) -> Dict:
+        buzz_filter = {
+            "publishedFromDate": from_date,
+            "publishedToDate": to_date,
+            "types": [
+                "FBPAGE_TOPIC", "FBPAGE_COMMENT", "FBGROUP_TOPIC", "FBGROUP_COMMENT",
+                "FBUSER_TOPIC", "FBUSER_COMMENT", "FORUM_TOPIC", "FORUM_COMMENT",
+                "NEWS_TOPIC", "NEWS_COMMENT", "YOUTUBE_TOPIC", "YOUTUBE_COMMENT",
+                "BLOG_TOPIC", "BLOG_COMMENT", "QA_TOPIC", "QA_COMMENT",
+                "SNS_TOPIC", "SNS_COMMENT", "TIKTOK_TOPIC", "TIKTOK_COMMENT",
+                "LINKEDIN_TOPIC", "LINKEDIN_COMMENT", "ECOMMERCE_TOPIC", "ECOMMERCE_COMMENT",
+            ],
+            "isDeleted": False,
+            "labels": await self.get_label_ids_by_topic_id(topic_id),
+            "sentiments": ["NEGATIVE", "POSITIVE", "NEUTRAL"],
+            "levels": ["NONE", "LEVEL_1", "LEVEL_2", "LEVEL_3"],
+            "skip": skip,
+            "limit": limit,
+        }
+        if settings.BUZZ_SERVER_SORT:
+            buzz_filter["sort"] = [{"field": "INTERACTIONS", "order": "DESC"}]
+        return buzz_filter
+
+    def _first_buzz_page_size(self) -> int:
+        # Gateway tự sắp xếp thì chỉ cần đúng K buzz đầu tiên
+        return settings.BUZZ_TOP_K if settings.BUZZ_SERVER_SORT else settings.BUZZ_PAGE_SIZE
+
+    def _top_interactions(self, topic_id: str, data: List[Dict]) -> Dict:
+        top = heapq.nlargest(settings.BUZZ_TOP_K, data, key=lambda x: int(x["_source"].get("interactions") or 0))
+        return {"topic_id": topic_id, "top_interactions_data": top}
+
+    async def _scan_top_buzzes(self, topic_id: str, from_date: str, to_date: str, first_page: List[Dict]) -> Dict:
+        """Page through buzzes keeping only the running top K (bounded memory).
+
+        Without `BUZZ_SERVER_SORT` every one of the first `BUZZ_MAX_SCAN`
+        buzzes is still downloaded; only the memory kept is bounded.
+        """
+        top = self._top_interactions(topic_id, first_page)["top_interactions_data"]
+        page, skip = first_page, len(first_page)
+        while (
+            not settings.BUZZ_SERVER_SORT
+            and len(page) == settings.BUZZ_PAGE_SIZE
+            and skip < settings.BUZZ_MAX_SCAN
+        ):
+            limit = min(settings.BUZZ_PAGE_SIZE, settings.BUZZ_MAX_SCAN - skip)
+            page = (await self._fetch_buzz_page(topic_id, from_date, to_date, skip, limit)).get("data") or []
+            # Các phần tử của `top` đứng trước nên vẫn thắng khi hoà điểm, giống sorted()
+            top = self._top_interactions(topic_id, top + page)["top_interactions_data"]
+            skip += len(page)
+        return {"topic_id": topic_id, "top_interactions_data": top}
+
+    async def _fetch_buzz_page(self, topic_id: str, from_date: str, to_date: str, skip: int, limit: int) -> Dict:
         payload = {
             "query": """
                 query buzzes($input: IndexesInput!, $filter: FilterBuzzInput) {
                     buzzes(input: $input, filter: $filter) {
-                        status
-                        message
-                        total
-                        skip
-                        limit
-                        data {
-                            _id
-                            _index
-                            _source {
-                                type
-                                publishedDate
-                                siteId
-                                siteName
-                                url
-                                title
-                                content
-                                interactions
-                                parentId
-                                parentDate
-                                commentParentId
-                                sentiment { value createdAt createdBy updatedAt updatedBy }
-                                labels { value createdAt createdBy }
-                                profile { id name }
-                            }
-                        }
+                        %s
                     }
                 }
-            """,
+            """ % BUZZES_SELECTION,
             "variables": {
                 "input": {"indexes": [topic_id]},
-                "filter": {
-                    "publishedFromDate": from_date,
-                    "publishedToDate": to_date,
-                    "types": [
-                        "FBPAGE_TOPIC", "FBPAGE_COMMENT", "FBGROUP_TOPIC", "FBGROUP_COMMENT",
-                        "FBUSER_TOPIC", "FBUSER_COMMENT", "FORUM_TOPIC", "FORUM_COMMENT",
-                        "NEWS_TOPIC", "NEWS_COMMENT", "YOUTUBE_TOPIC", "YOUTUBE_COMMENT",
-                        "BLOG_TOPIC", "BLOG_COMMENT", "QA_TOPIC", "QA_COMMENT",
-                        "SNS_TOPIC", "SNS_COMMENT", "TIKTOK_TOPIC", "TIKTOK_COMMENT",
-                        "LINKEDIN_TOPIC", "LINKEDIN_COMMENT", "ECOMMERCE_TOPIC", "ECOMMERCE_COMMENT",
-                    ],
-                    "isDeleted": False,
-                    "labels": self.get_label_ids_by_topic_id(topic_id),
-                    "sentiments": ["NEGATIVE", "POSITIVE", "NEUTRAL"],
-                    "levels": ["NONE", "LEVEL_1", "LEVEL_2", "LEVEL_3"],
-                    "skip": 0,
-                    "limit": 100,
-                },
+                "filter": await self._buzz_filter(topic_id, from_date, to_date, skip, limit),
             },
         }
 
         try:
-            response = requests.post(settings.GATEWAY_URL, headers=self._get_headers(), json=payload)
+            response = await gateway_client.post_json(settings.GATEWAY_URL, payload, self._get_headers())
             response.raise_for_status()
-            data = response.json()["data"]["buzzes"]["data"]
-            sorted_data = sorted(data, key=lambda x: int(x["_source"].get("interactions", 0)), reverse=True)[:2]
-            return {"topic_id": topic_id, "top_interactions_data": sorted_data}
-        except requests.RequestException as e:
+            return response.json()["data"]["buzzes"]
+        except httpx.HTTPError as e:
             raise APIRequestException(detail=f"Failed to fetch buzz data: {str(e)}")
-        except (ValueError, KeyError) as e:
+        except (ValueError, KeyError, TypeError) as e:
             raise InvalidResponseException(detail=f"Invalid response structure: {str(e)}")
 
-    def fetch_user_projects(self) -> Dict:
+    async def _fetch_buzz_data(self, topic_id: str, from_date: str, to_date: str) -> Optional[Dict]:
+        page = await self._fetch_buzz_page(topic_id, from_date, to_date, 0, self._first_buzz_page_size())
+        return await self._scan_top_buzzes(topic_id, from_date, to_date, page.get("data") or [])
+
+    @timed("get_period_bundle")
+    async def get_period_bundle(
+        self,
+        topic_ids: List[str],
+        buzz_topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+    ) -> Tuple[List[Optional[Dict]], List[List[Optional[Dict]]]]:
+        """SOV data and top buzzes of several periods in a single gateway round-trip.
+
+        Cached entries are reused; only the misses are packed into one aliased
+        GraphQL document. Returns `(sov_per_period, buzzes_per_period)`.
+        """
+        for from_date, to_date in periods:
+            self._validate_range(from_date, to_date)
+        index = await self.get_project_index()
+        sov_scope = index.data_scope(topic_ids, topic_ids[0])
+        # Ở chế độ bucket, SOV đi qua bucket store thay vì query theo khoảng
+        batch_sov = not settings.AGGREGATION_BUCKETS_ENABLED
+
+        requests = []
+        for from_date, to_date in periods:
+            if batch_sov:
+                requests.append(DataRequest("sov", sov_scope, topic_ids, from_date, to_date))
+            for topic_id in buzz_topic_ids:
+                requests.append(DataRequest("buzz", index.data_scope([topic_id], topic_id), [topic_id], from_date, to_date))
+
+        async def fetch_missing(missing: List[DataRequest]) -> List[Optional[Dict]]:
+            operations = []
+            for i, request in enumerate(missing):
+                if request.kind == "sov":
+                    operations.append(BatchOperation(f"q{i}", "aggregations", {
+                        "input": {"indexes": request.topic_ids},
+                        "filter": await self._sov_filter(request.topic_ids, request.from_date, request.to_date),
+                        "aggs": self._sov_aggs(),
+                    }, AGGREGATIONS_SELECTION))
+                else:
+                    topic_id = request.topic_ids[0]
+                    operations.append(BatchOperation(f"q{i}", "buzzes", {
+                        "input": {"indexes": [topic_id]},
+                        "filter": await self._buzz_filter(
+                            topic_id, request.from_date, request.to_date, 0, self._first_buzz_page_size()
+                        ),
+                    }, BUZZES_SELECTION))
+            results = await execute_batch(operations, self._get_headers(), "SOV data")
+            values = []
+            for operation, request in zip(operations, missing):
+                data = results[operation.alias]
+                if request.kind == "buzz" and data is not None:
+                    data = await self._scan_top_buzzes(request.topic_ids[0], request.from_date, request.to_date, data)
+                values.append(data)
+            return values
+
+        values = iter(await cached_fetch_many(requests, fetch_missing))
+        sov_data, buzz_data = [], []
+        for _ in periods:
+            sov_data.append(next(values) if batch_sov else None)
+            buzz_data.append([next(values) for _ in buzz_topic_ids])
+        if not batch_sov:
+            # Một query date-histogram cho toàn bộ các khoảng, sau đó mỗi khoảng chỉ còn hỏi các cạnh lẻ
+            await bucket_store.prefetch(
+                "sov", sov_scope, [f"topic{topic_id}" for topic_id in topic_ids],
+                periods, 1, partial(self._fetch_sov_days, topic_ids),
+            )
+            sov_data = list(await asyncio.gather(
+                *(self.get_sov_data(topic_ids, from_date, to_date) for from_date, to_date in periods)
+            ))
+        return sov_data, buzz_data
+
+    @timed("fetch_user_projects")
+    async def fetch_user_projects(self) -> Dict:
         payload = {
             "query": """
                 query me {
@@ -189,46 +413,28 @@ class APISovService:
         }
 
         try:
-            response = requests.post(settings.CMS_GATEWAY_URL, headers=self._get_headers(), json=payload)
+            response = await gateway_client.post_json(
+                settings.CMS_GATEWAY_URL,
+                payload,
+                self._get_headers(),
+                timeout=settings.CMS_GATEWAY_TIMEOUT,
+                upstream="cms",
+            )
             response.raise_for_status()
             return response.json()
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             raise APIRequestException(detail=f"Failed to fetch user projects: {str(e)}")
         except ValueError as e:
             raise InvalidResponseException(detail=f"Invalid response structure: {str(e)}")
 
-    def get_label_ids_by_topic_id(self, topic_id: str) -> Optional[List[str]]:
-        try:
-            response_data = self.fetch_user_projects()
-            projects = response_data["data"]["me"]["data"]["projects"]
-
-            for project in projects:
-                for topic in project["topics"]:
-                    if topic["_id"] == topic_id:
-                        return self._get_unique_label_ids(project["groupTreeLabels"])
-            return None
-        except (KeyError, ValueError) as e:
-            raise InvalidResponseException(detail=f"Invalid response structure: {str(e)}")
+    async def get_project_index(self) -> ProjectIndex:
+        return await project_index_store.get(self.x_token, self.fetch_user_projects)
+
+    async def get_label_ids_by_topic_id(self, topic_id: str) -> Optional[List[str]]:
+        return (await self.get_project_index()).get_label_ids(topic_id)
 
     def _get_unique_label_ids(self, group_tree_labels: List[List[Dict]]) -> List[str]:
-        unique_ids = set()
-        for sub_array in group_tree_labels:
-            for item in sub_array:
-                unique_ids.add(item["_id"])
-        label_ids = list(unique_ids)
-        label_ids.insert(0, "-1")
-        return label_ids
-
-    def get_topic_by_topic_id(self, topic_id: str) -> Optional[Dict]:
-        try:
-            response_data = self.fetch_user_projects()
-            projects = response_data["data"]["me"]["data"]["projects"]
-
-            for project in projects:
-                for topic in project["topics"]:
-                    if topic["_id"] == topic_id:
-                        return topic
-            return None
-        except (KeyError, ValueError) as e:
-            raise InvalidResponseException(detail=f"Invalid response structure: {str(e)}")
+        return get_unique_label_ids(group_tree_labels)
 
+    async def get_topic_by_topic_id(self, topic_id: str) -> Optional[Dict]:
+        return (await self.get_project_index()).get_topic(topic_id)
@@ -1,8 +1,16 @@
-import json
-from typing import Dict, List, Optional
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.llm_cache import prompt_cache_key, unordered
+from app.core.llm_client import llm_client
+from app.services.comparison import compare_sov, sov_matrix
+from app.services.prompt_compaction import CompactPrompt, fit_prompt, sov_table
 from app.services.sov_api_service import APISovService
 from app.core.exceptions import APIRequestException
 
+# Tăng khi nội dung template `_build_prompt` thay đổi để bỏ qua các câu trả lời LLM đã cache
+PROMPT_VERSION = "sov-v5"
+
 class SovInsightService:
     def __init__(self, x_token: str, x_refresh_token: str):
         self.api_service = APISovService(x_token, x_refresh_token)
@@ -16,75 +24,150 @@ class SovInsightService:
         to_date2: str,
     ) -> Optional[str]:
         try:
-            data_period_1 = self.api_service.get_sov_data(topic_ids, from_date1, to_date1)
-            data_period_2 = self.api_service.get_sov_data(topic_ids, from_date2, to_date2)
-            topic_data = [
-                self.api_service.get_topic_by_topic_id(topic_id) for topic_id in topic_ids
-            ]
-            topic_data = [topic for topic in topic_data if topic]  # Filter out None values
-
-            prompt, buzz_data_1, buzz_data_2 = self._build_prompt(
-                data_period_1,
-                data_period_2,
-                topic_data,
-                from_date1,
-                to_date1,
-                from_date2,
-                to_date2,
-            )
-
-            response = self.api_service.openai_client.chat.completions.create(
-                model="meta-llama/llama-4-scout:free",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-            )
-            return response.choices[0].message.content.strip(), buzz_data_1, buzz_data_2
+            prompt, cache_key, data = await self._prepare(topic_ids, [(from_date1, to_date1), (from_date2, to_date2)])
+            report = await llm_client.complete(prompt.text, cache_key=cache_key, temperature=0.7)
+            return report, data["buzz_periods"][0], data["buzz_periods"][1]
         except Exception as e:
             return f"[LỖI] Không thể tạo insight: {str(e)}"
 
+    async def stream_insight(
+        self,
+        topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield `(event, data)` pairs: `delta` chunks of the report, then `result`."""
+        try:
+            prompt, cache_key, data = await self._prepare(topic_ids, periods)
+            chunks = []
+            async for delta in llm_client.stream(prompt.text, cache_key=cache_key, temperature=0.7):
+                chunks.append(delta)
+                yield "delta", delta
+            yield "result", self._result("".join(chunks).strip(), prompt, data)
+        except Exception as e:
+            yield "error", f"[LỖI] Không thể tạo insight: {str(e)}"
+
+    async def _prepare(
+        self,
+        topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+    ) -> Tuple[CompactPrompt, str, Dict[str, Any]]:
+        data = await self.fetch_data(topic_ids, periods)
+        return self._build_prompt(**data), self._prompt_cache_key(data), data
+
+    async def fetch_data(
+        self,
+        topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+    ) -> Dict[str, Any]:
+        """Fetch everything the SOV prompt needs, keyed like `_build_prompt` arguments."""
+        topic_data = await asyncio.gather(
+            *(self.api_service.get_topic_by_topic_id(topic_id) for topic_id in topic_ids)
+        )
+        topic_data = [topic for topic in topic_data if topic]  # Filter out None values
+
+        if settings.GRAPHQL_BATCHING_ENABLED:
+            # Gộp SOV và buzz của mọi giai đoạn vào một request GraphQL
+            sov_periods, buzz_periods = await self.api_service.get_period_bundle(
+                topic_ids,
+                [topic["_id"] for topic in topic_data],
+                periods,
+            )
+        else:
+            # Các lời gọi gateway độc lập với nhau nên chạy song song
+            results = await asyncio.gather(
+                *(self.api_service.get_sov_data(topic_ids, from_date, to_date) for from_date, to_date in periods),
+                *(self._fetch_buzz_data(topic_data, from_date, to_date) for from_date, to_date in periods),
+            )
+            sov_periods, buzz_periods = list(results[:len(periods)]), list(results[len(periods):])
+
+        names = {topic["_id"]: topic["name"] for topic in topic_data}
+        comparison = compare_sov(
+            sov_matrix(sov_periods, [f"topic{topic_id}" for topic_id in topic_ids]),
+            [names.get(topic_id, topic_id) for topic_id in topic_ids],
+            [{"from_date": from_date, "to_date": to_date} for from_date, to_date in periods],
+        )
+
+        return {
+            "sov_periods": sov_periods,
+            "buzz_periods": buzz_periods,
+            "comparison": comparison,
+            "topic_map": topic_data,
+            "periods": periods,
+        }
+
+    async def report_from_data(self, data: Dict[str, Any]) -> Dict:
+        """Generate the report from data returned by `fetch_data`."""
+        prompt = self._build_prompt(**data)
+        report = await llm_client.complete(prompt.text, cache_key=self._prompt_cache_key(data), temperature=0.7)
+        return self._result(report, prompt, data)
+
+    def _result(self, report: str, prompt: CompactPrompt, data: Dict[str, Any]) -> Dict:
+        # Giữ các khoá data_period_<n> (buzz nổi bật của từng giai đoạn) như response cũ
+        result = {"report": report}
+        for index, buzz_data in enumerate(data["buzz_periods"], start=1):
+            result[f"data_period_{index}"] = buzz_data
+        result["comparison"] = data["comparison"]
+        result["prompt_tokens"] = prompt.tokens
+        return result
+
+    async def _fetch_buzz_data(self, topic_map: List[Dict], from_date: str, to_date: str) -> List[Dict]:
+        return list(await asyncio.gather(
+            *(self.api_service.get_buzz_data(topic["_id"], from_date, to_date) for topic in topic_map)
+        ))
+
+    def _prompt_cache_key(self, data: Dict[str, Any]) -> str:
+        # Chỉ giữ phần ngày của khoảng thời gian, số liệu theo ngày không đổi khi lệch vài phút.
+        # Thứ tự giai đoạn và thứ hạng buzz giữ nguyên; chỉ tập topic là không thứ tự
+        return prompt_cache_key(PROMPT_VERSION, {
+            "periods": [
+                {
+                    "from_date": from_date[:10],
+                    "to_date": to_date[:10],
+                    "sov": sov_data,
+                    "buzz": unordered(buzz_data),
+                }
+                for (from_date, to_date), sov_data, buzz_data in zip(
+                    data["periods"], data["sov_periods"], data["buzz_periods"]
+                )
+            ],
+            "topics": unordered({"_id": topic["_id"], "name": topic["name"]} for topic in data["topic_map"]),
+        })
+
     def _build_prompt(
         self,
-        data_period_1: Dict,
-        data_period_2: Dict,
+        sov_periods: List[Optional[Dict]],
+        buzz_periods: List[List[Dict]],
+        comparison: Dict,
         topic_map: List[Dict],
-        from_date1: str,
-        to_date1: str,
-        from_date2: str,
-        to_date2: str,
-    ) -> str:
-        buzz_data_1 = [
-            self.api_service.get_buzz_data(topic["_id"], from_date1, to_date1)
-            for topic in topic_map
-        ]
-        buzz_data_2 = [
-            self.api_service.get_buzz_data(topic["_id"], from_date2, to_date2)
-            for topic in topic_map
-        ]
-
-        return f"""
-        Dữ liệu Share of Voice (SOV) cho hai giai đoạn:
-
-        ### Giai đoạn 1 ({from_date1} - {to_date1})
-        **SOV**: 
-        {json.dumps(data_period_1, ensure_ascii=False, indent=2)}
-        **Buzz có tương tác cao**:
-        {json.dumps(buzz_data_1, ensure_ascii=False, indent=2)}
-
-        ### Giai đoạn 2 ({from_date2} - {to_date2})
-        **SOV**:
-        {json.dumps(data_period_2, ensure_ascii=False, indent=2)}
-        **Buzz có tương tác cao**:
-        {json.dumps(buzz_data_2, ensure_ascii=False, indent=2)}
-
-        ### Ánh xạ topic
-        {json.dumps([{"_id": topic["_id"], "name": topic["name"]} for topic in topic_map], ensure_ascii=False, indent=2)}
-
-        ### Yêu cầu
-        Bạn là AI phân tích dữ liệu chuyên nghiệp. Tạo báo cáo insight bằng tiếng Việt, văn phong rõ ràng, chuyên nghiệp, gồm:
-        1. **Tổng quan**: Tóm tắt ngắn gọn về SOV của hai giai đoạn.
-        2. **Phân tích chi tiết**: So sánh SOV của từng topic (dùng tên topic) giữa hai giai đoạn.
-        3. **Xu hướng và khuyến nghị**: Nhận định thay đổi SOV và đề xuất 1-2 hành động cụ thể.
-        4. **Buzz nổi bật**: Tóm tắt mỗi buzz có tương tác cao (dưới 50 từ) và trích dẫn URL làm dẫn chứng.
-
-        Đảm bảo báo cáo ngắn gọn, súc tích, tập trung vào insight hữu ích.
-        """, buzz_data_1, buzz_data_2
\ No newline at end of file
+        periods: List[Tuple[str, str]],
+    ) -> CompactPrompt:
+        topic_names = {f"topic{topic['_id']}": topic["name"] for topic in topic_map}
+        period_list = ", ".join(
+            f"GĐ{index} ({from_date} - {to_date})" for index, (from_date, to_date) in enumerate(periods, start=1)
+        )
+
+        def render(buzz_blocks: List[str]) -> str:
+            buzz_sections = "\n\n".join(
+                f"### Buzz có tương tác cao GĐ{index}\n{block}" for index, block in enumerate(buzz_blocks, start=1)
+            )
+            return f"""
+Dữ liệu Share of Voice (SOV) của {len(periods)} giai đoạn, mới nhất trước: {period_list}.
+Các chỉ số đã được tính sẵn (SOV%, hạng, Δ là mỗi giai đoạn so với giai đoạn liền sau, cột bất thường đánh dấu topic biến động khác hẳn các topic còn lại); chỉ diễn giải, không tính lại.
+Mỗi buzz gồm: topic | ngày | nguồn | tương tác | cảm xúc | URL | nội dung.
+
+### SOV theo topic
+{sov_table(comparison)}
+
+{buzz_sections}
+
+### Yêu cầu
+Bạn là AI phân tích dữ liệu chuyên nghiệp. Tạo báo cáo insight bằng tiếng Việt, văn phong rõ ràng, chuyên nghiệp, gồm:
+1. **Tổng quan**: Tóm tắt ngắn gọn về SOV của các giai đoạn.
+2. **Phân tích chi tiết**: So sánh SOV của từng topic (dùng tên topic) giữa các giai đoạn.
+3. **Xu hướng và khuyến nghị**: Nhận định thay đổi SOV và đề xuất 1-2 hành động cụ thể.
+4. **Buzz nổi bật**: Tóm tắt mỗi buzz có tương tác cao (dưới 50 từ) và trích dẫn URL làm dẫn chứng.
+
+Đảm bảo báo cáo ngắn gọn, súc tích, tập trung vào insight hữu ích.
+"""
+
+        return fit_prompt("sov", render, buzz_periods, topic_names)
@@ -0,0 +1,130 @@
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.comparison import outlier_flags
+
+# Khoảng bucket của date-histogram trên gateway
+INTERVALS = {"day": "1d", "week": "1w", "month": "1M"}
+
+
+def bucket_start(day: date, interval: str) -> date:
+    """First day of the histogram bucket containing `day` (weeks start on Monday)."""
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+
+def bucket_starts(first: date, last: date, interval: str) -> List[date]:
+    """Every bucket start from the bucket of `first` to the bucket of `last`, gaps included."""
+    starts = []
+    current = bucket_start(first, interval)
+    while current <= last:
+        starts.append(current)
+        if interval == "month":
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current += timedelta(days=7 if interval == "week" else 1)
+    return starts
+
+
+@dataclass
+class TrendSeries:
+    """Mention counts of N topics over M consecutive buckets, as one (N x M) int64 array."""
+    interval: str
+    starts: List[date]
+    topic_ids: List[str]
+    counts: np.ndarray
+
+    @classmethod
+    def from_histogram(
+        cls,
+        interval: str,
+        first: date,
+        last: date,
+        topic_ids: Sequence[str],
+        histogram: Dict[str, Dict[int, np.ndarray]],
+    ) -> "TrendSeries":
+        """Densify `parse_index_histogram` output; buckets missing from the response count as 0."""
+        starts = bucket_starts(first, last, interval)
+        column_of = {start.toordinal(): column for column, start in enumerate(starts)}
+        counts = np.zeros((len(topic_ids), len(starts)), dtype=np.int64)
+        for row, topic_id in enumerate(topic_ids):
+            for day, values in histogram.get(f"topic{topic_id}", {}).items():
+                column = column_of.get(bucket_start(date.fromordinal(day), interval).toordinal())
+                if column is not None:
+                    counts[row, column] += values[0]
+        return cls(interval, starts, list(topic_ids), counts)
+
+
+def moving_average(counts: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over `window` buckets; the first buckets average what is available."""
+    window = max(window, 1)
+    cumulative = np.cumsum(counts, axis=-1, dtype=np.float64)
+    shifted = np.zeros_like(cumulative)
+    shifted[..., window:] = cumulative[..., :-window]
+    sizes = np.minimum(np.arange(1, counts.shape[-1] + 1), window)
+    return (cumulative - shifted) / sizes
+
+
+def detect_spikes(counts: np.ndarray, window: int, threshold: float, min_count: int) -> np.ndarray:
+    """Flag buckets far above the trailing average of the buckets before them.
+
+    The residual against the previous `window` buckets is scored with the
+    modified z-score per topic; only upward jumps of at least `min_count`
+    mentions are kept.
+    """
+    baseline = np.zeros(counts.shape, dtype=np.float64)
+    baseline[:, 1:] = moving_average(counts, window)[:, :-1]
+    residual = counts - baseline
+    flags = np.zeros(counts.shape, dtype=bool)
+    for row in range(counts.shape[0]):
+        # Bucket đầu không có gì để so nên không xét
+        flags[row, 1:] = outlier_flags(residual[row, 1:], threshold)
+    return flags & (residual > 0) & (counts >= min_count)
+
+
+def resample(counts: np.ndarray, points: int) -> np.ndarray:
+    """Sum consecutive buckets so every row has at most `points` values."""
+    size = counts.shape[-1]
+    if size <= points:
+        return counts
+    edges = np.linspace(0, size, points + 1).astype(int)
+    return np.add.reduceat(counts, edges[:-1], axis=-1)
+
+
+def _round(values: np.ndarray) -> List[float]:
+    return [round(float(value), 2) for value in values]
+
+
+def analyze(series: TrendSeries, topic_names: Dict[str, str], window: Optional[int] = None) -> Dict:
+    """Raw series plus moving averages, peaks and spikes for every topic (`topic_names` keyed by topic id)."""
+    window = window or settings.TRENDLINE_MA_WINDOW
+    averages = moving_average(series.counts, window)
+    spikes = detect_spikes(series.counts, window, settings.TRENDLINE_SPIKE_Z, settings.TRENDLINE_SPIKE_MIN_COUNT)
+    labels = [start.isoformat() for start in series.starts]
+
+    topics = []
+    for row, topic_id in enumerate(series.topic_ids):
+        counts = series.counts[row]
+        peak = int(np.argmax(counts)) if counts.size else None
+        topics.append({
+            "topic_id": topic_id,
+            "topic": topic_names.get(topic_id, topic_id),
+            "total": int(counts.sum()),
+            "mean": round(float(counts.mean()), 2) if counts.size else 0.0,
+            "counts": counts.tolist(),
+            "moving_average": _round(averages[row]),
+            "peak": None if peak is None or counts[peak] == 0 else {"date": labels[peak], "count": int(counts[peak])},
+            "spikes": [
+                # `expected` là trung bình trượt của các bucket liền trước
+                {"date": labels[column], "count": int(counts[column]), "expected": round(float(averages[row, column - 1]), 2)}
+                for column in np.flatnonzero(spikes[row])
+            ],
+        })
+    return {"interval": series.interval, "moving_average_window": window, "buckets": labels, "topics": topics}
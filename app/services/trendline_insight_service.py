@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.llm_cache import prompt_cache_key
+from app.core.llm_client import llm_client
+from app.services.bucket_store import DATE_FORMAT, doc_count_metrics, parse_index_histogram
+from app.services.prompt_compaction import CompactPrompt, fit_prompt, spike_lines, trendline_table
+from app.services.sov_api_service import APISovService
+from app.services.trendline import INTERVALS, TrendSeries, analyze
+
+# Tăng khi nội dung template `_build_prompt` thay đổi
+PROMPT_VERSION = "trendline-v2"
+
+
+class TrendlineInsightService:
+    """Mentions trendline of the requested topics over the span of all periods.
+
+    One TERMS(INDEX) > DATE_HISTOGRAM query returns every topic's series;
+    moving averages, peaks and spikes are computed locally and only a
+    resampled summary is sent to the LLM.
+    """
+
+    def __init__(self, x_token: str, x_refresh_token: str):
+        self.api_service = APISovService(x_token, x_refresh_token)
+
+    async def stream_insight(
+        self,
+        topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+        interval: Optional[str] = None,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield `(event, data)` pairs: `delta` chunks of the report, then `result`."""
+        try:
+            data = await self.fetch_data(topic_ids, periods, interval)
+            prompt = self._build_prompt(**data)
+            chunks = []
+            async for delta in llm_client.stream(prompt.text, cache_key=self._prompt_cache_key(data), temperature=0.7):
+                chunks.append(delta)
+                yield "delta", delta
+            yield "result", self._result("".join(chunks).strip(), prompt, data)
+        except Exception as e:
+            yield "error", f"[LỖI] Không thể tạo insight: {str(e)}"
+
+    async def fetch_data(
+        self,
+        topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+        interval: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Fetch and analyze the series, keyed like `_build_prompt` arguments."""
+        interval = interval or settings.TRENDLINE_INTERVAL
+        from_date = min(from_date for from_date, _ in periods)
+        to_date = max(to_date for _, to_date in periods)
+        topic_data, histogram = await asyncio.gather(
+            asyncio.gather(*(self.api_service.get_topic_by_topic_id(topic_id) for topic_id in topic_ids)),
+            self.api_service.get_mentions_histogram(topic_ids, from_date, to_date, INTERVALS[interval]),
+        )
+        if histogram is None:
+            raise ValueError("No trendline data for the requested periods")
+
+        series = TrendSeries.from_histogram(
+            interval,
+            datetime.strptime(from_date, DATE_FORMAT).date(),
+            datetime.strptime(to_date, DATE_FORMAT).date(),
+            topic_ids,
+            parse_index_histogram(histogram, doc_count_metrics),
+        )
+        names = {topic["_id"]: topic["name"] for topic in topic_data if topic}
+        return {"trendline": analyze(series, names), "periods": periods}
+
+    async def get_series(
+        self,
+        topic_ids: List[str],
+        periods: List[Tuple[str, str]],
+        interval: Optional[str] = None,
+    ) -> Dict:
+        """The analyzed series alone, without generating a report."""
+        return (await self.fetch_data(topic_ids, periods, interval))["trendline"]
+
+    async def report_from_data(self, data: Dict[str, Any]) -> Dict:
+        """Generate the report from data returned by `fetch_data`."""
+        prompt = self._build_prompt(**data)
+        report = await llm_client.complete(prompt.text, cache_key=self._prompt_cache_key(data), temperature=0.7)
+        return self._result(report, prompt, data)
+
+    def _result(self, report: str, prompt: CompactPrompt, data: Dict[str, Any]) -> Dict:
+        return {"report": report, "trendline": data["trendline"], "prompt_tokens": prompt.tokens}
+
+    def _prompt_cache_key(self, data: Dict[str, Any]) -> str:
+        trendline = data["trendline"]
+        return prompt_cache_key(PROMPT_VERSION, {
+            "interval": trendline["interval"],
+            "window": trendline["moving_average_window"],
+            "buckets": f"{trendline['buckets'][0]}:{len(trendline['buckets'])}" if trendline["buckets"] else "",
+            "topics": {
+                topic["topic_id"]: {"name": topic["topic"], "counts": topic["counts"]}
+                for topic in trendline["topics"]
+            },
+            "periods": [f"{from_date[:10]}:{to_date[:10]}" for from_date, to_date in data["periods"]],
+        })
+
+    def _build_prompt(self, trendline: Dict, periods: List[Tuple[str, str]]) -> CompactPrompt:
+        buckets = trendline["buckets"]
+        span = f"{buckets[0]} - {buckets[-1]}" if buckets else "không có dữ liệu"
+        period_list = ", ".join(
+            f"GĐ{index} ({from_date} - {to_date})" for index, (from_date, to_date) in enumerate(periods, start=1)
+        )
+        unit = {"day": "ngày", "week": "tuần", "month": "tháng"}[trendline["interval"]]
+
+        def render(_: List[str]) -> str:
+            return f"""
+Dữ liệu xu hướng lượng đề cập (mentions trendline) theo {unit}, từ {span}, bao phủ các giai đoạn: {period_list}.
+Các chỉ số đã được tính sẵn (tổng, trung bình, đỉnh, trung bình trượt {trendline['moving_average_window']} {unit}); chuỗi đã được gộp bớt điểm, chỉ diễn giải, không tính lại.
+
+### Xu hướng theo topic
+{trendline_table(trendline, settings.TRENDLINE_PROMPT_POINTS)}
+
+### Đột biến (so với trung bình trượt trước đó)
+{spike_lines(trendline, settings.TRENDLINE_PROMPT_SPIKES) or "(không có)"}
+
+### Yêu cầu
+Bạn là AI phân tích dữ liệu chuyên nghiệp. Tạo báo cáo insight bằng tiếng Việt, văn phong rõ ràng, chuyên nghiệp, gồm:
+1. **Tổng quan**: Xu hướng chung của lượng đề cập trong khoảng thời gian.
+2. **Phân tích chi tiết**: So sánh xu hướng, đỉnh và mức trung bình của từng topic (dùng tên topic).
+3. **Đột biến**: Nhận định các thời điểm tăng đột biến và mức độ so với bình thường.
+4. **Khuyến nghị**: Đề xuất 1-2 hành động cụ thể.
+
+Đảm bảo báo cáo ngắn gọn, súc tích, tập trung vào insight hữu ích.
+"""
+
+        return fit_prompt("trendline", render, [], {})
@@ -0,0 +1,39 @@
+import math
+import random
+from dataclasses import dataclass
+
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+
+@dataclass(frozen=True)
+class LatencyModel:
+    """Delay distribution parsed from `"<distribution>:<mean ms>:<jitter ms>"`.
+
+    `uniform` draws from mean ± jitter, `normal` and `lognormal` use jitter
+    as the standard deviation; samples are never negative.
+    """
+    distribution: str
+    mean_ms: float
+    jitter_ms: float
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        distribution, _, rest = spec.partition(":")
+        mean, _, jitter = rest.partition(":")
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{distribution}', expected one of {DISTRIBUTIONS}")
+        return cls(distribution, float(mean or 0), float(jitter or 0))
+
+    def sample(self, rng: random.Random) -> float:
+        """One delay in seconds."""
+        if self.distribution == "fixed" or self.jitter_ms <= 0:
+            delay = self.mean_ms
+        elif self.distribution == "uniform":
+            delay = rng.uniform(self.mean_ms - self.jitter_ms, self.mean_ms + self.jitter_ms)
+        elif self.distribution == "normal":
+            delay = rng.gauss(self.mean_ms, self.jitter_ms)
+        else:
+            # Quy đổi mean/độ lệch chuẩn mong muốn sang tham số mu/sigma của lognormal
+            sigma2 = math.log(1 + (self.jitter_ms / max(self.mean_ms, 1e-9)) ** 2)
+            delay = rng.lognormvariate(math.log(max(self.mean_ms, 1e-9)) - sigma2 / 2, math.sqrt(sigma2))
+        return max(delay, 0.0) / 1000
@@ -0,0 +1,177 @@
+"""Local stand-in for the Kompa gateways and the OpenRouter chat API.
+
+Run it and point the app at it through configuration:
+
+    python -m app.standin.server --port 8901
+    GATEWAY_URL=http://localhost:8901/graphql \\
+    CMS_GATEWAY_URL=http://localhost:8901/kompaql \\
+    LLM_BASE_URL=http://localhost:8901/v1 uvicorn app.main:app
+
+GraphQL `aggregations`, `buzzes` and `me` operations (single or batched
+with aliases) are answered from deterministic synthetic data; requests
+found in `STANDIN_RECORDINGS_DIR` (captured with `RECORD_MODE=record`) are
+answered with the recorded response instead. Every response is delayed
+according to the `STANDIN_*_LATENCY` distributions. `GET /standin/stats`
+returns upstream call and LLM token counters (`DELETE` resets them).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from app.core.config import settings
+from app.core.recorder import load_recording, recording_key
+from app.standin.latency import LatencyModel
+from app.standin.synthetic import SyntheticData
+
+OPERATION_HEADER = re.compile(r"^\s*query\s+\w+\s*(\([^)]*\))?", re.S)
+FIELD = re.compile(r"(?:(\w+)\s*:\s*)?\b(aggregations|buzzes|me)\b\s*(?:\(([^)]*)\))?\s*\{")
+ARGUMENT = re.compile(r"(\w+)\s*:\s*\$(\w+)")
+
+WORDS = (
+    "thương hiệu", "lượng đề cập", "tăng", "giảm", "so với", "giai đoạn", "người dùng", "thảo luận",
+    "tích cực", "tiêu cực", "kênh", "Facebook", "TikTok", "xu hướng", "chiến dịch", "đáng chú ý",
+)
+
+app = FastAPI(title="Gateway/LLM stand-in", docs_url=None, redoc_url=None)
+data = SyntheticData(settings.STANDIN_SEED, settings.STANDIN_TOPICS, settings.STANDIN_DAILY_MENTIONS)
+rng = random.Random(settings.STANDIN_SEED)
+latency = {
+    "gateway": LatencyModel.parse(settings.STANDIN_GATEWAY_LATENCY),
+    "cms": LatencyModel.parse(settings.STANDIN_CMS_LATENCY),
+    "llm": LatencyModel.parse(settings.STANDIN_LLM_LATENCY),
+    "llm_token": LatencyModel.parse(settings.STANDIN_LLM_TOKEN_DELAY),
+}
+# Số request theo upstream / operation và số token LLM, phục vụ benchmark
+stats: Counter = Counter()
+
+
+def parse_operations(query: str, variables: Dict) -> List[Dict]:
+    """Root fields of a query as `{"key", "field", "args"}`, `args` resolved from `variables`."""
+    body = OPERATION_HEADER.sub("", query, count=1)
+    operations = []
+    for alias, field, arguments in FIELD.findall(body):
+        args = {name: variables.get(variable) for name, variable in ARGUMENT.findall(arguments or "")}
+        operations.append({"key": alias or field, "field": field, "args": args})
+    return operations
+
+
+def resolve(operation: Dict) -> Dict:
+    args = operation["args"]
+    if operation["field"] == "me":
+        return data.me()
+    indexes = (args.get("input") or {}).get("indexes") or []
+    if operation["field"] == "buzzes":
+        return data.buzzes(indexes[0], args.get("filter") or {})
+    return {"status": "success", "message": "", "data": data.aggregate(indexes, args.get("filter") or {}, args.get("aggs") or [])}
+
+
+def _recorded(request: Request, body: bytes) -> Optional[Response]:
+    if not settings.STANDIN_RECORDINGS_DIR:
+        return None
+    recording = load_recording(settings.STANDIN_RECORDINGS_DIR, recording_key(request.method, str(request.url), body))
+    if recording is None:
+        return None
+    response = recording["response"]
+    return Response(response["body"], status_code=response["status_code"], headers=response["headers"])
+
+
+def _completion_words(prompt: str) -> List[str]:
+    words_rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+    return [words_rng.choice(WORDS) for _ in range(settings.STANDIN_LLM_TOKENS)]
+
+
+async def _chat_completion(payload: Dict) -> Response:
+    prompt = "".join(message.get("content") or "" for message in payload.get("messages", []))
+    words = _completion_words(prompt)
+    stats["llm_prompt_tokens"] += len(prompt) // 4
+    stats["llm_completion_tokens"] += len(words)
+    created = int(time.time())
+    base = {"id": f"standin-{created}", "created": created, "model": payload.get("model", "standin")}
+    await asyncio.sleep(latency["llm"].sample(rng))
+
+    usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(words), "total_tokens": len(prompt) // 4 + len(words)}
+    if not payload.get("stream"):
+        return JSONResponse({
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    async def chunks():
+        for index, word in enumerate(words):
+            if index:
+                await asyncio.sleep(latency["llm_token"].sample(rng))
+            delta = {"index": 0, "delta": {"content": word if not index else " " + word}, "finish_reason": None}
+            yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [delta]})}\n\n"
+        done = {"index": 0, "delta": {}, "finish_reason": "stop"}
+        yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [done]})}\n\n"
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+@app.get("/standin/topics")
+async def list_topics():
+    return data.topics
+
+
+@app.get("/standin/stats")
+async def get_stats():
+    return dict(stats)
+
+
+@app.delete("/standin/stats")
+async def reset_stats():
+    stats.clear()
+    return {}
+
+
+@app.post("/{path:path}")
+async def handle(path: str, request: Request):
+    body = await request.body()
+    payload = json.loads(body or b"{}")
+    if path.endswith("chat/completions"):
+        stats["llm"] += 1
+        recorded = _recorded(request, body)
+        if recorded is not None:
+            await asyncio.sleep(latency["llm"].sample(rng))
+            return recorded
+        return await _chat_completion(payload)
+
+    operations = parse_operations(payload.get("query", ""), payload.get("variables") or {})
+    upstream = "cms" if any(operation["field"] == "me" for operation in operations) else "gateway"
+    stats[upstream] += 1
+    stats.update(f"op:{operation['field']}" for operation in operations)
+    await asyncio.sleep(latency[upstream].sample(rng))
+    recorded = _recorded(request, body)
+    if recorded is not None:
+        return recorded
+    if not operations:
+        return JSONResponse({"errors": [{"message": "Unsupported operation"}]}, status_code=400)
+    return JSONResponse({"data": {operation["key"]: resolve(operation) for operation in operations}})
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
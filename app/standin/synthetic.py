@@ -0,0 +1,185 @@
+import hashlib
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.bucket_store import DATE_BUCKETS, DATE_FORMAT, INDEX_BUCKETS, SENTIMENT_BUCKETS
+from app.services.channels import SOURCE_TYPES, TYPE_BUCKETS
+from app.services.trendline import bucket_start
+
+# Khoá bucket cảm xúc của gateway: 1 tiêu cực, 2 trung lập, 3 tích cực
+SENTIMENT_KEYS = (1, 2, 3)
+HISTOGRAM_INTERVALS = {"1d": "day", "1w": "week", "1M": "month"}
+
+
+def _seed(*parts) -> int:
+    return int.from_bytes(hashlib.sha256(":".join(map(str, parts)).encode()).digest()[:8], "big")
+
+
+class SyntheticData:
+    """Deterministic mention data for the stand-in gateway.
+
+    Every (topic, day) gets a total, a sentiment split and a source type
+    split drawn from generators seeded by `seed`, topic and day, so the same
+    query always returns the same numbers. Topics differ in volume, weekdays
+    in activity, and roughly one day in thirty has a spike.
+    """
+
+    def __init__(self, seed: int, topic_count: int, daily_mentions: int):
+        self.seed = seed
+        self.daily_mentions = daily_mentions
+        self.topics = [
+            {"_id": hashlib.sha1(f"{seed}:topic:{i}".encode()).hexdigest()[:24], "name": f"Brand {chr(ord('A') + i % 26)}{i // 26 or ''}"}
+            for i in range(topic_count)
+        ]
+        self._days: Dict[Tuple[str, int], Tuple[int, np.ndarray, np.ndarray]] = {}
+
+    def topic_profile(self, topic_id: str) -> Tuple[float, np.ndarray, np.ndarray]:
+        rng = np.random.default_rng(_seed(self.seed, topic_id))
+        return rng.uniform(0.2, 1.5), rng.dirichlet([2, 5, 3]), rng.dirichlet(np.full(len(SOURCE_TYPES), 0.6))
+
+    def day(self, topic_id: str, ordinal: int) -> Tuple[int, np.ndarray, np.ndarray]:
+        """`(total, sentiment counts, source type counts)` of one topic and day."""
+        key = (topic_id, ordinal)
+        cached = self._days.get(key)
+        if cached is not None:
+            return cached
+        volume, sentiment_mix, type_mix = self.topic_profile(topic_id)
+        rng = np.random.default_rng(_seed(self.seed, topic_id, ordinal))
+        weekday = date.fromordinal(ordinal).weekday()
+        mean = self.daily_mentions * volume * (0.7 if weekday >= 5 else 1.0)
+        if rng.random() < 1 / 30:
+            mean *= rng.uniform(3, 8)
+        total = int(rng.poisson(mean))
+        day = (total, rng.multinomial(total, sentiment_mix), rng.multinomial(total, type_mix))
+        if len(self._days) > 200_000:
+            self._days.clear()
+        self._days[key] = day
+        return day
+
+    def window_days(self, from_date: str, to_date: str) -> List[Tuple[int, float]]:
+        """`(day ordinal, covered fraction)` of every day touched by the window."""
+        from_dt = datetime.strptime(from_date, DATE_FORMAT)
+        to_dt = datetime.strptime(to_date, DATE_FORMAT) + timedelta(minutes=1)
+        days = []
+        current = from_dt.date()
+        while datetime.combine(current, time.min) < to_dt:
+            start = max(from_dt, datetime.combine(current, time.min))
+            end = min(to_dt, datetime.combine(current + timedelta(days=1), time.min))
+            days.append((current.toordinal(), (end - start).total_seconds() / 86400))
+            current += timedelta(days=1)
+        return days
+
+    def counts(self, topic_id: str, days: List[Tuple[int, float]]) -> Tuple[int, np.ndarray, np.ndarray]:
+        total, sentiment, types = 0, np.zeros(len(SENTIMENT_KEYS), dtype=np.int64), np.zeros(len(SOURCE_TYPES), dtype=np.int64)
+        for ordinal, fraction in days:
+            day_total, day_sentiment, day_types = self.day(topic_id, ordinal)
+            total += int(round(day_total * fraction))
+            sentiment += np.rint(day_sentiment * fraction).astype(np.int64)
+            types += np.rint(day_types * fraction).astype(np.int64)
+        return total, sentiment, types
+
+    def aggregate(self, topic_ids: List[str], filter: Dict, aggs: List[Dict]) -> Dict:
+        """Evaluate the aggregation tree the services send (INDEX, DATE_HISTOGRAM, SENTIMENT, TYPE)."""
+        days = self.window_days(filter["publishedFromDate"], filter["publishedToDate"])
+        result = {}
+        for agg in aggs:
+            result.update(self._evaluate(agg, topic_ids, None, days))
+        return result
+
+    def _evaluate(self, agg: Dict, topic_ids: List[str], topic_id: Optional[str], days: List[Tuple[int, float]]) -> Dict:
+        field, nest = agg.get("field"), agg.get("nest") or []
+
+        def nested(bucket: Dict, bucket_topic: Optional[str], bucket_days: List[Tuple[int, float]]) -> Dict:
+            for child in nest:
+                bucket.update(self._evaluate(child, topic_ids, bucket_topic, bucket_days))
+            return bucket
+
+        if field == "INDEX":
+            buckets = [
+                nested({"key": f"topic{topic}", "doc_count": self.counts(topic, days)[0]}, topic, days)
+                for topic in topic_ids
+            ]
+            buckets.sort(key=lambda bucket: bucket["doc_count"], reverse=True)
+            return {INDEX_BUCKETS: {"buckets": buckets}}
+
+        scope = [topic_id] if topic_id else topic_ids
+        if agg.get("type") == "DATE_HISTOGRAM":
+            interval = HISTOGRAM_INTERVALS.get(agg["option"]["dateHistogram"]["interval"], "day")
+            timezone = ZoneInfo(agg["option"]["dateHistogram"].get("timeZone") or settings.AGGREGATION_TIMEZONE)
+            groups: Dict[date, List[Tuple[int, float]]] = {}
+            for ordinal, fraction in days:
+                groups.setdefault(bucket_start(date.fromordinal(ordinal), interval), []).append((ordinal, fraction))
+            buckets = []
+            for start, group in sorted(groups.items()):
+                moment = datetime.combine(start, time.min, timezone)
+                bucket = {
+                    "key": int(moment.timestamp() * 1000),
+                    "key_as_string": moment.isoformat(timespec="milliseconds"),
+                    "doc_count": sum(self.counts(topic, group)[0] for topic in scope),
+                }
+                buckets.append(nested(bucket, topic_id, group))
+            return {DATE_BUCKETS: {"buckets": buckets}}
+
+        if field == "SENTIMENT":
+            sentiment = sum((self.counts(topic, days)[1] for topic in scope), np.zeros(len(SENTIMENT_KEYS), dtype=np.int64))
+            buckets = [{"key": key, "doc_count": int(count)} for key, count in zip(SENTIMENT_KEYS, sentiment) if count]
+            return {SENTIMENT_BUCKETS: {"buckets": buckets}}
+
+        if field == "TYPE":
+            types = sum((self.counts(topic, days)[2] for topic in scope), np.zeros(len(SOURCE_TYPES), dtype=np.int64))
+            buckets = [{"key": key, "doc_count": int(count)} for key, count in zip(SOURCE_TYPES, types) if count]
+            buckets.sort(key=lambda bucket: bucket["doc_count"], reverse=True)
+            return {TYPE_BUCKETS: {"buckets": buckets}}
+        return {}
+
+    def buzzes(self, topic_id: str, filter: Dict) -> Dict:
+        """One page of buzzes of `topic_id`, honouring skip/limit and an INTERACTIONS sort."""
+        days = self.window_days(filter["publishedFromDate"], filter["publishedToDate"])
+        total = min(self.counts(topic_id, days)[0], 10_000)
+        skip, limit = filter.get("skip") or 0, filter.get("limit") or 10
+        rng = np.random.default_rng(_seed(self.seed, topic_id, "buzz", filter["publishedFromDate"], filter["publishedToDate"]))
+        interactions = rng.zipf(1.8, size=total) * 10 if total else np.zeros(0, dtype=np.int64)
+        order = np.argsort(-interactions, kind="stable") if filter.get("sort") else np.arange(total)
+        first_day = days[0][0] if days else date.today().toordinal()
+        data = []
+        for position in order[skip:skip + limit]:
+            source_type = SOURCE_TYPES[int(position) % len(SOURCE_TYPES)]
+            published = date.fromordinal(first_day + int(position) % max(len(days), 1))
+            data.append({
+                "_id": f"{topic_id}-{position}",
+                "_index": f"topic{topic_id}",
+                "_source": {
+                    "type": source_type,
+                    "publishedDate": f"{published.isoformat()}T08:00:00",
+                    "siteName": source_type.split("_")[0].lower(),
+                    "url": f"https://example.com/{topic_id}/{position}",
+                    "title": f"Bài viết {position} về {topic_id}",
+                    "content": "Nội dung mẫu của buzz dùng cho benchmark. " * 5,
+                    "interactions": int(interactions[position]),
+                    "sentiment": {"value": SENTIMENT_KEYS[int(position) % len(SENTIMENT_KEYS)]},
+                },
+            })
+        return {"total": total, "data": data}
+
+    def me(self) -> Dict:
+        return {
+            "status": "success",
+            "message": "",
+            "data": {
+                "_id": "standin-user",
+                "username": "standin",
+                "projects": [{
+                    "_id": "standin-project",
+                    "name": "standin",
+                    "displayName": "Stand-in project",
+                    "defaultTopicId": self.topics[0]["_id"] if self.topics else None,
+                    "topics": self.topics,
+                    "groupTreeLabels": [[{"_id": "standin-label", "name": "All", "path": "/"}]],
+                }],
+                "status": "active",
+            },
+        }
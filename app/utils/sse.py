@@ -0,0 +1,39 @@
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Tuple
+
+from fastapi.responses import StreamingResponse
+
+from app.utils import response_template
+
+
+def format_sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def event_stream_response(
+    events: AsyncIterator[Tuple[str, Any]],
+    on_result: Optional[Callable[[Any], Awaitable[None]]] = None,
+) -> StreamingResponse:
+    """Forward `(event, data)` pairs as Server-Sent Events.
+
+    The final `result` event is wrapped like a regular success response and
+    handed to `on_result`, so routers can cache streamed reports as well.
+    """
+    async def body():
+        async for event, data in events:
+            if event == "result":
+                if on_result is not None:
+                    await on_result(data)
+                data = response_template.success_response(data=data)
+            yield format_sse(event, data)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def replay_result(data: Any) -> AsyncIterator[Tuple[str, Any]]:
+    """Event source for a report that is already available (e.g. from cache)."""
+    yield "result", data
@@ -0,0 +1,57 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata(kind: str, config: Dict) -> Dict:
+    """Header of every result file, so runs can be matched to commits and machines."""
+    return {
+        "kind": kind,
+        "commit": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": config,
+    }
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, Optional[float]]:
+    if not len(values):
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    array = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(array, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "mean": round(float(array.mean()), 3),
+        "max": round(float(array.max()), 3),
+    }
+
+
+def write_results(path: Optional[str], results: Dict) -> None:
+    """Write `results` as JSON to `path` ("-" for stdout)."""
+    if not path:
+        return
+    payload = json.dumps(results, ensure_ascii=False, indent=2)
+    if path == "-":
+        print(payload)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(payload + "\n")
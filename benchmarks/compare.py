@@ -0,0 +1,58 @@
+"""Compare two result files written by `benchmarks.micro` or `benchmarks.load`.
+
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+from typing import Dict, Iterator, Tuple
+
+
+def _metrics(results: Dict) -> Iterator[Tuple[str, float]]:
+    """Flatten the numeric metrics of a result file into `("section.name.metric", value)`."""
+    if results.get("kind") == "micro":
+        for name, stats in results["benchmarks"].items():
+            yield f"{name}.min_us", stats["min_us"]
+            yield f"{name}.p50_us", stats["p50_us"]
+        return
+
+    summary = results["summary"]
+    yield "rps", summary["rps"]
+    yield "errors", summary["errors"]
+    for section in ("latency_ms", "stream_ttfb_ms", "prompt_tokens"):
+        for metric, value in (summary.get(section) or {}).items():
+            yield f"{section}.{metric}", value
+    for key, value in (summary.get("upstream") or {}).get("per_request", {}).items():
+        yield f"upstream.{key}", value
+    for path, block in results.get("by_path", {}).items():
+        for metric in ("p50", "p95"):
+            yield f"{path}.latency_ms.{metric}", block["latency_ms"][metric]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    if before.get("kind") != after.get("kind"):
+        parser.error(f"cannot compare {before.get('kind')} results with {after.get('kind')} results")
+
+    old = dict(_metrics(before))
+    print(f"{'metric':48s} {before.get('commit') or 'before':>12s} {after.get('commit') or 'after':>12s} {'change':>9s}")
+    for name, value in _metrics(after):
+        previous = old.get(name)
+        if previous is None or value is None:
+            change = ""
+        elif previous:
+            change = f"{(value - previous) / previous * 100:+.1f}%"
+        else:
+            change = "" if value == previous else "new"
+        print(f"{name:48s} {previous if previous is not None else '-':>12} {value if value is not None else '-':>12} {change:>9s}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Async load generator replaying a request corpus against the insight API.
+
+    python -m benchmarks.load --requests 200 --concurrency 16 --output load.json
+
+By default the app and the gateway/LLM stand-in both run in this process
+(the app through an ASGI transport, the stand-in on `--standin-port`), so
+nothing leaves the machine. With `--url` the requests go to a running app
+instead; pass `--standin-url` when that app points at a stand-in to get
+upstream call and token counts.
+
+Corpus lines are JSON objects `{"path", "body", "stream"}`; topic ids
+written as "@<n>" are replaced by the n-th stand-in topic.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.common import percentiles, run_metadata, write_results
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "corpus.jsonl")
+HEADERS = {"x-token": "Bearer standin", "x-refresh-token": "Bearer standin"}
+
+
+def load_corpus(path: str, topic_ids: List[str]) -> List[Dict]:
+    def resolve(value):
+        if isinstance(value, str) and value.startswith("@") and value[1:].isdigit() and topic_ids:
+            return topic_ids[int(value[1:]) % len(topic_ids)]
+        if isinstance(value, list):
+            return [resolve(item) for item in value]
+        if isinstance(value, dict):
+            return {key: resolve(item) for key, item in value.items()}
+        return value
+
+    with open(path, encoding="utf-8") as f:
+        return [resolve(json.loads(line)) for line in f if line.strip()]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Sample:
+    __slots__ = ("path", "status", "ok", "latency_ms", "ttfb_ms", "prompt_tokens")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.status = 0
+        self.ok = False
+        self.latency_ms = 0.0
+        self.ttfb_ms: Optional[float] = None
+        self.prompt_tokens: List[int] = []
+
+
+def _prompt_tokens(data) -> List[int]:
+    """`prompt_tokens` of a report result or of every report of a dashboard result."""
+    if not isinstance(data, dict):
+        return []
+    if "prompt_tokens" in data:
+        return [data["prompt_tokens"]]
+    return [report["prompt_tokens"] for report in (data.get("reports") or {}).values() if "prompt_tokens" in report]
+
+
+async def send(client: httpx.AsyncClient, item: Dict) -> Sample:
+    sample = Sample(item["path"])
+    started = time.perf_counter()
+    try:
+        if item.get("stream"):
+            async with client.stream("POST", item["path"], params={"stream": "true"}, json=item["body"], headers=HEADERS) as response:
+                sample.status = response.status_code
+                event, result = None, None
+                async for line in response.aiter_lines():
+                    if sample.ttfb_ms is None and line.startswith("data:"):
+                        sample.ttfb_ms = (time.perf_counter() - started) * 1000
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:") and event == "result":
+                        result = json.loads(line[len("data:"):])
+                sample.ok = response.status_code == 200 and result is not None
+                sample.prompt_tokens = _prompt_tokens(result)
+        else:
+            response = await client.post(item["path"], json=item["body"], headers=HEADERS)
+            sample.status = response.status_code
+            body = response.json()
+            sample.ok = response.status_code == 200 and body.get("status") == "Successfully"
+            sample.prompt_tokens = _prompt_tokens(body.get("data"))
+    except (httpx.HTTPError, ValueError):
+        sample.ok = False
+    sample.latency_ms = (time.perf_counter() - started) * 1000
+    return sample
+
+
+async def run_load(client: httpx.AsyncClient, corpus: List[Dict], requests: int, concurrency: int) -> List[Sample]:
+    items = itertools.islice(itertools.cycle(corpus), requests)
+    samples: List[Sample] = []
+
+    async def worker():
+        for item in items:
+            samples.append(await send(client, item))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+def summarize(samples: List[Sample], elapsed: float, upstream: Optional[Dict]) -> Dict:
+    def block(group: List[Sample]) -> Dict:
+        stream_ttfb = [sample.ttfb_ms for sample in group if sample.ttfb_ms is not None]
+        tokens = [token for sample in group for token in sample.prompt_tokens]
+        return {
+            "requests": len(group),
+            "errors": sum(not sample.ok for sample in group),
+            "latency_ms": percentiles([sample.latency_ms for sample in group]),
+            "stream_ttfb_ms": percentiles(stream_ttfb) if stream_ttfb else None,
+            "prompt_tokens": percentiles(tokens) if tokens else None,
+        }
+
+    by_path = defaultdict(list)
+    for sample in samples:
+        by_path[sample.path].append(sample)
+    summary = block(samples)
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["rps"] = round(len(samples) / elapsed, 3) if elapsed else None
+    if upstream is not None:
+        # Số lời gọi upstream trung bình cho mỗi request (không tách được theo từng request khi chạy song song)
+        summary["upstream"] = {
+            "totals": upstream,
+            "per_request": {key: round(value / max(len(samples), 1), 3) for key, value in upstream.items()},
+        }
+    return {"summary": summary, "by_path": {path: block(group) for path, group in sorted(by_path.items())}}
+
+
+async def _standin_stats(standin: Optional[httpx.AsyncClient], reset: bool = False) -> Optional[Dict]:
+    if standin is None:
+        return None
+    if reset:
+        await standin.delete("/standin/stats")
+        return None
+    return (await standin.get("/standin/stats")).json()
+
+
+async def benchmark(args) -> Dict:
+    standin_server = None
+    standin_url = args.standin_url
+    if args.url is None:
+        # Các URL upstream phải được đặt trước khi import app (settings đọc env lúc import)
+        port = args.standin_port or _free_port()
+        standin_url = f"http://127.0.0.1:{port}"
+        os.environ.update({
+            "GATEWAY_URL": f"{standin_url}/graphql",
+            "CMS_GATEWAY_URL": f"{standin_url}/kompaql",
+            "LLM_BASE_URL": f"{standin_url}/v1",
+            "OPENROUTER_API_KEY": os.environ.get("OPENROUTER_API_KEY") or "standin",
+        })
+        import uvicorn
+        from app.standin.server import app as standin_app
+
+        standin_server = uvicorn.Server(uvicorn.Config(standin_app, host="127.0.0.1", port=port, log_level="warning"))
+        standin_task = asyncio.create_task(standin_server.serve())
+        while not standin_server.started:
+            await asyncio.sleep(0.05)
+
+    standin = httpx.AsyncClient(base_url=standin_url, timeout=30) if standin_url else None
+    topic_ids = [topic["_id"] for topic in (await standin.get("/standin/topics")).json()] if standin else []
+    corpus = load_corpus(args.corpus, topic_ids)
+
+    try:
+        if args.url is None:
+            from app.main import app
+
+            lifespan = app.router.lifespan_context(app)
+            await lifespan.__aenter__()
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app", timeout=args.timeout)
+        else:
+            lifespan = None
+            client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+
+        async with client:
+            if args.warmup:
+                await run_load(client, corpus, args.warmup, args.concurrency)
+            await _standin_stats(standin, reset=True)
+            started = time.perf_counter()
+            samples = await run_load(client, corpus, args.requests, args.concurrency)
+            elapsed = time.perf_counter() - started
+            upstream = await _standin_stats(standin)
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+    finally:
+        if standin is not None:
+            await standin.aclose()
+        if standin_server is not None:
+            standin_server.should_exit = True
+            await standin_task
+
+    results = run_metadata("load", {
+        "corpus": os.path.basename(args.corpus),
+        "corpus_size": len(corpus),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "warmup": args.warmup,
+        "target": args.url or "in-process",
+        **{key: value for key, value in os.environ.items() if key.startswith("STANDIN_")},
+    })
+    results.update(summarize(samples, elapsed, upstream))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test of the insight endpoints")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSONL request corpus")
+    parser.add_argument("--requests", type=int, default=100, help="measured requests (the corpus is cycled)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=0, help="requests sent before measuring (fills caches)")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--url", help="base URL of a running app; default runs the app in-process")
+    parser.add_argument("--standin-url", help="stand-in base URL used by the app at --url")
+    parser.add_argument("--standin-port", type=int, help="port of the in-process stand-in (default: any free port)")
+    parser.add_argument("--output", help="write JSON results to this file ('-' for stdout)")
+    args = parser.parse_args()
+
+    results = asyncio.run(benchmark(args))
+    summary = results["summary"]
+    latency = summary["latency_ms"]
+    print(
+        f"{summary['requests']} requests, {summary['errors']} errors, {summary['rps']} req/s, "
+        f"p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms",
+        file=sys.stderr,
+    )
+    if "upstream" in summary:
+        print(f"upstream per request: {summary['upstream']['per_request']}", file=sys.stderr)
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
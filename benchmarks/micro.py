@@ -0,0 +1,154 @@
+"""Micro-benchmarks of the CPU-bound steps of the insight pipeline.
+
+    python -m benchmarks.micro --output micro.json
+
+Inputs are built from the stand-in's synthetic data, so numbers are
+comparable between commits on the same machine.
+"""
+import argparse
+import json
+import sys
+import timeit
+from datetime import date
+from typing import Callable, Dict, List
+
+from benchmarks.common import percentiles, run_metadata, write_results
+
+from app.core.cache import shared_cache_key
+from app.core.metrics import stage_duration
+from app.core.recorder import recording_key
+from app.models.request_models import InsightRequest
+from app.services.bucket_store import doc_count_metrics, parse_index_histogram
+from app.services.channel_insight_service import ChannelBreakdownInsightService
+from app.services.channels import CHANNELS, channel_matrix, type_terms_aggs
+from app.services.comparison import compare_channels, compare_sentiment, compare_sov, sentiment_matrix, sov_matrix
+from app.services.data_cache import data_cache_key
+from app.services.project_index import get_unique_label_ids
+from app.services.sb_api_service import APISentimentAggregationService
+from app.services.sb_insight_service import SentimentBreakdownInsightService
+from app.services.sov_insight_service import SovInsightService
+from app.services.trendline import TrendSeries, analyze
+from app.services.trendline_insight_service import TrendlineInsightService
+from app.standin.synthetic import SyntheticData
+
+PERIODS = [("2025-05-01T00:00", "2025-05-31T23:59"), ("2025-04-01T00:00", "2025-04-30T23:59")]
+INDEX_TERMS = [{"type": "TERMS", "field": "INDEX", "option": {"terms": {"size": 100}}}]
+SENTIMENT_TERMS = [dict(INDEX_TERMS[0], nest=[{"type": "TERMS", "field": "SENTIMENT", "option": {"terms": {"size": 100}}}])]
+HISTOGRAM = [dict(INDEX_TERMS[0], nest=[{
+    "type": "DATE_HISTOGRAM", "field": "PUBLISHED_DATE",
+    "option": {"dateHistogram": {"interval": "1d", "timeZone": "Asia/Ho_Chi_Minh"}},
+}])]
+
+
+def _filter(from_date: str, to_date: str) -> Dict:
+    return {"publishedFromDate": from_date, "publishedToDate": to_date}
+
+
+def build_cases(topic_count: int, buzzes_per_topic: int) -> Dict[str, Callable[[], object]]:
+    data = SyntheticData(seed=42, topic_count=topic_count, daily_mentions=500)
+    topics = data.topics
+    topic_ids = [topic["_id"] for topic in topics]
+
+    sentiment_service = APISentimentAggregationService("x", "y")
+    sentiment_raw = [data.aggregate(topic_ids, _filter(*period), SENTIMENT_TERMS) for period in PERIODS]
+    data_periods = [
+        sentiment_service.refactor_result(raw, topics, *period) for raw, period in zip(sentiment_raw, PERIODS)
+    ]
+    names = [topic["name"] for topic in topics]
+    period_dicts = [{"from_date": from_date, "to_date": to_date} for from_date, to_date in PERIODS]
+    sentiment_data = {
+        "data_periods": data_periods,
+        "comparison": compare_sentiment(sentiment_matrix([p["data"] for p in data_periods], names), names, period_dicts),
+    }
+
+    sov_periods = [data.aggregate(topic_ids, _filter(*period), INDEX_TERMS) for period in PERIODS]
+    buzz_periods = [
+        [
+            {"topic_id": topic_id, "top_interactions_data": data.buzzes(topic_id, dict(_filter(*period), limit=buzzes_per_topic, sort=True))["data"]}
+            for topic_id in topic_ids
+        ]
+        for period in PERIODS
+    ]
+    sov_data = {
+        "sov_periods": sov_periods,
+        "buzz_periods": buzz_periods,
+        "comparison": compare_sov(sov_matrix(sov_periods, [f"topic{i}" for i in topic_ids]), names, period_dicts),
+        "topic_map": topics,
+        "periods": PERIODS,
+    }
+    sov_service = SovInsightService("x", "y")
+
+    channel_raw = [data.aggregate(topic_ids, _filter(*period), type_terms_aggs()) for period in PERIODS]
+    channel_data = {
+        "comparison": compare_channels(channel_matrix(channel_raw, topic_ids), names, CHANNELS, period_dicts),
+        "periods": PERIODS,
+    }
+    channel_service = ChannelBreakdownInsightService("x", "y")
+
+    histogram = data.aggregate(topic_ids, _filter(PERIODS[1][0], PERIODS[0][1]), HISTOGRAM)
+    series = TrendSeries.from_histogram(
+        "day", date(2025, 4, 1), date(2025, 5, 31), topic_ids, parse_index_histogram(histogram, doc_count_metrics)
+    )
+    names_by_id = {topic["_id"]: topic["name"] for topic in topics}
+    trendline_data = {"trendline": analyze(series, names_by_id), "periods": PERIODS}
+    trendline_service = TrendlineInsightService("x", "y")
+
+    group_tree_labels = [[{"_id": f"label-{group}-{i}"} for i in range(20)] for group in range(50)]
+    request = InsightRequest(
+        topic_ids=topic_ids,
+        from_date1=PERIODS[0][0], to_date1=PERIODS[0][1], from_date2=PERIODS[1][0], to_date2=PERIODS[1][1],
+    )
+    batch_body = json.dumps({"query": "query Batch", "variables": {"sov": sov_periods}}).encode()
+
+    return {
+        "refactor_result": lambda: sentiment_service.refactor_result(sentiment_raw[0], topics, *PERIODS[0]),
+        "get_unique_label_ids": lambda: get_unique_label_ids(group_tree_labels),
+        "compare_sov": lambda: compare_sov(sov_matrix(sov_periods, [f"topic{i}" for i in topic_ids]), names, period_dicts),
+        "compare_sentiment": lambda: compare_sentiment(sentiment_matrix([p["data"] for p in data_periods], names), names, period_dicts),
+        "trendline_analyze": lambda: analyze(series, names_by_id),
+        "prompt_sov": lambda: sov_service._build_prompt(**sov_data),
+        "prompt_sentiment": lambda: SentimentBreakdownInsightService("x", "y").build_sentiment_breakdown_prompt(sentiment_data),
+        "prompt_channel": lambda: channel_service._build_prompt(**channel_data),
+        "prompt_trendline": lambda: trendline_service._build_prompt(**trendline_data),
+        "key_shared_cache": lambda: shared_cache_key(request, "sov"),
+        "key_prompt_sov": lambda: sov_service._prompt_cache_key(sov_data),
+        "key_data_cache": lambda: data_cache_key("sov", "scope", topic_ids, *PERIODS[0]),
+        "key_recording": lambda: recording_key("POST", "http://gateway/graphql", batch_body),
+        "metrics_observe": lambda: stage_duration.labels("micro").observe(0.042),
+    }
+
+
+def measure(func: Callable[[], object], repeat: int, min_time: float) -> Dict:
+    """Per-call time in microseconds over `repeat` rounds of an auto-sized loop."""
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(int(number * min_time / max(elapsed, 1e-9)), 1)
+    rounds: List[float] = [elapsed * 1e6 / number for elapsed in timer.repeat(repeat=repeat, number=number)]
+    return {"loops": number, "min_us": round(min(rounds), 3), **{f"{k}_us": v for k, v in percentiles(rounds).items()}}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the insight pipeline")
+    parser.add_argument("--topics", type=int, default=8, help="topics per request")
+    parser.add_argument("--buzzes", type=int, default=2, help="top buzzes per topic and period")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per round")
+    parser.add_argument("--only", nargs="*", help="run only these benchmarks")
+    parser.add_argument("--output", help="write JSON results to this file ('-' for stdout)")
+    args = parser.parse_args()
+
+    cases = build_cases(args.topics, args.buzzes)
+    results = run_metadata("micro", {"topics": args.topics, "buzzes": args.buzzes, "repeat": args.repeat})
+    results["benchmarks"] = {}
+    for name, func in cases.items():
+        if args.only and name not in args.only:
+            continue
+        stats = measure(func, args.repeat, args.min_time)
+        results["benchmarks"][name] = stats
+        print(f"{name:24s} {stats['min_us']:>12.2f} us  (median {stats['p50_us']:.2f} us, {stats['loops']} loops)", file=sys.stderr)
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import asyncio
+from datetime import date, datetime
+
+import numpy as np
+
+from app.services.bucket_store import BucketStore, DaySeries, day_runs, plan_window
+
+SETTLED = datetime(2026, 10, 18, 12, 0)
+
+
+def day(value: str) -> int:
+    return date.fromisoformat(value).toordinal()
+
+
+def test_day_series_missing_and_put():
+    series = DaySeries(2)
+    assert series.missing(10, 12) == [10, 11, 12]
+
+    series.put(10, np.array([[1, 2], [3, 4]]))
+    assert series.missing(8, 13) == [8, 9, 12, 13]
+
+    # Ghi một dải không liền kề: khoảng giữa vẫn là chưa biết
+    series.put(15, np.array([[5, 6]]))
+    assert series.missing(9, 16) == [9, 12, 13, 14, 16]
+    assert series.total(10, 11).tolist() == [4, 6]
+    assert series.total(10, 15).tolist() == [9, 12]
+
+    # Mở rộng về trước giữ nguyên dữ liệu cũ
+    series.put(8, np.array([[7, 7]]))
+    assert series.missing(8, 11) == [9]
+    assert series.total(8, 11).tolist() == [11, 13]
+
+
+def test_plan_window_full_days_have_no_edges():
+    plan = plan_window("2026-10-01T00:00", "2026-10-07T23:59", SETTLED)
+    assert (plan.first_day, plan.last_day, plan.edges) == (day("2026-10-01"), day("2026-10-07"), [])
+
+
+def test_plan_window_partial_days_become_edges():
+    plan = plan_window("2026-10-01T08:30", "2026-10-07T12:00", SETTLED)
+    assert (plan.first_day, plan.last_day) == (day("2026-10-02"), day("2026-10-06"))
+    assert plan.edges == [
+        ("2026-10-01T08:30", "2026-10-01T23:59"),
+        ("2026-10-07T00:00", "2026-10-07T12:00"),
+    ]
+
+
+def test_plan_window_unsettled_days_become_an_edge():
+    plan = plan_window("2026-10-15T00:00", "2026-10-18T23:59", SETTLED)
+    assert (plan.first_day, plan.last_day) == (day("2026-10-15"), day("2026-10-17"))
+    assert plan.edges == [("2026-10-18T00:00", "2026-10-18T23:59")]
+
+
+def test_plan_window_without_full_day_is_one_edge():
+    plan = plan_window("2026-10-01T08:00", "2026-10-01T20:00", SETTLED)
+    assert (plan.first_day, plan.last_day) == (None, None)
+    assert plan.edges == [("2026-10-01T08:00", "2026-10-01T20:00")]
+
+
+def test_day_runs():
+    assert day_runs([]) == []
+    assert day_runs([5]) == [(5, 5)]
+    assert day_runs([1, 2, 3, 7, 9, 10]) == [(1, 3), (7, 7), (9, 10)]
+
+
+def fake_fetch_days(calls):
+    async def fetch_days(from_date: str, to_date: str):
+        calls.append((from_date, to_date))
+        first = datetime.strptime(from_date, "%Y-%m-%dT%H:%M").date().toordinal()
+        last = datetime.strptime(to_date, "%Y-%m-%dT%H:%M").date().toordinal()
+        return {"topic1": {ordinal: np.array([1]) for ordinal in range(first, last + 1)}}
+    return fetch_days
+
+
+def test_prefetch_skips_gap_between_distant_periods():
+    store, calls = BucketStore(maxsize=10), []
+    periods = [("2025-10-01T00:00", "2025-10-07T23:59"), ("2024-10-01T00:00", "2024-10-07T23:59")]
+    asyncio.run(store.prefetch("sov", "scope", ["topic1"], periods, 1, fake_fetch_days(calls)))
+
+    assert sorted(calls) == [
+        ("2024-10-01T00:00", "2024-10-07T23:59"),
+        ("2025-10-01T00:00", "2025-10-07T23:59"),
+    ]
+    series = store._get_series("sov", "scope", "topic1", 1)
+    assert series.missing(day("2025-10-01"), day("2025-10-07")) == []
+    assert len(series.missing(day("2024-10-08"), day("2025-09-30"))) == 358
+
+
+def test_prefetch_merges_adjacent_periods_and_skips_stored_days():
+    store, calls = BucketStore(maxsize=10), []
+    fetch_days = fake_fetch_days(calls)
+    asyncio.run(store.prefetch("sov", "scope", ["topic1"], [("2025-10-04T00:00", "2025-10-05T23:59")], 1, fetch_days))
+    calls.clear()
+
+    periods = [("2025-10-04T00:00", "2025-10-07T23:59"), ("2025-10-01T00:00", "2025-10-03T23:59")]
+    asyncio.run(store.prefetch("sov", "scope", ["topic1"], periods, 1, fetch_days))
+    assert sorted(calls) == [
+        ("2025-10-01T00:00", "2025-10-03T23:59"),
+        ("2025-10-06T00:00", "2025-10-07T23:59"),
+    ]
@@ -0,0 +1,71 @@
+import pytest
+
+from app.core.exceptions import InvalidResponseException
+from app.services.graphql_batch import (
+    AGGREGATIONS_SELECTION,
+    BatchOperation,
+    build_batch_payload,
+    required_result,
+    split_batch_response,
+)
+
+OPERATIONS = [
+    BatchOperation("q0", "aggregations", {
+        "input": {"indexes": ["1", "2"]},
+        "filter": {"publishedFromDate": "2025-10-01T00:00"},
+        "aggs": [{"type": "TERMS", "field": "INDEX"}],
+    }, AGGREGATIONS_SELECTION),
+    BatchOperation("q1", "buzzes", {
+        "input": {"indexes": ["1"]},
+        "filter": {"publishedFromDate": "2025-09-01T00:00"},
+    }, "total data { _id }"),
+]
+
+
+def test_build_batch_payload_suffixes_variables_with_alias():
+    payload = build_batch_payload(OPERATIONS)
+
+    assert payload["query"].startswith(
+        "query Batch($input_q0: IndexesInput!, $filter_q0: FilterBuzzInput, $aggs_q0: [AggregationTypeInput]!, "
+        "$input_q1: IndexesInput!, $filter_q1: FilterBuzzInput)"
+    )
+    assert "q0: aggregations(input: $input_q0, filter: $filter_q0, aggs: $aggs_q0) { status message data }" in payload["query"]
+    assert "q1: buzzes(input: $input_q1, filter: $filter_q1) { total data { _id } }" in payload["query"]
+    assert payload["variables"] == {
+        "input_q0": {"indexes": ["1", "2"]},
+        "filter_q0": {"publishedFromDate": "2025-10-01T00:00"},
+        "aggs_q0": [{"type": "TERMS", "field": "INDEX"}],
+        "input_q1": {"indexes": ["1"]},
+        "filter_q1": {"publishedFromDate": "2025-09-01T00:00"},
+    }
+
+
+def test_build_batch_payload_sends_missing_variables_as_null():
+    payload = build_batch_payload([BatchOperation("q0", "buzzes", {"input": {"indexes": ["1"]}}, "total")])
+    assert payload["variables"] == {"input_q0": {"indexes": ["1"]}, "filter_q0": None}
+
+
+def test_split_batch_response_maps_each_alias_to_its_data():
+    response = {"data": {"q0": {"status": 200, "data": {"_index_terms": {}}}, "q1": {"total": 1, "data": [{"_id": "a"}]}}}
+    assert split_batch_response(response, OPERATIONS) == {"q0": {"_index_terms": {}}, "q1": [{"_id": "a"}]}
+
+
+def test_split_batch_response_maps_failed_and_missing_aliases_to_none():
+    response = {
+        "data": {"q0": {"status": 500, "data": {"partial": True}}},
+        "errors": [{"message": "timeout", "path": ["q0"]}],
+    }
+    assert split_batch_response(response, OPERATIONS) == {"q0": None, "q1": None}
+
+
+def test_split_batch_response_without_data_raises():
+    with pytest.raises(InvalidResponseException):
+        split_batch_response({"data": None, "errors": [{"message": "bad query"}]}, OPERATIONS)
+
+
+def test_required_result_raises_for_failed_alias():
+    results = {"q0": {"_index_terms": {}}, "q1": None}
+    assert required_result(results, OPERATIONS[0], "sentiment aggregation") == {"_index_terms": {}}
+    with pytest.raises(InvalidResponseException) as error:
+        required_result(results, OPERATIONS[1], "sentiment aggregation")
+    assert "q1" in error.value.detail
@@ -0,0 +1,87 @@
+import asyncio
+import gc
+
+import pytest
+
+from app.core.exceptions import APIRequestException
+from app.services.project_index import ProjectIndexStore
+
+ME_RESPONSE = {"data": {"me": {"data": {"projects": [
+    {"_id": "p1", "groupTreeLabels": [], "topics": [{"_id": "1", "name": "Topic 1"}]},
+]}}}}
+
+
+def tracking_loader(calls, running, fail=False):
+    async def loader():
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        if fail:
+            raise APIRequestException(detail="me failed")
+        return ME_RESPONSE
+    return loader
+
+
+def test_concurrent_lookups_share_one_load():
+    async def scenario():
+        store, calls, running = ProjectIndexStore(max_ttl=60), [], {"now": 0, "max": 0}
+        loader = tracking_loader(calls, running)
+        indexes = await asyncio.gather(*(store.get("token", loader) for _ in range(5)))
+        return calls, indexes
+
+    calls, indexes = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(index is indexes[0] for index in indexes)
+    assert indexes[0].topics["1"]["name"] == "Topic 1"
+
+
+def test_failed_load_never_runs_concurrently():
+    async def scenario():
+        store, calls, running = ProjectIndexStore(max_ttl=60), [], {"now": 0, "max": 0}
+        loader = tracking_loader(calls, running, fail=True)
+
+        async def late_lookup():
+            # Đến sau khi lần load đầu đã lỗi, trong lúc các caller trước vẫn đang chờ lock
+            await asyncio.sleep(0.015)
+            return await store.get("token", loader)
+
+        results = await asyncio.gather(
+            *(store.get("token", loader) for _ in range(3)), late_lookup(), return_exceptions=True
+        )
+        # Chỉ giữ kiểu lỗi: traceback còn tham chiếu tới lock qua các frame
+        return store, calls, running, [type(result) for result in results]
+
+    store, calls, running, errors = asyncio.run(scenario())
+    assert errors == [APIRequestException] * 4
+    assert running["max"] == 1
+    assert len(calls) == 4
+    gc.collect()
+    assert len(store._key_locks) == 0
+
+
+def test_uncached_index_does_not_overlap_loads(monkeypatch):
+    async def scenario():
+        store, calls, running = ProjectIndexStore(max_ttl=60), [], {"now": 0, "max": 0}
+        # Token sắp hết hạn: index không được cache
+        monkeypatch.setattr(store, "_expires_at", lambda _token: 0)
+        loader = tracking_loader(calls, running)
+        await asyncio.gather(*(store.get("token", loader) for _ in range(3)))
+        return calls, running
+
+    calls, running = asyncio.run(scenario())
+    assert running["max"] == 1
+    assert len(calls) == 3
+
+
+@pytest.mark.parametrize("token", ["a", "b"])
+def test_locks_are_released_after_success(token):
+    async def scenario():
+        store = ProjectIndexStore(max_ttl=60)
+        await store.get(token, tracking_loader([], {"now": 0, "max": 0}))
+        return store
+
+    store = asyncio.run(scenario())
+    gc.collect()
+    assert len(store._key_locks) == 0
@@ -0,0 +1,27 @@
+from app.core.config import settings
+from app.services.prompt_compaction import INSTRUCTIONS_HEADING, TRUNCATED_MARK, fit_prompt, token_counter
+
+INSTRUCTIONS = f"""{INSTRUCTIONS_HEADING}
+Bạn là AI phân tích dữ liệu chuyên nghiệp. Tạo báo cáo insight bằng tiếng Việt, gồm:
+1. **Tổng quan**
+2. **Khuyến nghị**
+"""
+
+
+def test_fit_prompt_keeps_instructions_when_data_exceeds_cap(monkeypatch):
+    monkeypatch.setattr(settings, "PROMPT_MAX_TOKENS", 300)
+    rows = "\n".join(f"topic {index} | {index * 17} | {index * 3.5} | {index}" for index in range(500))
+
+    def render(_buzz_blocks):
+        return f"\nDữ liệu theo topic:\n\n### Bảng\ntopic | mentions | SOV% | hạng\n{rows}\n\n{INSTRUCTIONS}"
+
+    prompt = fit_prompt("test", render, [], {})
+
+    assert prompt.trimmed
+    assert prompt.tokens <= settings.PROMPT_MAX_TOKENS
+    assert prompt.tokens == token_counter.count(prompt.text)
+    assert prompt.text.endswith(INSTRUCTIONS)
+    assert TRUNCATED_MARK in prompt.text
+    # Phần dữ liệu được cắt theo dòng, từ cuối bảng
+    assert "topic 0 | 0 | 0.0 | 0" in prompt.text
+    assert "topic 499 |" not in prompt.text
@@ -0,0 +1,100 @@
+from datetime import date, timedelta
+
+import pytest
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.models.request_models import InsightJobRequest, InsightRequest, Period, RollingWindow
+
+LEGACY = {
+    "from_date1": "2025-10-08T00:00",
+    "to_date1": "2025-10-14T23:59",
+    "from_date2": "2025-10-01T00:00",
+    "to_date2": "2025-10-07T23:59",
+}
+
+
+def test_legacy_fields_become_two_periods():
+    request = InsightRequest(topic_ids=["1"], **LEGACY)
+    assert request.period_ranges() == [
+        ("2025-10-08T00:00", "2025-10-14T23:59"),
+        ("2025-10-01T00:00", "2025-10-07T23:59"),
+    ]
+
+
+def test_legacy_fields_must_be_complete():
+    with pytest.raises(ValidationError):
+        InsightRequest(topic_ids=["1"], from_date1="2025-10-08T00:00", to_date1="2025-10-14T23:59")
+
+
+def test_explicit_periods_are_mirrored_into_legacy_fields():
+    periods = [
+        {"from_date": "2025-10-15T00:00", "to_date": "2025-10-21T23:59"},
+        {"from_date": "2025-10-08T00:00", "to_date": "2025-10-14T23:59"},
+        {"from_date": "2025-10-01T00:00", "to_date": "2025-10-07T23:59"},
+    ]
+    request = InsightRequest(topic_ids=["1"], periods=periods)
+    assert [period.model_dump() for period in request.periods] == periods
+    assert (request.from_date1, request.to_date1) == ("2025-10-15T00:00", "2025-10-21T23:59")
+    assert (request.from_date2, request.to_date2) == ("2025-10-08T00:00", "2025-10-14T23:59")
+
+
+def test_period_count_is_bounded():
+    one = [{"from_date": "2025-10-01T00:00", "to_date": "2025-10-07T23:59"}]
+    with pytest.raises(ValidationError):
+        InsightRequest(topic_ids=["1"], periods=one)
+    with pytest.raises(ValidationError):
+        InsightRequest(topic_ids=["1"], periods=one * (settings.MAX_PERIODS + 1))
+
+
+def test_rolling_weeks_end_on_end_date():
+    window = RollingWindow(granularity="week", count=3, end_date="2025-10-21")
+    assert [(period.from_date, period.to_date) for period in window.periods()] == [
+        ("2025-10-15T00:00", "2025-10-21T23:59"),
+        ("2025-10-08T00:00", "2025-10-14T23:59"),
+        ("2025-10-01T00:00", "2025-10-07T23:59"),
+    ]
+
+
+def test_rolling_defaults_to_yesterday():
+    window = RollingWindow(granularity="day", count=2)
+    assert [(period.from_date, period.to_date) for period in window.periods(today=date(2025, 3, 1))] == [
+        ("2025-02-28T00:00", "2025-02-28T23:59"),
+        ("2025-02-27T00:00", "2025-02-27T23:59"),
+    ]
+
+
+def test_rolling_months_use_calendar_months():
+    window = RollingWindow(granularity="month", count=3, end_date="2025-02-10")
+    assert [(period.from_date, period.to_date) for period in window.periods()] == [
+        ("2025-02-01T00:00", "2025-02-10T23:59"),
+        ("2025-01-01T00:00", "2025-01-31T23:59"),
+        ("2024-12-01T00:00", "2024-12-31T23:59"),
+    ]
+
+
+def test_rolling_is_resolved_into_periods():
+    request = InsightRequest(topic_ids=["1"], rolling={"granularity": "week", "count": 2})
+    yesterday = date.today() - timedelta(days=1)
+    assert request.rolling is None
+    assert request.periods[0].to_date == f"{yesterday.isoformat()}T23:59"
+    assert request.to_date1 == request.periods[0].to_date
+    assert len(request.periods) == 2
+
+
+def test_mixed_inputs_are_rejected():
+    periods = [Period(from_date="2025-09-01T00:00", to_date="2025-09-07T23:59")] * 2
+    rolling = {"granularity": "week", "count": 2}
+    with pytest.raises(ValidationError):
+        InsightRequest(topic_ids=["1"], periods=periods, rolling=rolling)
+    with pytest.raises(ValidationError):
+        InsightRequest(topic_ids=["1"], periods=periods, **LEGACY)
+    with pytest.raises(ValidationError):
+        InsightRequest(topic_ids=["1"], rolling=rolling, **LEGACY)
+
+
+def test_validated_request_can_be_rebuilt_from_its_dump():
+    # Các router job và dashboard dựng lại InsightRequest từ model_dump của request con
+    job = InsightJobRequest(topic_ids=["1"], callback_url="https://example.com/cb", **LEGACY)
+    request = InsightRequest(**job.model_dump(exclude={"callback_url"}))
+    assert request.period_ranges() == job.period_ranges()
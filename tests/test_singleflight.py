@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"value": 42}
+
+        results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+        return calls, results
+
+    calls, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert results == [{"value": 42}] * 5
+    assert all(result is results[0] for result in results)
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+
+        async def fetch(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return key
+
+        return await asyncio.gather(flight.do("a", lambda: fetch("a")), flight.do("b", lambda: fetch("b"))), calls
+
+    results, calls = asyncio.run(scenario())
+    assert results == ["a", "b"]
+    assert sorted(calls) == ["a", "b"]
+
+
+def test_exception_reaches_every_waiter():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+
+        async def fail():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError("gateway down")
+
+        results = await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+        return calls, results
+
+    calls, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) and str(result) == "gateway down" for result in results)
+
+
+def test_key_is_released_after_completion():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+
+        async def fetch():
+            calls.append(1)
+            return len(calls)
+
+        first = await flight.do("key", fetch)
+        in_flight_after_first = len(flight)
+        second = await flight.do("key", fetch)
+        return first, second, in_flight_after_first, len(flight)
+
+    first, second, in_flight_after_first, in_flight_after_second = asyncio.run(scenario())
+    assert (first, second) == (1, 2)
+    assert in_flight_after_first == in_flight_after_second == 0
+
+
+def test_key_is_released_after_failure():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            await flight.do("key", fail)
+        return len(flight), await flight.do("key", lambda: asyncio.sleep(0, result="ok"))
+
+    assert asyncio.run(scenario()) == (0, "ok")
+
+
+def test_cancelled_caller_does_not_cancel_shared_task():
+    async def scenario():
+        flight, release = SingleFlight(), asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "done"
+
+        cancelled = asyncio.ensure_future(flight.do("key", fetch))
+        waiter = asyncio.ensure_future(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return await waiter, cancelled.cancelled()
+
+    assert asyncio.run(scenario()) == ("done", True)